@@ -4,6 +4,7 @@ import tempfile
 import zipfile
 import io
 import re
+import time
 import uuid
 
 # Custom CSS for better scrolling and layout
@@ -170,8 +171,16 @@ h1, h2, h3 {
 
 from build_wiki import build_sharded_wiki_from_github, get_unique_cache_dir
 from build_embeddings import build_embeddings_for_repo
-from generate_wiki_pages import generate_wiki_pages
-from hybrid_code_chatbot import build_hybrid_code_chatbot_graph
+from generate_wiki_pages import PAGE_WORKERS, iter_wiki_pages
+from hybrid_code_chatbot import HybridRetriever, build_hybrid_code_chatbot_graph
+from repo_snapshot import open_snapshot_for_url
+from query_cache import QUERY_VECTORS_FILENAME, configure_query_cache
+from progress import format_event
+from build_jobs import BuildJob, get_build_service
+from resource_cache import dir_fingerprint, file_fingerprint, get_resource_cache
+
+# Query embeddings are shared across reruns, pages and chat turns, and persisted under the cache root
+configure_query_cache(store_path=os.path.join("..", ".cache", QUERY_VECTORS_FILENAME))
 
 # ========== XML Parsing Helper ==========
 def load_wiki_xml(path: str) -> dict:
@@ -258,6 +267,10 @@ with st.sidebar:
         max_files = st.slider("Max Files to Process", min_value=10, max_value=300, value=50, 
                              help="Fewer files = faster processing. More files = more comprehensive docs.")
         regenerate = st.checkbox("Regenerate Documentation (ignore cache)", value=False)
+        incremental = st.checkbox("Update Changed Files Only", value=False,
+                                  help="Re-index only files whose content changed since the last build.")
+        page_workers = st.slider("Pages Generated in Parallel", min_value=1, max_value=8, value=PAGE_WORKERS,
+                                 help="More pages in flight = faster generation, more concurrent QGenie calls.")
         generate_btn = st.button("Generate Documentation", type="primary", use_container_width=True)
     else:
         generate_btn = False
@@ -268,6 +281,8 @@ with st.sidebar:
         max_files = 300
         use_cache = True
         regenerate = False
+        incremental = False
+        page_workers = PAGE_WORKERS
 
         # --- Chatbot Button (only if not in chat view) ---
         if not st.session_state.get('show_half_and_half', False):
@@ -283,6 +298,17 @@ with st.sidebar:
 
 # ========== Helper Functions ==========
 
+def extract_page_title(markdown_content: str, filename: str) -> str:
+    if not markdown_content:
+        return filename.replace('.md', '').replace('_', ' ').title()
+    h1_match = re.search(r'^#\s+(.+)$', markdown_content, re.MULTILINE)
+    if h1_match:
+        return h1_match.group(1).strip()
+    h2_match = re.search(r'^##\s+(.+)$', markdown_content, re.MULTILINE)
+    if h2_match:
+        return h2_match.group(1).strip()
+    return filename.replace('.md', '').replace('_', ' ').title()
+
 def create_github_url(github_url, file_path, line_number=None):
     if not github_url or not github_url.startswith('https://github.com/'):
         return file_path
@@ -342,68 +368,150 @@ def render_markdown_with_mermaid(markdown_content: str):
             if part.strip():
                 render_mermaid(part.strip())
 
+# ========== Build Progress ==========
+STAGE_LABELS = {
+    "scan": "Scanning repository",
+    "wiki_map": "Drafting wiki structure",
+    "summarize": "Summarizing code units",
+    "embed": "Embedding units",
+    "index": "Building search indices",
+    "pages": "Generating documentation pages",
+}
+
+def render_job_progress(snapshot: dict):
+    """One progress bar per stage plus the pages finished so far, from a BuildJob snapshot."""
+    if snapshot["follows"] and snapshot["status"] != "running":
+        st.caption(f"Waiting for build {snapshot['follows']} on this repository to finish...")
+    for stage, ev in snapshot["stages"].items():
+        label = STAGE_LABELS.get(stage, stage)
+        st.progress(ev.fraction, text=f"{label} — {format_event(ev)}")
+    if snapshot["pages"]:
+        st.caption(f"Pages ready: {', '.join(snapshot['pages'])}")
+
 # ========== Pipeline Execution ==========
-def run_pipeline(github_url, github_token, language, model_name, regenerate, max_files=max_files, use_cache=True):
+def repo_cache_dir(github_url):
     root_cache_dir = os.path.join("..", ".cache")
     repo_name = get_unique_cache_dir(github_url).split(os.sep)[-1]
-    repo_dir = os.path.join(root_cache_dir, repo_name)
-    repo_dir = os.path.abspath(repo_dir)
+    return os.path.abspath(os.path.join(root_cache_dir, repo_name))
+
+def build_documentation(job, progress, github_token=None):
+    """Background build body (runs on the build service; no Streamlit calls)."""
+    p = job.params
+    regenerate, incremental = p["regenerate"], p["incremental"]
+    # One download/extract shared by the wiki and embeddings builders
+    with open_snapshot_for_url(p["github_url"], token=github_token) as snapshot:
+        build_sharded_wiki_from_github(
+            gh_url=p["github_url"],
+            token=github_token,
+            output_root=job.repo_dir,
+            lang_text=p["language"],
+            qgenie_model=p["model_name"],
+            max_files=p["max_files"],
+            snapshot=snapshot,
+            incremental=incremental and not regenerate,
+            reuse_partials=not regenerate,
+            progress=progress,
+        )
+        build_embeddings_for_repo(
+            github_url=p["github_url"],
+            token=github_token,
+            output_root=job.repo_dir,
+            MAX_FILES=p["max_files"],
+            force_summarize=regenerate,
+            model_name=p["model_name"],
+            snapshot=snapshot,
+            incremental=incremental and not regenerate,
+            progress=progress,
+        )
+    for pid, _ in iter_wiki_pages(output_root=job.repo_dir, lang_text=p["language"],
+                                  max_workers=p["page_workers"], progress=progress):
+        job.record_page(pid)
+    return job.repo_dir
+
+# ========== Shared Resources ==========
+# Loaded once per process and shared by sessions; reloaded when the files behind them change.
+# Weights approximate relative memory use against the cache budget.
+EMBEDDING_FILES = ("meta.json", "units.parquet", "unit_ids.json", "summary.index", "texts.bin", os.path.join("bm25", "vocab.json"))
+
+def embeddings_fingerprint(repo_dir):
+    emb_dir = os.path.join(repo_dir, "embeddings")
+    return file_fingerprint(os.path.join(emb_dir, name) for name in EMBEDDING_FILES)
+
+def cached_retriever(repo_dir):
+    return get_resource_cache().get("retriever", repo_dir, embeddings_fingerprint(repo_dir),
+                                    lambda: HybridRetriever(os.path.join(repo_dir, "embeddings")), weight=8)
+
+def chatbot_graph_for(repo_dir, model_name):
+    # Compiled per question around the cached retriever (cheap), so neither a cache entry nor a
+    # session keeps a retriever alive after the cache evicts it
+    return build_hybrid_code_chatbot_graph(os.path.join(repo_dir, "embeddings"), model_name=model_name,
+                                           retriever=cached_retriever(repo_dir))
+
+def cached_wiki(repo_dir):
+    wiki_xml_path = os.path.join(repo_dir, "wiki_xml", "wiki.xml")
+    return get_resource_cache().get("wiki", repo_dir, file_fingerprint([wiki_xml_path]), lambda: load_wiki_xml(wiki_xml_path))
+
+def cached_page_contents(repo_dir):
+    """{filename: markdown} for wiki_pages/*.md (shared between sessions; treat as read-only)."""
+    wiki_pages_dir = os.path.join(repo_dir, "wiki_pages")
+
+    def load():
+        page_contents = {}
+        if os.path.exists(wiki_pages_dir):
+            for f in sorted(f for f in os.listdir(wiki_pages_dir) if f.endswith(".md")):
+                with open(os.path.join(wiki_pages_dir, f), "r", encoding="utf-8") as fp:
+                    page_contents[f] = fp.read()
+        return page_contents
+    return get_resource_cache().get("pages", repo_dir, dir_fingerprint(wiki_pages_dir, ".md"), load, weight=2)
+
+def load_pipeline_outputs(repo_dir, model_name):
+    page_contents = cached_page_contents(repo_dir)
+    page_files = list(page_contents)
+    return page_files, page_contents, model_name, repo_dir
+
+def run_pipeline(github_url, github_token, language, model_name, regenerate, max_files=max_files, use_cache=True, incremental=False,
+                 page_workers=PAGE_WORKERS):
+    """
+    Loads cached documentation directly, otherwise starts (or attaches to) a
+    background build job. Returns the pipeline outputs, or the BuildJob to poll.
+    """
+    repo_dir = repo_cache_dir(github_url)
     os.makedirs(repo_dir, exist_ok=True)
     cache_exists = os.path.exists(os.path.join(repo_dir, "wiki_pages"))
+    service = get_build_service()
 
-    if cache_exists and not regenerate:
+    if cache_exists and not (regenerate or incremental):
+        running = service.active_job_for(repo_dir)
+        if running is not None:
+            st.info(" A build for this repository is already running; attaching to it...")
+            return running
         st.success(" Loaded documentation from cache.")
+        return load_pipeline_outputs(repo_dir, model_name)
+    if regenerate:
+        st.info(" Regenerating documentation (ignoring cache)...")
+    elif incremental and cache_exists:
+        st.info(" Updating documentation for changed files...")
     else:
-        if regenerate:
-            st.info(" Regenerating documentation (ignoring cache)...")
-        else:
-            st.info(" Building documentation from scratch...")
-        with st.spinner("Building sharded wiki..."):
-            build_sharded_wiki_from_github(
-                gh_url=github_url,
-                token=github_token,
-                output_root=repo_dir,
-                lang_text=language,
-                qgenie_model=model_name,
-                max_files=max_files,
-            )
-        with st.spinner("Building code embeddings..."):
-            embeddings_dir = build_embeddings_for_repo(
-                github_url=github_url,
-                token=github_token,
-                output_root=repo_dir,
-                MAX_FILES=max_files,
-                force_summarize=regenerate,
-                model_name=model_name,
-            )
-        with st.spinner("Generating documentation pages..."):
-            generate_wiki_pages(
-                output_root=repo_dir,
-                lang_text=language,
-            )
-        st.success(" Documentation generated and cached.")
-
-    wiki_pages_dir = os.path.join(repo_dir, "wiki_pages")
-    if os.path.exists(wiki_pages_dir):
-        page_files = sorted([f for f in os.listdir(wiki_pages_dir) if f.endswith(".md")])
-        page_contents = {}
-        for f in page_files:
-            with open(os.path.join(wiki_pages_dir, f), "r", encoding="utf-8") as fp:
-                page_contents[f] = fp.read()
-    else:
-        page_files = []
-        page_contents = {}
-
-    chatbot_graph = build_hybrid_code_chatbot_graph(os.path.join(repo_dir, "embeddings"), model_name=model_name)
-    return page_files, page_contents, chatbot_graph, repo_dir
+        st.info(" Building documentation from scratch...")
+    params = {
+        "github_url": github_url, "language": language, "model_name": model_name,
+        "max_files": max_files, "regenerate": regenerate, "incremental": incremental,
+        "page_workers": page_workers,
+    }
+    # The service attaches to an identical active build, or queues this one behind a different one
+    job = service.submit(repo_dir, params, lambda job, progress: build_documentation(job, progress, github_token))
+    if job.follows:
+        st.info(" Another build for this repository is running with different settings; "
+                "this one will start when it finishes.")
+    return job
 
 # ========== Session State ==========
 if "page_files" not in st.session_state:
     st.session_state.page_files = []
 if "page_contents" not in st.session_state:
     st.session_state.page_contents = {}
-if "chatbot_graph" not in st.session_state:
-    st.session_state.chatbot_graph = None
+if "chat_model" not in st.session_state:
+    st.session_state.chat_model = None
 if "repo_dir" not in st.session_state:
     st.session_state.repo_dir = None
 if "chat_history" not in st.session_state:
@@ -414,27 +522,45 @@ if "show_half_and_half" not in st.session_state:
     st.session_state.show_half_and_half = False
 
 # ========== Run Pipeline ==========
-if 'generate_btn' in locals() and generate_btn:
-    st.session_state.page_files, st.session_state.page_contents, st.session_state.chatbot_graph, st.session_state.repo_dir = run_pipeline(
-        github_url, github_token, language, model_name, regenerate, max_files, use_cache
-    )
+def attach_outputs(outputs, github_url):
+    st.session_state.page_files, st.session_state.page_contents, st.session_state.chat_model, st.session_state.repo_dir = outputs
     st.session_state.github_url = github_url
     st.session_state.chat_history = []
     st.session_state.show_half_and_half = False
     st.session_state.manual_reset = False
 
-# ========== Sidebar Navigation (ORDERED) ==========
-def extract_page_title(markdown_content: str, filename: str) -> str:
-    if not markdown_content:
-        return filename.replace('.md', '').replace('_', ' ').title()
-    h1_match = re.search(r'^#\s+(.+)$', markdown_content, re.MULTILINE)
-    if h1_match:
-        return h1_match.group(1).strip()
-    h2_match = re.search(r'^##\s+(.+)$', markdown_content, re.MULTILINE)
-    if h2_match:
-        return h2_match.group(1).strip()
-    return filename.replace('.md', '').replace('_', ' ').title()
+if 'generate_btn' in locals() and generate_btn:
+    outcome = run_pipeline(
+        github_url, github_token, language, model_name, regenerate, max_files, use_cache, incremental, page_workers
+    )
+    if isinstance(outcome, BuildJob):
+        st.session_state.build_job_id = outcome.job_id
+        st.session_state.build_github_url = github_url
+    else:
+        attach_outputs(outcome, github_url)
+
+# Poll the background build this session is attached to
+if st.session_state.get("build_job_id"):
+    job = get_build_service().get(st.session_state.build_job_id)
+    if job is None:
+        st.session_state.build_job_id = None
+    else:
+        snapshot = job.snapshot()
+        if job.active:
+            st.subheader("Building documentation...")
+            render_job_progress(snapshot)
+            time.sleep(1.0)
+            st.rerun()
+        st.session_state.build_job_id = None
+        if snapshot["status"] == "done":
+            st.success(" Documentation generated and cached.")
+            attach_outputs(load_pipeline_outputs(snapshot["repo_dir"], snapshot["params"]["model_name"]),
+                           st.session_state.build_github_url)
+        else:
+            st.error("Documentation build failed.")
+            st.code(snapshot["error"] or "", language="text")
 
+# ========== Sidebar Navigation (ORDERED) ==========
 def get_page_titles(page_files: list, page_contents: dict) -> dict:
     titles = {}
     for filename in page_files:
@@ -454,8 +580,7 @@ if st.session_state.get('page_files'):
         page_list_container = st.container()
         with page_list_container:
             # --- BEGIN ORDERED PAGE LIST ---
-            wiki_xml_path = os.path.join(st.session_state.repo_dir, "wiki_xml", "wiki.xml")
-            wiki = load_wiki_xml(wiki_xml_path)
+            wiki = cached_wiki(st.session_state.repo_dir)
 
             # Get ordered page IDs from wiki structure
             ordered_page_ids = []
@@ -538,7 +663,7 @@ if st.session_state.get('page_files'):
                             "topk_file": 5,
                             "topk_symbol": 5,
                         }
-                        result = st.session_state.chatbot_graph.invoke(state)
+                        result = chatbot_graph_for(st.session_state.repo_dir, st.session_state.chat_model).invoke(state)
                         answer = result["answer"]
                         # Use actual retrieval results for references
                         retrieved_files = result.get("retrieved_files", [])
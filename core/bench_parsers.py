@@ -0,0 +1,115 @@
+"""
+Throughput and symbol recall of the parser backends on a source tree.
+
+Every backend that supports a file's language parses it (with symbols);
+the report gives files/sec, MB/sec and symbols found per backend and
+language, plus recall against a reference backend: the share of the
+reference's (file, kind, name) symbols the backend also found. The
+reference defaults to tree-sitter when it parses anything, else the first
+listed backend that does.
+
+Usage:
+    python bench_parsers.py --root /path/to/checkout [--backends tree-sitter,regex]
+                            [--reference tree-sitter] [--max-files 5000]
+"""
+
+import argparse
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+import parser_backends
+
+EXT_LANGS = {
+    "js": "javascript", "jsx": "javascript", "ts": "javascript", "tsx": "javascript",
+    "mjs": "javascript", "cjs": "javascript", "java": "java", "go": "go",
+    "c": "c", "h": "c", "cc": "cpp", "cpp": "cpp", "cxx": "cpp", "hpp": "cpp", "hh": "cpp", "hxx": "cpp",
+    "rs": "rust", "rb": "ruby", "php": "php", "kt": "kotlin", "kts": "kotlin",
+}
+SKIP_DIRS = {".git", "node_modules", "vendor", "build", "dist", "target", "__pycache__"}
+
+def collect_files(root: str, max_files: int) -> List[Tuple[str, str, str]]:
+    """(path, lang, ext) for supported source files under root."""
+    out = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for name in sorted(filenames):
+            ext = os.path.splitext(name)[1].lower().lstrip(".")
+            if ext in EXT_LANGS:
+                out.append((os.path.join(dirpath, name), EXT_LANGS[ext], ext))
+                if len(out) >= max_files:
+                    return out
+    return out
+
+def run_backend(backend, files: List[Tuple[str, str, str, str]]):
+    """Per-language stats and the (path, kind, name) symbol set found by one backend."""
+    stats: Dict[str, Dict[str, float]] = defaultdict(lambda: {"files": 0, "bytes": 0, "seconds": 0.0, "symbols": 0})
+    found: Set[Tuple[str, str, str]] = set()
+    parsed_paths: Set[str] = set()
+    for path, lang, ext, text in files:
+        if not backend.supports(lang):
+            continue
+        t0 = time.perf_counter()
+        try:
+            parsed = backend.parse(text, lang, ext=ext, symbols=True)
+        except Exception as e:
+            print(f"[WARN] {backend.name} failed on {path}: {e}")
+            parsed = None
+        elapsed = time.perf_counter() - t0
+        if parsed is None:
+            continue
+        s = stats[lang]
+        s["files"] += 1
+        s["bytes"] += len(text.encode("utf-8", errors="surrogatepass"))
+        s["seconds"] += elapsed
+        s["symbols"] += len(parsed.symbols)
+        parsed_paths.add(path)
+        found.update((path, sym.kind, sym.name) for sym in parsed.symbols)
+    return stats, found, parsed_paths
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare parser backends: files/sec and symbol recall.")
+    ap.add_argument("--root", required=True, help="Source tree to parse.")
+    ap.add_argument("--backends", default=parser_backends.DEFAULT_BACKENDS, help="Comma-separated backend names.")
+    ap.add_argument("--reference", default=None, help="Backend whose symbols count as ground truth.")
+    ap.add_argument("--max-files", type=int, default=5000)
+    args = ap.parse_args()
+
+    files = []
+    for path, lang, ext in collect_files(args.root, args.max_files):
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                files.append((path, lang, ext, f.read()))
+        except OSError:
+            continue
+    print(f"[INFO] {len(files)} source files under {args.root}")
+
+    results = {}
+    for name in [n.strip() for n in args.backends.split(",") if n.strip()]:
+        backend = parser_backends.BACKENDS[name]()
+        results[name] = run_backend(backend, files)
+        if not results[name][2]:
+            print(f"[INFO] {name}: no files parsed (backend or grammars not installed)")
+
+    reference = args.reference
+    if reference is None:
+        reference = next((n for n in ["tree-sitter", *results] if n in results and results[n][2]), None)
+    ref_found = results[reference][1] if reference in results else set()
+    ref_paths = results[reference][2] if reference in results else set()
+
+    print(f"{'backend':<13}{'lang':<12}{'files':>7}{'files/s':>10}{'MB/s':>8}{'symbols':>9}{'recall':>8}")
+    for name, (stats, found, paths) in results.items():
+        for lang in sorted(stats):
+            s = stats[lang]
+            secs = max(s["seconds"], 1e-9)
+            ref = {k for k in ref_found if EXT_LANGS[os.path.splitext(k[0])[1].lower().lstrip(".")] == lang}
+            common = ref & {k for k in found if k[0] in ref_paths}
+            recall = f"{len(common) / len(ref):.3f}" if ref else "-"
+            print(f"{name:<13}{lang:<12}{s['files']:>7}{s['files'] / secs:>10.1f}"
+                  f"{s['bytes'] / secs / 1e6:>8.2f}{s['symbols']:>9}{recall:>8}")
+    if reference:
+        print(f"[INFO] recall is measured against '{reference}' on the files it parsed")
+
+if __name__ == "__main__":
+    main()
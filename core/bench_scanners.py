@@ -0,0 +1,115 @@
+"""
+Benchmark for lang_scanners on a generated pathological corpus.
+
+Each corpus entry repeats a hostile construct (unterminated import clauses,
+unclosed argument lists, long qualifier runs, minified one-line files) up to
+several sizes. For every size the scanner's time is reported per MB: with
+backtracking-safe patterns ms/MB stays flat as files grow. The per-pattern
+regexes the parsers used before (--legacy) are timed on the same inputs for
+comparison; a legacy size is skipped once the previous one exceeded the
+time budget, since their cost grows quadratically.
+
+Usage:
+    python bench_scanners.py [--sizes-kb 64,256,1024,4096] [--legacy] [--budget-s 5]
+"""
+
+import argparse
+import re
+import time
+from typing import Callable, Dict, List, Tuple
+
+import lang_scanners
+
+# ===================== Pathological corpus =====================
+
+def _repeat(unit: str, size: int) -> str:
+    return (unit * (size // max(len(unit), 1) + 1))[:size]
+
+# name -> (scanner language, generator(size in bytes) -> text)
+CORPUS: Dict[str, Tuple[str, Callable[[int], str]]] = {
+    # "import" never followed by a quoted path
+    "js_dangling_imports": ("javascript", lambda n: _repeat("import a, b, c ", n)),
+    # minified bundle: one line of calls and arrow functions
+    "js_minified_line": ("javascript", lambda n: _repeat("var a=(b)=>{c(d,e);},f=function(g){return h(i)};", n)),
+    # calls without a ';' or '{' anywhere after them
+    "java_unterminated_calls": ("java", lambda n: _repeat("foo(bar(baz, qux) ", n)),
+    # long return-type-like run on one line, never reaching a '('
+    "c_qualifier_run": ("c", lambda n: "\n".join(_repeat("a * b & c ", 4000) for _ in range(n // 4001 + 1))[:n]),
+    # definition whose argument list never closes
+    "c_unclosed_args": ("c", lambda n: "int f(" + _repeat("int x, ", n)),
+    # template soup in a header
+    "cpp_templates": ("cpp", lambda n: _repeat("std::map<std::vector<int>, std::pair<a, b>> *& ", n)),
+    # "use" list without the closing ';'
+    "rust_open_use": ("rust", lambda n: _repeat("use a::{b, c::{d, e}, f} ", n)),
+    # import block that never closes
+    "go_open_import_block": ("go", lambda n: "import (\n" + _repeat('\t"pkg/x"\n', n)),
+    "kotlin_receivers": ("kotlin", lambda n: _repeat("fun <T> A<B>.C<D>.e", n)),
+}
+
+# ===================== Previous per-pattern regexes =====================
+
+_ident = r"[A-Za-z_][A-Za-z0-9_]*"
+_js_ident = r"[A-Za-z_$][A-Za-z0-9_$]*"
+
+LEGACY: Dict[str, List[str]] = {
+    "javascript": [rf"\bclass\s+({_js_ident})\b", r"""import\s+(?:[\s\S]*?\s+from\s+)?['"]""",
+                   r"""require\(\s*['"]""", rf"\bfunction\s+({_js_ident})\s*\(",
+                   rf"\bexport\s+function\s+({_js_ident})\s*\(",
+                   rf"\b(?:const|let|var)\s+({_js_ident})\s*=\s*function\b",
+                   rf"\b(?:const|let|var)\s+({_js_ident})\s*=\s*\("],
+    "java": [rf"\b(class|interface|enum)\s+({_ident})\b", r"\bimport\s+([a-zA-Z0-9_\.]+)(?:\s*;\s*)",
+             rf"\b({_ident})\s*\([^;]*\)\s*\{{"],
+    "go": [r'import\s+"([^"]+)"', r"(?s)import\s*\((.*?)\)", rf"\btype\s+({_ident})\s+struct\b",
+           rf"\bfunc\s+(?:\([^)]+\)\s*)?({_ident})\s*\("],
+    "c": [r'#\s*include\s*[<"]', rf"\b(class|struct)\s+({_ident})\b",
+          rf"(?m)^[ \t]*[A-Za-z_][\w:\s\*\&\<\>]*\s+({_ident})\s*\([^;]*\)\s*\{{",
+          rf"(?m)^[ \t]*(?:[_A-Za-z]\w*[\s\*\&\<\>:]+)+({_ident})\s*\([^;{{\)]*\)\s*\{{"],
+    "rust": [r"\buse\s+([A-Za-z0-9_:\{\}\*,\s]+);", rf"\b(struct|enum)\s+({_ident})\b", rf"\bfn\s+({_ident})\s*\("],
+    "kotlin": [rf"\b(class|object|interface)\s+({_ident})\b", r"\bimport\s+([A-Za-z0-9_\.]+)\s*",
+               rf"\bfun\s+({_ident})\s*\("],
+}
+LEGACY["cpp"] = LEGACY["c"]
+
+def run_scanner(lang: str, text: str) -> int:
+    return sum(1 for _ in lang_scanners.scanner_for(lang).scan(text))
+
+def run_legacy(lang: str, text: str) -> int:
+    return sum(sum(1 for _ in re.finditer(p, text)) for p in LEGACY[lang])
+
+def timed(fn: Callable[[], int]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+# ===================== Main =====================
+
+def main():
+    ap = argparse.ArgumentParser(description="Time lang_scanners on pathological inputs (ms per MB).")
+    ap.add_argument("--sizes-kb", default="64,256,1024,4096", help="Comma-separated input sizes in KB.")
+    ap.add_argument("--legacy", action="store_true", help="Also time the previous per-pattern regexes.")
+    ap.add_argument("--budget-s", type=float, default=5.0, help="Skip larger legacy sizes after a run this slow.")
+    args = ap.parse_args()
+    sizes = [int(s) * 1024 for s in args.sizes_kb.split(",") if s.strip()]
+
+    header = f"{'corpus':<26}{'size':>9}{'scan ms':>10}{'ms/MB':>9}"
+    if args.legacy:
+        header += f"{'legacy ms':>12}{'ms/MB':>10}"
+    print(header)
+    for name, (lang, make) in CORPUS.items():
+        legacy_over_budget = False
+        for size in sizes:
+            text = make(size)
+            mb = len(text) / (1024 * 1024)
+            t = timed(lambda: run_scanner(lang, text))
+            row = f"{name:<26}{len(text) // 1024:>7}KB{t * 1000:>10.1f}{t * 1000 / mb:>9.1f}"
+            if args.legacy:
+                if legacy_over_budget:
+                    row += f"{'skipped':>12}{'-':>10}"
+                else:
+                    lt = timed(lambda: run_legacy(lang, text))
+                    legacy_over_budget = lt > args.budget_s
+                    row += f"{lt * 1000:>12.1f}{lt * 1000 / mb:>10.1f}"
+            print(row, flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Symbol extents for non-Python sources.
+
+Given the offset where lang_scanners found a class or function, find where
+that symbol's block ends, so a unit carries exactly its own code plus
+start_line / end_line.
+
+- Brace languages: one tokenizing pass per file records the structural
+  characters ( ) { } ; (and newlines where they end a header) outside
+  comments, strings and char literals, and pairs every { with its }. From a
+  symbol's offset the header is walked to its opening brace (or to the ';',
+  enclosing '}' or header-ending newline of a body-less declaration) and the
+  block ends at the matching '}'.
+- Ruby: indentation. The block ends at the first later line indented no
+  deeper than the definition, including it when it is the closing "end".
+  A definition that closes on its own line ("def bar; 2; end", endless
+  "def bar = 2") is that line alone.
+
+in_code() flags matches inside comments and strings, so commented-out code
+does not become a unit. A symbol whose extent cannot be found falls back to
+a FALLBACK_CHARS excerpt, as units had before.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+FALLBACK_CHARS = 2000
+MAX_HEADER_CHARS = 2000   # from the symbol's offset to its opening brace
+
+@dataclass
+class Block:
+    start: int        # offset of the first line of the symbol
+    end: int          # offset just past the block
+    start_line: int   # 1-based, inclusive
+    end_line: int
+
+# ===================== Tokenizers =====================
+
+_BLOCK_COMMENT = r"/\*[\s\S]*?(?:\*/|\Z)"
+_LINE_COMMENT = r"//[^\n]*"
+_DQ_STRING = r'"(?:[^"\\\n]|\\[\s\S])*"?'
+_SQ_STRING = r"'(?:[^'\\\n]|\\[\s\S])*'?"
+# 'a' '\n' 'é' '\u{1F600}' -- an unmatched quote (Rust lifetime 'a) is left alone
+_CHAR_LITERAL = r"'(?:\\[^'\n]{1,10}|[^\\'\n])'"
+_BACKTICK = r"`(?:[^`\\]|\\[\s\S])*`?"
+_TEXT_BLOCK = r'"""[\s\S]*?(?:"""|\Z)'
+
+def _tokenizer(skips: List[str], structural: str) -> "re.Pattern[str]":
+    return re.compile(f"(?P<skip>{'|'.join(skips)})|(?P<tok>[{re.escape(structural)}])")
+
+_C_LIKE = [_BLOCK_COMMENT, _LINE_COMMENT, _DQ_STRING, _CHAR_LITERAL]
+
+# lang -> (tokenizer, newline ends a header: brace must be on the symbol's line)
+_BRACE_LANGS: Dict[str, tuple] = {
+    "javascript": (_tokenizer([_BLOCK_COMMENT, _LINE_COMMENT, _DQ_STRING, _SQ_STRING, _BACKTICK], "(){};\n"), True),
+    "java": (_tokenizer([_BLOCK_COMMENT, _LINE_COMMENT, _TEXT_BLOCK, _DQ_STRING, _CHAR_LITERAL], "(){};"), False),
+    "go": (_tokenizer(_C_LIKE + [_BACKTICK], "(){};\n"), True),
+    "c": (_tokenizer(_C_LIKE, "(){};"), False),
+    "cpp": (_tokenizer(_C_LIKE, "(){};"), False),
+    "rust": (_tokenizer(_C_LIKE, "(){};"), False),
+    "php": (_tokenizer([_BLOCK_COMMENT, _LINE_COMMENT, r"#[^\n]*", _DQ_STRING, _SQ_STRING], "(){};"), False),
+    "kotlin": (_tokenizer([_BLOCK_COMMENT, _LINE_COMMENT, _TEXT_BLOCK, _DQ_STRING, _CHAR_LITERAL, _BACKTICK],
+                          "(){};\n"), True),
+}
+_INDENT_LANGS = {"ruby"}
+
+_NEWLINE = re.compile(r"\n")
+_RUBY_END = re.compile(r"end\b")
+_RUBY_OPENERS = re.compile(r"(?<![.\w])(?:def|class|module|do|begin|case)\b")
+_RUBY_ENDS = re.compile(r"(?<![.\w])end\b")
+_RUBY_ENDLESS_DEF = re.compile(r"\s*def\s+(?:self\.)?\w+[?!]?(?:\s*\([^)]*\))?\s+=(?!=)")
+_RUBY_COMMENT = re.compile(r"\s#.*$")
+
+def _ruby_closes_itself(head: str) -> bool:
+    """True when a definition line needs no later "end" (one-liner or endless def)."""
+    if _RUBY_ENDLESS_DEF.match(head):
+        return True
+    code = _RUBY_COMMENT.sub("", head)
+    return len(_RUBY_ENDS.findall(code)) >= len(_RUBY_OPENERS.findall(code)) > 0
+
+# ===================== Scanner =====================
+
+class BlockScanner:
+    """Block extents in one file; construct once per file, then call block(offset) per symbol."""
+
+    def __init__(self, text: str, lang: str):
+        self.text = text
+        self.lang = lang
+        self._line_starts = [0] + [m.end() for m in _NEWLINE.finditer(text)]
+        self._pos: List[int] = []
+        self._chars: List[str] = []
+        self._close: Dict[int, int] = {}   # token index of '{' -> token index of its '}'
+        self._skip_starts: List[int] = []  # comment / string spans
+        self._skip_ends: List[int] = []
+        if lang in _BRACE_LANGS:
+            self._tokenize(_BRACE_LANGS[lang][0])
+
+    def _tokenize(self, tokenizer: "re.Pattern[str]"):
+        pos, chars, close, stack = self._pos, self._chars, self._close, []
+        for m in tokenizer.finditer(self.text):
+            c = m.group("tok")
+            if c is None:
+                self._skip_starts.append(m.start())
+                self._skip_ends.append(m.end())
+                continue
+            if c == "{":
+                stack.append(len(pos))
+            elif c == "}" and stack:
+                close[stack.pop()] = len(pos)
+            pos.append(m.start())
+            chars.append(c)
+
+    def in_code(self, offset: int) -> bool:
+        """False when offset lies inside a comment or string literal."""
+        i = bisect_right(self._skip_starts, offset) - 1
+        return i < 0 or offset >= self._skip_ends[i]
+
+    # ---- lines ----
+
+    def line_of(self, offset: int) -> int:
+        """1-based line number containing offset."""
+        return bisect_right(self._line_starts, offset)
+
+    def _line_end(self, line: int) -> int:
+        """Offset of the newline ending a 1-based line (or len(text))."""
+        return self._line_starts[line] - 1 if line < len(self._line_starts) else len(self.text)
+
+    def _make(self, offset: int, end: int) -> Block:
+        start_line = self.line_of(offset)
+        end = max(end, offset + 1)
+        return Block(start=self._line_starts[start_line - 1], end=end,
+                     start_line=start_line, end_line=self.line_of(end - 1))
+
+    # ---- extents ----
+
+    def block(self, offset: int) -> Block:
+        """Extent of the symbol whose header starts at offset."""
+        end = None
+        if self.lang in _BRACE_LANGS:
+            end = self._brace_end(offset)
+        elif self.lang in _INDENT_LANGS:
+            end = self._indent_end(offset)
+        if end is None:
+            end = min(len(self.text), offset + FALLBACK_CHARS)
+        return self._make(offset, end)
+
+    def code(self, block: Block) -> str:
+        return self.text[block.start:block.end]
+
+    def _brace_end(self, offset: int) -> Optional[int]:
+        newline_ends = _BRACE_LANGS[self.lang][1]
+        pos, chars = self._pos, self._chars
+        depth = 0
+        for j in range(bisect_left(pos, offset), len(pos)):
+            if pos[j] - offset > MAX_HEADER_CHARS:
+                return None
+            c = chars[j]
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth = max(depth - 1, 0)
+            elif depth == 0:
+                if c == "{":
+                    k = self._close.get(j)
+                    return pos[k] + 1 if k is not None else None
+                if c == ";":
+                    return pos[j] + 1
+                if c == "}" or (c == "\n" and newline_ends):
+                    # Body-less declaration: ends with the enclosing block or its line
+                    return pos[j]
+        return None
+
+    def _indent_end(self, offset: int) -> Optional[int]:
+        text, starts = self.text, self._line_starts
+        line = self.line_of(offset)
+        head = text[starts[line - 1]:self._line_end(line)]
+        if _ruby_closes_itself(head):
+            return self._line_end(line)
+        indent = len(head) - len(head.lstrip(" \t"))
+        last = line
+        for k in range(line + 1, len(starts) + 1):
+            body = text[starts[k - 1]:self._line_end(k)]
+            stripped = body.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            if len(body) - len(body.lstrip(" \t")) <= indent:
+                if _RUBY_END.match(stripped):
+                    last = k
+                break
+            last = k
+        return self._line_end(last)
@@ -1,5 +1,5 @@
 import argparse
-import ast
+import glob
 import gzip
 import io
 import json
@@ -10,7 +10,7 @@ import tempfile
 import zipfile
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from tqdm import tqdm
 
 import numpy as np
@@ -19,6 +19,17 @@ import pandas as pd
 from dotenv import load_dotenv
 load_dotenv()
 
+from repo_snapshot import RepoSnapshot, snapshot_scope
+from summary_store import SummaryStore, default_summary_store_path, summary_key
+from embedding_store import VECTOR_STORE_FILENAME, EmbeddingStore, text_key
+import vector_index
+import parser_backends
+import python_extract
+from unit_store import TEXTS_FILENAME, write_unit_sidecars
+from sparse_index import BM25_DIRNAME, BM25Index, unit_documents
+from query_cache import get_query_cache
+from progress import JsonLinesSink, ProgressChannel, StageProgress, open_stage
+
 # ===================== Utility Functions (from previous code) =====================
 
 SKIP_DIRS = {
@@ -182,143 +193,76 @@ class Unit:
     summary_embedding: Optional[List[float]] = None  # Embedding for summary
 
 def extract_python_units(path: str, text: str) -> List[Unit]:
-    units: List[Unit] = []
-    try:
-        tree = ast.parse(text)
-    except SyntaxError:
-        return units
-    lines = text.splitlines()
-    def get_segment(node):
-        lineno = getattr(node, "lineno", None)
-        end_lineno = getattr(node, "end_lineno", None)
-        if lineno and end_lineno and 1 <= lineno <= len(lines) and 1 <= end_lineno <= len(lines):
-            return "\n".join(lines[lineno-1:end_lineno]), lineno, end_lineno
-        return None, None, None
-
-    # Top-level file unit
-    units.append(Unit(
-        uid=f"file::{path}",
-        level="file",
-        file_path=path,
-        lang="python",
-        code=text,
-        docstring=ast.get_docstring(tree) or None
-    ))
-
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef) or isinstance(node, ast.AsyncFunctionDef):
-            code, sl, el = get_segment(node)
-            doc = ast.get_docstring(node)
-            sig = f"{node.name}({', '.join(a.arg for a in node.args.args)})"
-            units.append(Unit(
-                uid=f"symbol::{path}::function::{node.name}::{sl or 0}",
-                level="symbol",
-                file_path=path, lang="python",
-                symbol_type="function", symbol_name=node.name,
-                start_line=sl, end_line=el,
-                signature=sig, docstring=doc, code=code
-            ))
-        elif isinstance(node, ast.ClassDef):
-            code, sl, el = get_segment(node)
-            doc = ast.get_docstring(node)
-            units.append(Unit(
-                uid=f"symbol::{path}::class::{node.name}::{sl or 0}",
-                level="symbol",
-                file_path=path, lang="python",
-                symbol_type="class", symbol_name=node.name,
-                start_line=sl, end_line=el,
-                signature=node.name, docstring=doc, code=code
-            ))
-    return units
-
-_ident = r"[A-Za-z_][A-Za-z0-9_]*"
-_js_ident = r"[A-Za-z_$][A-Za-z0-9_$]*"
-
-def extract_js_ts_units(path: str, text: str) -> List[Unit]:
-    units: List[Unit] = [Unit(uid=f"file::{path}", level="file", file_path=path, lang="javascript", code=text)]
-    for m in re.finditer(rf"\bclass\s+({_js_ident})\b", text):
-        name = m.group(1)
-        snippet = text[m.start(): m.start() + 2000]
-        units.append(Unit(uid=f"symbol::{path}::class::{name}::{m.start()}",
-                          level="symbol", file_path=path, lang="javascript",
-                          symbol_type="class", symbol_name=name, start_line=None, end_line=None,
-                          signature=name, code=snippet))
-    patterns = [
-        rf"\bfunction\s+({_js_ident})\s*\(",
-        rf"\bexport\s+function\s+({_js_ident})\s*\(",
-        rf"\b(?:const|let|var)\s+({_js_ident})\s*=\s*function\b",
-        rf"\b(?:const|let|var)\s+({_js_ident})\s*=\s*\(",
-    ]
-    for pat in patterns:
-        for m in re.finditer(pat, text):
-            name = m.group(1)
-            snippet = text[m.start(): m.start() + 2000]
-            units.append(Unit(uid=f"symbol::{path}::function::{name}::{m.start()}",
-                              level="symbol", file_path=path, lang="javascript",
-                              symbol_type="function", symbol_name=name, code=snippet))
+    # One parse shared with build_wiki's graph facts (memoized by content hash)
+    facts = python_extract.extract_python(text)
+    if facts is None:
+        return []
+    units: List[Unit] = [Unit(uid=f"file::{path}", level="file", file_path=path, lang="python",
+                              code=text, docstring=facts.docstring)]
+    for sym in facts.symbols:
+        units.append(Unit(
+            uid=f"symbol::{path}::{sym['symbol_type']}::{sym['symbol_name']}::{sym['start_line'] or 0}",
+            level="symbol", file_path=path, lang="python", **sym,
+        ))
     return units
 
-def extract_simple_block_units(path: str, text: str, lang: str, func_re: str, class_re: Optional[str] = None) -> List[Unit]:
+def extract_parsed_units(path: str, text: str, lang: str) -> List[Unit]:
+    """File unit plus class/function units from the parser backend registry (tree-sitter or regex)."""
     units: List[Unit] = [Unit(uid=f"file::{path}", level="file", file_path=path, lang=lang, code=text)]
-    if class_re:
-        for m in re.finditer(class_re, text):
-            name = m.group(1)
-            snippet = text[m.start(): m.start()+2000]
-            units.append(Unit(uid=f"symbol::{path}::class::{name}::{m.start()}",
-                              level="symbol", file_path=path, lang=lang,
-                              symbol_type="class", symbol_name=name, code=snippet))
-    for m in re.finditer(func_re, text):
-        name = m.group(1)
-        snippet = text[m.start(): m.start()+2000]
-        units.append(Unit(uid=f"symbol::{path}::function::{name}::{m.start()}",
+    parsed = parser_backends.parse(text, lang, ext=os.path.splitext(path)[1])
+    for sym in parsed.symbols if parsed is not None else []:
+        units.append(Unit(uid=f"symbol::{path}::{sym.kind}::{sym.name}::{sym.start_line}",
                           level="symbol", file_path=path, lang=lang,
-                          symbol_type="function", symbol_name=name, code=snippet))
+                          symbol_type=sym.kind, symbol_name=sym.name,
+                          start_line=sym.start_line, end_line=sym.end_line,
+                          signature=sym.name if sym.kind == "class" else None, code=sym.code))
+    return units
+
+# Bump when the uid format changes; incremental builds from an older format are rebuilt
+UNIT_UID_VERSION = 2
+
+def dedupe_uids(units: List[Unit]) -> List[Unit]:
+    """
+    Suffix repeated uids with #2, #3, ... in source order, e.g. two symbols
+    of the same kind and name starting on one (minified) line.
+    """
+    seen: Dict[str, int] = {}
+    for u in units:
+        n = seen.get(u.uid, 0) + 1
+        seen[u.uid] = n
+        if n > 1:
+            u.uid = f"{u.uid}#{n}"
     return units
 
 def extract_units_for_file(path: str, text: str) -> List[Unit]:
     lang = detect_lang(path)
     if lang == "python":
-        return extract_python_units(path, text)
-    if lang == "javascript":
-        return extract_js_ts_units(path, text)
-    if lang == "java":
-        return extract_simple_block_units(path, text, "java",
-            func_re=rf"\b({_ident})\s*\([^;]*\)\s*\{{", class_re=rf"\bclass\s+({_ident})\b")
-    if lang == "go":
-        return extract_simple_block_units(path, text, "go",
-            func_re=rf"\bfunc\s+(?:\([^)]+\)\s*)?({_ident})\s*\(", class_re=rf"\btype\s+({_ident})\s+struct\b")
-    if lang in ("c","cpp"):
-        return extract_simple_block_units(path, text, lang,
-            func_re=rf"(?m)^[ \t]*(?:[_A-Za-z]\w*[\s\*\&\<\>:]+)+({_ident})\s*\([^;{{\)]*\)\s*\{{",
-            class_re=rf"\b(class|struct)\s+({_ident})\b")
-    if lang == "rust":
-        return extract_simple_block_units(path, text, "rust",
-            func_re=rf"\bfn\s+({_ident})\s*\(", class_re=rf"\b(struct|enum)\s+({_ident})\b")
-    if lang == "ruby":
-        return extract_simple_block_units(path, text, "ruby",
-            func_re=rf"(?m)^\s*def\s+({_ident})\b", class_re=rf"\bclass\s+({_ident})\b")
-    if lang == "php":
-        return extract_simple_block_units(path, text, "php",
-            func_re=rf"\bfunction\s+({_ident})\s*\(", class_re=rf"\bclass\s+({_ident})\b")
-    if lang == "kotlin":
-        return extract_simple_block_units(path, text, "kotlin",
-            func_re=rf"\bfun\s+({_ident})\s*\(", class_re=rf"\b(class|object|interface)\s+({_ident})\b")
+        return dedupe_uids(extract_python_units(path, text))
+    if lang != "text":
+        return dedupe_uids(extract_parsed_units(path, text, lang))
     return [Unit(uid=f"file::{path}", level="file", file_path=path, lang=lang, code=text)]
 
 # ===================== Summarization (QGenie, always) =====================
 
-def summarize_units_with_qgenie(units: List[Unit], model_name):
-    from qgenie import QGenieClient, ChatMessage
-    client = QGenieClient(timeout=100)
-    for u in tqdm(units, desc="Summarizing units with QGenie"):
-        snippet = u.code or ""
-        if not snippet.strip():
-            u.summary = ""
-            continue
-        doc_hint = u.docstring or ""
-        role = f"{u.symbol_type or 'file'}"
-        name = u.symbol_name or os.path.basename(u.file_path)
-        prompt = f"""Summarize the following {role} '{name}' for semantic search.
+# Bump whenever build_summary_prompt changes so stored summaries are not reused.
+SUMMARY_PROMPT_VERSION = "v1"
+SUMMARY_CODE_CHARS = 4000
+
+def summary_prompt_name(u: Unit) -> str:
+    return u.symbol_name or os.path.basename(u.file_path)
+
+def unit_summary_key(u: Unit, model_name: Optional[str]) -> str:
+    """Content key for the summary store: exactly what the prompt sends."""
+    return summary_key(code=(u.code or "")[:SUMMARY_CODE_CHARS], docstring=u.docstring or "",
+                       role=u.symbol_type or "file", name=summary_prompt_name(u),
+                       model=model_name, prompt_version=SUMMARY_PROMPT_VERSION)
+
+def build_summary_prompt(u: Unit) -> str:
+    doc_hint = u.docstring or ""
+    role = f"{u.symbol_type or 'file'}"
+    name = summary_prompt_name(u)
+    snippet = u.code or ""
+    return f"""Summarize the following {role} '{name}' for semantic search.
 
 Return 2-4 sentences covering:
 - Purpose and what it does,
@@ -330,36 +274,214 @@ Docstring (may be empty):
 {doc_hint}
 
 Code (excerpt):
-{snippet[:4000]}
+{snippet[:SUMMARY_CODE_CHARS]}
 """
+
+def summarize_units_with_qgenie(units: List[Unit], model_name, max_workers: int = 8,
+                                requests_per_sec: Optional[float] = None, max_retries: int = 3,
+                                on_summary: Optional[Callable[[Unit, str], None]] = None,
+                                progress: Optional[StageProgress] = None) -> Dict[str, float]:
+    """
+    Summarize units concurrently: at most max_workers chat calls in flight,
+    optionally rate limited to requests_per_sec, each retried with jittered backoff.
+    Summaries are written back onto the units in place (order is unaffected);
+    on_summary(unit, summary) is called from the worker as each one succeeds.
+    progress (a progress.StageProgress) advances as each unit finishes.
+    Returns throughput stats (units/sec, tokens/sec).
+    """
+    import llm_client
+    from concurrency import TokenBucket, ThroughputMeter, call_with_retry, estimate_tokens, map_ordered
+
+    bucket = TokenBucket(requests_per_sec) if requests_per_sec else None
+    meter = ThroughputMeter()
+
+    def summarize_one(u: Unit) -> str:
+        if not (u.code or "").strip():
+            return ""
+        prompt = build_summary_prompt(u)
+        # Retried here rather than in llm_client so every attempt goes through the rate limiter
+        def call():
+            if bucket:
+                bucket.acquire()
+            return llm_client.chat(prompt, model=model_name, max_retries=0)
         try:
-            resp = client.chat(messages=[ChatMessage(role="user", content=prompt)],model=model_name)
-            u.summary = getattr(resp, "first_content", None) or str(resp)
+            summary = call_with_retry(call, max_retries=max_retries)
         except Exception as e:
             print(f"[WARN] QGenie summarization failed for {u.uid}: {e}", file=sys.stderr)
-            u.summary = ""
+            return ""
+        meter.record(1, estimate_tokens(prompt) + estimate_tokens(summary))
+        if on_summary:
+            on_summary(u, summary)
+        return summary
+
+    with tqdm(total=len(units), desc="Summarizing units with QGenie") as bar:
+        def on_done(i: int, _):
+            bar.update(1)
+            if progress:
+                progress.advance(1, message=units[i].uid)
+        summaries = map_ordered(summarize_one, units, max_workers=max_workers, on_done=on_done)
+    for u, summary in zip(units, summaries):
+        u.summary = summary
+
+    stats = meter.report()
+    print(f"[INFO] Summarized {stats['items']} units in {stats['seconds']}s "
+          f"({stats['items_per_sec']} units/sec, {stats['tokens_per_sec']} tokens/sec, workers={max_workers})")
+    return stats
 
 # ===================== Embedding + FAISS =====================
 
-def embed_texts(texts: List[str], device: Optional[str] = None) -> np.ndarray:
-    from qgenie import QGenieClient
-    client = QGenieClient(timeout=100)
-    embedding_response = client.embeddings(texts,model="qgenie_embedd" )
-    embeddings = [item.embedding for item in embedding_response.data]
-    return np.asarray(embeddings, dtype=np.float32)
+EMBED_MODEL = "qgenie_embedd"
+EMBED_BATCH_SIZE = 64
+EMBED_MAX_TOKENS_PER_BATCH = 32000
+EMBED_WORKERS = 4
 
-def build_faiss_index(embeddings: np.ndarray):
+def make_embedding_batches(texts: List[str], batch_size: int = EMBED_BATCH_SIZE,
+                           max_tokens_per_batch: int = EMBED_MAX_TOKENS_PER_BATCH) -> List[Tuple[int, int]]:
+    """
+    Split texts into contiguous [start, end) ranges holding at most batch_size
+    texts and about max_tokens_per_batch tokens (an oversized text gets its own batch).
+    """
+    from concurrency import estimate_tokens
+    batches = []
+    start, tokens = 0, 0
+    for i, t in enumerate(texts):
+        n = estimate_tokens(t)
+        if i > start and (i - start >= batch_size or tokens + n > max_tokens_per_batch):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += n
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+def embed_texts(texts: List[str], device: Optional[str] = None, batch_size: int = EMBED_BATCH_SIZE,
+                max_tokens_per_batch: int = EMBED_MAX_TOKENS_PER_BATCH, max_workers: int = EMBED_WORKERS,
+                max_retries: int = 3, progress: Optional[StageProgress] = None) -> np.ndarray:
+    """
+    Embed texts in token-bounded batches, several batches in flight at once.
+    A failed batch is retried on its own; vectors are written straight into a
+    preallocated float32 matrix in input order.
+    progress (a progress.StageProgress) advances by the texts of each finished batch.
+    """
+    import llm_client
+    from concurrency import map_ordered
+
+    def embed_batch(span: Tuple[int, int]) -> np.ndarray:
+        start, end = span
+        vecs = llm_client.embeddings(texts[start:end], model=EMBED_MODEL, max_retries=max_retries)
+        if vecs.shape[0] != end - start:
+            raise RuntimeError(f"Embedding batch [{start}:{end}) returned {vecs.shape[0]} vectors")
+        return vecs
+
+    batches = make_embedding_batches(texts, batch_size=batch_size, max_tokens_per_batch=max_tokens_per_batch)
+    if not batches:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    # The first batch fixes the dimension so the output matrix can be preallocated
+    first = embed_batch(batches[0])
+    out = np.empty((len(texts), first.shape[1]), dtype=np.float32)
+    out[:first.shape[0]] = first
+    if progress:
+        progress.advance(first.shape[0])
+
+    def fill(span: Tuple[int, int]) -> None:
+        out[span[0]:span[1]] = embed_batch(span)
+
+    with tqdm(total=len(texts), initial=first.shape[0], desc="Embedding texts", disable=len(batches) == 1) as bar:
+        def on_done(i: int, _):
+            n = batches[i + 1][1] - batches[i + 1][0]
+            bar.update(n)
+            if progress:
+                progress.advance(n)
+        map_ordered(fill, batches[1:], max_workers=max_workers, on_done=on_done)
+    return out
+
+def embed_texts_cached(texts: List[str], store: EmbeddingStore, model: str = EMBED_MODEL,
+                       progress: Optional[StageProgress] = None) -> np.ndarray:
+    """
+    Embed texts through the sidecar store: only texts whose (model, text) hash
+    is not stored yet are sent to the embedding API.
+    """
+    keys = [text_key(t, model) for t in texts]
+    found = store.get_many(keys)
+    missing = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in missing:
+            missing[k] = t
+    if progress:
+        progress.advance(len(texts) - len(missing))
+    if missing:
+        print(f"[INFO] Embedding {len(missing)}/{len(texts)} new or changed texts")
+        new_vecs = embed_texts(list(missing.values()), progress=progress)
+        store.put_many(list(missing.keys()), new_vecs)
+        found.update(zip(missing.keys(), new_vecs))
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack([found[k] for k in keys]).astype(np.float32, copy=False)
+
+def build_faiss_index(embeddings: np.ndarray, ids: Optional[List[str]] = None,
+                      spec: Optional[Dict[str, Any]] = None):
+    """
+    Inner-product index; ID-mapped by uid label when ids are given. `spec`
+    (see vector_index.choose_index_spec) selects flat / HNSW / IVF / IVF-PQ.
+    """
     import faiss
+    if ids is not None:
+        return vector_index.build_id_index(embeddings, ids, spec=spec)
     dim = embeddings.shape[1]
     index = faiss.IndexFlatIP(dim)
     index.add(embeddings)
     return index
 
-def save_index(index, ids: List[str], out_dir: str, prefix: str):
+def update_faiss_index(out_dir: str, prefix: str, embeddings: np.ndarray, ids: List[str],
+                       changed_ids: Optional[set] = None, spec: Optional[Dict[str, Any]] = None):
+    """
+    Incrementally update <prefix>.index: remove vectors of stale or changed uids
+    and upsert the changed/new ones. Falls back to a full build when there is
+    no usable ID-mapped index on disk, changed_ids is None, the on-disk index
+    kind differs from `spec`, the index cannot be updated in place (HNSW,
+    IVF / IVF-PQ), or the updated index fails a self-recall check.
+    """
+    index_path = os.path.join(out_dir, f"{prefix}.index")
+    kind = (spec or {}).get("kind", "flat")
+    if changed_ids is not None and os.path.exists(index_path):
+        try:
+            import faiss
+            index = faiss.read_index(index_path)
+            if not vector_index.is_id_mapped(index) or vector_index.index_kind(index) != kind:
+                print(f"[INFO] {prefix}.index: index type changed, rebuilding")
+            elif not vector_index.supports_remove(index):
+                print(f"[INFO] {prefix}.index: {kind} cannot be updated in place, rebuilding")
+            elif index.d == embeddings.shape[1]:
+                # Diff on the labels stored in the index itself, so no previous id list is needed
+                labels = vector_index.uid_labels(ids)
+                changed = vector_index.uid_labels(changed_ids)
+                previous = vector_index.index_labels(index)
+                drop = previous[~np.isin(previous, labels) | np.isin(previous, changed)]
+                rows = np.flatnonzero(np.isin(labels, changed) | ~np.isin(labels, previous))
+                if len(drop):
+                    index.remove_ids(drop)
+                vector_index.add_uids(index, embeddings[rows], [ids[i] for i in rows])
+                if index.ntotal != len(ids):
+                    print(f"[WARN] {prefix}.index out of sync after update, rebuilding")
+                else:
+                    # Every upserted vector (and a sample of the rest) must find its own label
+                    recall = vector_index.self_recall(index, embeddings, ids, rows=rows)
+                    if recall is None or recall >= 1.0:
+                        print(f"[INFO] {prefix}.index: -{len(drop)} +{len(rows)} vectors (incremental)")
+                        return index
+                    print(f"[WARN] {prefix}.index self-recall {recall} after update, rebuilding")
+        except Exception as e:
+            print(f"[WARN] Incremental update of {prefix}.index failed ({e}), rebuilding")
+    return build_faiss_index(embeddings, ids, spec=spec)
+
+def save_index(index, ids: List[str], out_dir: str, prefix: str, ids_prefix: Optional[str] = None):
     import faiss
     index_path = os.path.join(out_dir, f"{prefix}.index")
-    ids_path = os.path.join(out_dir, f"{prefix}_ids.json")
-    faiss.write_index(index, index_path)
+    ids_path = os.path.join(out_dir, f"{ids_prefix or prefix}_ids.json")
+    # Readers memory-map the index: write a new file and swap it in rather than overwrite
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
     with open(ids_path, "w", encoding="utf-8") as f:
         json.dump(ids, f, ensure_ascii=False, indent=2)
     return index_path, ids_path
@@ -379,6 +501,19 @@ def units_to_dataframe(units: List[Unit]) -> pd.DataFrame:
         })
     return pd.DataFrame.from_records(recs)
 
+def units_from_dataframe(df: pd.DataFrame) -> List[Unit]:
+    """Rebuild Unit records from units.parquet rows (summary_embedding is not carried over)."""
+    def clean(v):
+        return None if v is None or (isinstance(v, float) and np.isnan(v)) else v
+    units = []
+    for rec in df.drop(columns=["summary_embedding"], errors="ignore").to_dict("records"):
+        rec = {k: clean(rec.get(k)) for k in Unit.__dataclass_fields__ if k in rec}
+        for k in ("start_line", "end_line"):
+            if rec.get(k) is not None:
+                rec[k] = int(rec[k])
+        units.append(Unit(**rec))
+    return units
+
 def save_parquet(df: pd.DataFrame, path: str):
     try:
         df.to_parquet(path, index=False)
@@ -390,109 +525,183 @@ def save_parquet(df: pd.DataFrame, path: str):
 # ===================== Query (hybrid, code or summary) =====================
 
 def hybrid_query(query: str, out_dir: str, topk: int = 5, mode: str = "summary") -> List[Dict[str, Any]]:
-    import faiss
-    # Load ids
-    file_ids_path = os.path.join(out_dir, "file_ids.json")
-    symbol_ids_path = os.path.join(out_dir, "symbol_ids.json")
-    with open(file_ids_path, "r", encoding="utf-8") as f:
-        file_ids = json.load(f)
-    with open(symbol_ids_path, "r", encoding="utf-8") as f:
-        symbol_ids = json.load(f)
-
-    # Load indices
-    if mode == "summary":
-        file_index = faiss.read_index(os.path.join(out_dir, "file_summary.index"))
-        symbol_index = faiss.read_index(os.path.join(out_dir, "symbol_summary.index"))
-    else:
-        file_index = faiss.read_index(os.path.join(out_dir, "file.index"))
-        symbol_index = faiss.read_index(os.path.join(out_dir, "symbol.index"))
-
-    qvec = embed_texts([query])[0].reshape(1, -1)
+    # One index per kind; file/symbol hits come from level-restricted searches
+    index, _, resolver = vector_index.load_prefix(out_dir, "summary" if mode == "summary" else "code")
 
-    Df, If = file_index.search(qvec, topk)
-    Ds, Is = symbol_index.search(qvec, topk)
+    qvec = get_query_cache().embed([query], model=EMBED_MODEL, embed_fn=embed_texts)[0].reshape(1, -1)
 
     hits = []
-    for score, idx in zip(Df[0].tolist(), If[0].tolist()):
-        hits.append({"source": "file", "uid": file_ids[idx], "score": float(score)})
-    for score, idx in zip(Ds[0].tolist(), Is[0].tolist()):
-        hits.append({"source": "symbol", "uid": symbol_ids[idx], "score": float(score)})
+    for level in ("file", "symbol"):
+        for uid, score in vector_index.search(index, resolver, qvec, topk, level=level):
+            hits.append({"source": level, "uid": uid, "score": score})
 
     hits.sort(key=lambda x: x["score"], reverse=True)
     return hits[:topk]
 
+# ===================== Migration =====================
+
+def renormalize_embeddings_dir(emb_dir: str) -> bool:
+    """
+    Rebuild every FAISS index in an embeddings dir over L2-normalized vectors
+    and mark meta.json with "normalized": true. Returns False if already done.
+    """
+    import faiss
+    meta_path = os.path.join(emb_dir, "meta.json")
+    doc = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    if doc.get("meta", {}).get("normalized"):
+        return False
+    for name in sorted(os.listdir(emb_dir)):
+        if not name.endswith(".index"):
+            continue
+        path = os.path.join(emb_dir, name)
+        faiss.write_index(vector_index.renormalize_index(faiss.read_index(path)), path)
+        print(f"[INFO] Re-normalized {path}")
+    doc.setdefault("meta", {})["normalized"] = True
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+    return True
+
+def renormalize_cache(cache_root: str = ".cache") -> int:
+    """Apply renormalize_embeddings_dir to every <cache_root>/*/embeddings; returns dirs migrated."""
+    migrated = 0
+    for emb_dir in sorted(glob.glob(os.path.join(cache_root, "*", "embeddings"))):
+        try:
+            migrated += renormalize_embeddings_dir(emb_dir)
+        except Exception as e:
+            print(f"[WARN] Failed to re-normalize {emb_dir}: {e}")
+    print(f"[INFO] Re-normalized {migrated} embeddings dir(s) under {cache_root}")
+    return migrated
+
 # ===================== Main Pipeline =====================
  
-def build_embeddings_for_repo(github_url: str, token: Optional[str] = None, output_root=None, MAX_FILES=None, force_summarize=False, model_name=None) -> str:
+FILES_MANIFEST = "files_manifest.json"
+ 
+def load_previous_build(out_dir: str) -> Optional[Tuple[Dict[str, str], pd.DataFrame]]:
+    """(per-file content hashes, units dataframe) of the last build, if both exist."""
+    manifest_path = os.path.join(out_dir, FILES_MANIFEST)
+    units_path = os.path.join(out_dir, "units.parquet")
+    if not (os.path.exists(manifest_path) and os.path.exists(units_path)):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            hashes = json.load(f).get("files", {})
+        return hashes, pd.read_parquet(units_path)
+    except Exception as e:
+        print(f"[WARN] Failed to load previous build for incremental update: {e}")
+        return None
+ 
+def _adopt_legacy_summaries(units: List[Unit], units_df_path: str, store: SummaryStore, model_name) -> int:
+    """
+    One-time migration for caches written before the summary store existed:
+    reuse a units.parquet summary when the uid matches and the code is unchanged.
+    """
+    pending = {u.uid: u for u in units if u.summary is None}
+    if not pending or not os.path.exists(units_df_path):
+        return 0
+    try:
+        cached_df = pd.read_parquet(units_df_path, columns=["uid", "code", "summary"])
+    except Exception as e:
+        print(f"[WARN] Failed to read legacy summaries: {e}")
+        return 0
+    adopted = {}
+    for uid, code, summary in zip(cached_df["uid"], cached_df["code"], cached_df["summary"]):
+        u = pending.get(uid)
+        if u is not None and summary and code == u.code:
+            u.summary = summary
+            adopted[unit_summary_key(u, model_name)] = summary
+    store.put_many(adopted, model=model_name)
+    return len(adopted)
+ 
+def build_embeddings_for_repo(github_url: str, token: Optional[str] = None, output_root=None, MAX_FILES=None, force_summarize=False, model_name=None,
+                              snapshot: Optional[RepoSnapshot] = None, summary_workers: int = 8,
+                              summary_rps: Optional[float] = None, summary_store_path: Optional[str] = None,
+                              incremental: bool = False, index_kind: str = "auto",
+                              progress: Optional[ProgressChannel] = None) -> str:
     """
     Build embeddings for a repository with intelligent caching.
+    Pass a shared RepoSnapshot to reuse a checkout that other pipelines also consume.
+    summary_workers / summary_rps bound the concurrency and request rate of summarization.
+    Summaries are reused from the content-addressed store (shared across repos by default).
+    With incremental=True, files whose content hash matches the previous build's
+    files_manifest.json keep their units, and the FAISS indices are updated in place.
+    index_kind selects the FAISS index type ("auto", "flat", "hnsw", "ivf", "ivfpq").
+    progress receives "summarize", "embed" and "index" stage events.
     Returns the output directory path.
     """
-    # Build units
-    gid, meta, units = build_units_for_repo(github_url, token=token, output_root=output_root, MAX_FILES=MAX_FILES)
-    
     if output_root is None:
         out_dir = default_output_dir(github_url)
     else:
         out_dir = os.path.join(output_root, "embeddings")
     ensure_dir(out_dir)
  
+    previous = load_previous_build(out_dir) if incremental and not force_summarize else None
+    previous_meta = {}
+    if previous and os.path.exists(os.path.join(out_dir, "meta.json")):
+        with open(os.path.join(out_dir, "meta.json"), "r", encoding="utf-8") as f:
+            previous_meta = json.load(f).get("meta", {})
+    if previous and previous_meta.get("uid_version") != UNIT_UID_VERSION:
+        # Reused units would keep old-format uids and mix with new ones
+        print("[INFO] Previous build uses an older unit uid format, rebuilding all units")
+        previous, previous_meta = None, {}
+ 
+    # Build units (only for changed files when a previous build is available)
+    gid, meta, units = build_units_for_repo(github_url, token=token, output_root=output_root, MAX_FILES=MAX_FILES,
+                                            snapshot=snapshot, previous_hashes=previous[0] if previous else None)
+    file_hashes = meta.pop("file_hashes")
+    unchanged_files = set(meta.pop("unchanged_files"))
+    changed_uids = None
+    if previous:
+        changed_uids = {u.uid for u in units}
+        prev_df = previous[1]
+        units = units_from_dataframe(prev_df[prev_df["file_path"].isin(unchanged_files)]) + units
+        file_order = {path: i for i, path in enumerate(file_hashes)}
+        units.sort(key=lambda u: file_order.get(u.file_path, len(file_order)))
+        removed = set(previous[0]) - set(file_hashes)
+        print(f"[INFO] Incremental: {len(unchanged_files)} unchanged, "
+              f"{len(file_hashes) - len(unchanged_files)} changed/new, {len(removed)} removed files")
+    meta["totals"]["units"] = len(units)
+ 
     print(f"[INFO] Repo graph_id: {gid}; units: {len(units)}")
  
-    # Check if summaries already exist in cache
-    units_df_path = os.path.join(out_dir, "units.parquet")
-    needs_summarization = force_summarize
-    
-    if not needs_summarization and os.path.exists(units_df_path):
-        try:
-            cached_df = pd.read_parquet(units_df_path)
-            if "summary" in cached_df.columns and cached_df["summary"].notna().any():
-                print("[INFO] Found cached summaries, loading from cache...")
-                # Load summaries from cache back into units
-                summary_dict = dict(zip(cached_df["uid"], cached_df["summary"]))
-                summaries_loaded = 0
-                for unit in units:
-                    if unit.uid in summary_dict and summary_dict[unit.uid]:
-                        unit.summary = summary_dict[unit.uid]
-                        summaries_loaded += 1
-                
-                # Only skip summarization if we successfully loaded summaries for all units
-                if summaries_loaded > 0:
-                    print(f"[INFO] Loaded {summaries_loaded} summaries from cache")
-                    # Check if we have summaries for most units (allow some missing)
-                    if summaries_loaded >= len(units) * 0.8:  # At least 80% of units have summaries
-                        needs_summarization = False
-                        print("[INFO] Sufficient summaries loaded from cache, skipping summarization")
-                    else:
-                        print(f"[INFO] Only {summaries_loaded}/{len(units)} summaries found, will re-summarize")
-                        needs_summarization = True
-                else:
-                    print("[INFO] No valid summaries found in cache, will summarize")
-                    needs_summarization = True
-            else:
-                print("[INFO] No summary column found in cache, will summarize")
-                needs_summarization = True
-        except Exception as e:
-            print(f"[WARN] Failed to load cached summaries: {e}")
-            needs_summarization = True
+    # Summaries come from the content-addressed store; only changed content goes to the LLM
+    store = SummaryStore(summary_store_path or default_summary_store_path(out_dir))
+    for u in units:
+        if not (u.code or "").strip():
+            u.summary = ""
+ 
+    if force_summarize:
+        print("[INFO] Force summarization requested")
     else:
-        if force_summarize:
-            print("[INFO] Force summarization requested")
-        else:
-            print("[INFO] No cached units.parquet found, will summarize")
-        needs_summarization = True
- 
-    # Summarize only if needed
-    if needs_summarization:
-        print("[INFO] Summarizing units with QGenie...")
-        summarize_units_with_qgenie(units, model_name=model_name)
+        keys = [unit_summary_key(u, model_name) if u.summary is None else None for u in units]
+        stored = store.get_many(k for k in keys if k)
+        for u, k in zip(units, keys):
+            if k in stored:
+                u.summary = stored[k]
+        adopted = _adopt_legacy_summaries(units, os.path.join(out_dir, "units.parquet"), store, model_name)
+        hits = sum(1 for k in keys if k and k in stored)
+        print(f"[INFO] Summary store hits: {hits} units ({len(stored)} distinct summaries, "
+              f"+{adopted} units migrated from units.parquet)")
+ 
+    pending = [u for u in units if u.summary is None]
+    if pending:
+        print(f"[INFO] Summarizing {len(pending)}/{len(units)} units with QGenie...")
+        summarize_stage = open_stage(progress, "summarize", total=len(pending))
+        summarize_units_with_qgenie(pending, model_name=model_name, max_workers=summary_workers,
+                                    requests_per_sec=summary_rps,
+                                    on_summary=lambda u, summary: store.put(unit_summary_key(u, model_name), summary, model=model_name),
+                                    progress=summarize_stage)
+        if summarize_stage:
+            summarize_stage.finish()
     else:
-        print("[INFO] Using cached summaries, skipping summarization")
+        print("[INFO] All summaries found in the summary store, skipping summarization")
+    store.close()
  
     # Pack dataframe
     df = units_to_dataframe(units)
     df_path = os.path.join(out_dir, "units.parquet")
-    save_parquet(df, df_path)
  
     # Prepare embedding texts
     file_mask = (df["level"] == "file")
@@ -522,106 +731,117 @@ def build_embeddings_for_repo(github_url: str, token: Optional[str] = None, outp
     file_summary_texts = file_df["summary"].fillna("").tolist()
     sym_summary_texts = sym_df["summary"].fillna("").tolist()
  
-    # Check if embeddings already exist in cached dataframe
-    embeddings_exist = False
-    file_summary_vecs = None
-    sym_summary_vecs = None
-    
-    if os.path.exists(df_path):
-        try:
-            cached_df = pd.read_parquet(df_path)
-            if ("summary_embedding" in cached_df.columns and 
-                cached_df["summary_embedding"].notna().any() and
-                len(cached_df["summary_embedding"].iloc[0]) > 0):
-                print("[INFO] Found cached embeddings, loading from cache...")
-                # Load embeddings from cache
-                file_mask_cached = (cached_df["level"] == "file")
-                sym_mask_cached = (cached_df["level"] == "symbol")
-                file_df_cached = cached_df[file_mask_cached].copy()
-                sym_df_cached = cached_df[sym_mask_cached].copy()
-                
-                file_summary_vecs = np.array(file_df_cached["summary_embedding"].tolist())
-                sym_summary_vecs = np.array(sym_df_cached["summary_embedding"].tolist())
-                
-                # For code embeddings, we need to regenerate them since they're not cached
-                # But we can skip if FAISS indices exist
-                faiss_files_exist = all(os.path.exists(os.path.join(out_dir, f"{prefix}.index")) 
-                                      for prefix in ["file", "symbol", "file_summary", "symbol_summary"])
-                
-                if faiss_files_exist:
-                    print("[INFO] Found FAISS indices, loading cached embeddings...")
-                    embeddings_exist = True
-                else:
-                    print("[INFO] FAISS indices missing, regenerating code embeddings...")
-                    embeddings_exist = False
-        except Exception as e:
-            print(f"[WARN] Failed to load cached embeddings: {e}")
-            embeddings_exist = False
- 
-    # Always generate code embeddings (they're not cached)
+    # Code and summary embeddings are persisted in the sidecar vector store keyed by text hash;
+    # unchanged texts are served from it, so a no-change rebuild makes no embedding calls.
+    vector_store = EmbeddingStore(os.path.join(out_dir, VECTOR_STORE_FILENAME))
+    embed_stage = open_stage(progress, "embed", total=2 * len(df))
     print("[INFO] Embedding file-level code texts...")
-    file_code_vecs = embed_texts(file_code_texts)
+    file_code_vecs = embed_texts_cached(file_code_texts, vector_store, progress=embed_stage)
     print("[INFO] Embedding symbol-level code texts...")
-    sym_code_vecs = embed_texts(sym_code_texts)
- 
-    # Generate summary embeddings only if not cached
-    if not embeddings_exist or file_summary_vecs is None:
-        print("[INFO] Embedding file-level summaries...")
-        file_summary_vecs = embed_texts(file_summary_texts)
-        print("[INFO] Embedding symbol-level summaries...")
-        sym_summary_vecs = embed_texts(sym_summary_texts)
-    else:
-        print("[INFO] Using cached summary embeddings")
+    sym_code_vecs = embed_texts_cached(sym_code_texts, vector_store, progress=embed_stage)
+    print("[INFO] Embedding file-level summaries...")
+    file_summary_vecs = embed_texts_cached(file_summary_texts, vector_store, progress=embed_stage)
+    print("[INFO] Embedding symbol-level summaries...")
+    sym_summary_vecs = embed_texts_cached(sym_summary_texts, vector_store, progress=embed_stage)
+    # Drop vectors of texts this build no longer has, so the store tracks the repo instead of growing
+    live_keys = {text_key(t, EMBED_MODEL)
+                 for texts in (file_code_texts, sym_code_texts, file_summary_texts, sym_summary_texts) for t in texts}
+    pruned = vector_store.retain(live_keys)
+    if pruned:
+        print(f"[INFO] Pruned {pruned} unreferenced vectors from {VECTOR_STORE_FILENAME}")
+    vector_store.close()
+    if embed_stage:
+        embed_stage.finish()
  
     # Save summary embeddings in dataframe
-    file_df["summary_embedding"] = file_summary_vecs.tolist()
-    sym_df["summary_embedding"] = sym_summary_vecs.tolist()
- 
-    # FAISS indices
+    summary_col = df["summary_embedding"].tolist()
+    for pos, vec in zip(np.flatnonzero(file_mask.to_numpy()), file_summary_vecs.tolist()):
+        summary_col[pos] = vec
+    for pos, vec in zip(np.flatnonzero(sym_mask.to_numpy()), sym_summary_vecs.tolist()):
+        summary_col[pos] = vec
+    df["summary_embedding"] = summary_col
+    save_parquet(df, df_path)
+    # Text + label sidecars so query processes load metadata only and fetch texts by row
+    write_unit_sidecars(df, out_dir)
+    # Sparse (BM25) channel over identifiers, summaries and code, same row ids
+    BM25Index.build(unit_documents(df)).save(out_dir)
+ 
+    # FAISS indices: one per embedding kind (code, summary) over file + symbol units,
+    # ID-mapped by uid label and updated in place on incremental builds. Level-restricted
+    # searches go through vector_index.search(level=...), so no per-level copies are kept.
+    # The index type follows index_kind ("auto" picks flat/HNSW/IVF-PQ by corpus size);
+    # approximate indices get a recall@10 check against exact search.
+    # Vectors are L2-normalized so inner product ranks by cosine (the store keeps raw vectors).
     print("[INFO] Building FAISS indices...")
-    file_index = build_faiss_index(file_code_vecs)
-    sym_index = build_faiss_index(sym_code_vecs)
-    file_summary_index = build_faiss_index(file_summary_vecs)
-    sym_summary_index = build_faiss_index(sym_summary_vecs)
- 
-    # Save indices + ids
-    file_ids = file_df["uid"].tolist()
-    symbol_ids = sym_df["uid"].tolist()
-    save_index(file_index, file_ids, out_dir, "file")
-    save_index(sym_index, symbol_ids, out_dir, "symbol")
-    save_index(file_summary_index, file_ids, out_dir, "file_summary")
-    save_index(sym_summary_index, symbol_ids, out_dir, "symbol_summary")
-    
-    # Create combined indices for generate_wiki_pages.py compatibility
-    # Combined code index (file + symbol)
-    combined_code_index = build_faiss_index(np.vstack([file_code_vecs, sym_code_vecs]))
-    combined_code_ids = file_ids + symbol_ids
-    save_index(combined_code_index, combined_code_ids, out_dir, "code")
-    
-    # Combined summary index (file + symbol)
-    combined_summary_index = build_faiss_index(np.vstack([file_summary_vecs, sym_summary_vecs]))
-    combined_summary_ids = file_ids + symbol_ids
-    save_index(combined_summary_index, combined_summary_ids, out_dir, "summary")
- 
-    # Save meta
+    index_stage = open_stage(progress, "index", total=2)
+    index_specs: Dict[str, Dict[str, Any]] = {}
+    unit_ids = file_df["uid"].tolist() + sym_df["uid"].tolist()
+    # Index labels are uid hashes: a repeated uid would alias two vectors
+    if len(set(unit_ids)) != len(unit_ids):
+        seen_ids: set = set()
+        dupes = [uid for uid in unit_ids if uid in seen_ids or seen_ids.add(uid)]
+        raise RuntimeError(f"{len(dupes)} duplicate unit uids, e.g. {dupes[:3]}")
+    # Indices from builds that predate normalization are rebuilt rather than patched
+    if changed_uids is not None and not previous_meta.get("normalized"):
+        changed_uids = None
+
+    def build_and_save(prefix: str, vecs: np.ndarray):
+        vecs = vector_index.normalize(vecs) if len(vecs) else vecs
+        spec = vector_index.choose_index_spec(len(unit_ids), vecs.shape[1], index_kind)
+        index = update_faiss_index(out_dir, prefix, vecs, unit_ids, changed_uids, spec=spec)
+        if spec["kind"] != "flat":
+            spec["recall_at_10"] = vector_index.recall_at_k(index, vecs, unit_ids, k=10)
+            print(f"[INFO] {prefix}.index ({spec['kind']}): recall@10 vs flat = {spec['recall_at_10']}")
+        index_specs[prefix] = spec
+        save_index(index, unit_ids, out_dir, prefix, ids_prefix=vector_index.UNIT_IDS_PREFIX)
+        if index_stage:
+            index_stage.advance(1, message=f"{prefix}.index")
+
+    build_and_save("code", np.vstack([file_code_vecs, sym_code_vecs]))
+    build_and_save("summary", np.vstack([file_summary_vecs, sym_summary_vecs]))
+    meta["indices"] = index_specs
+    meta["normalized"] = True
+    meta["uid_version"] = UNIT_UID_VERSION
+    if index_stage:
+        index_stage.finish()
+
+    # Per-level indices and per-kind id lists written by older builds duplicate the above
+    legacy_levels = ("file", "symbol", "file_summary", "symbol_summary")
+    stale = [f"{p}.index" for p in legacy_levels] + [f"{p}_ids.json" for p in legacy_levels + ("code", "summary")]
+    for name in stale:
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+ 
+    # Save meta + per-file content hashes (the baseline for the next incremental build)
     meta_path = os.path.join(out_dir, "meta.json")
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump({"meta": meta, "units_path": df_path}, f, ensure_ascii=False, indent=2)
+    manifest_path = os.path.join(out_dir, FILES_MANIFEST)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"commit": meta.get("commit", ""), "created_at": meta["created_at"], "files": file_hashes},
+                  f, ensure_ascii=False, indent=2)
  
     print(f"[OK] Saved to: {out_dir}")
     print(f" - units: {df_path}")
-    print(f" - file.index / file_ids.json")
-    print(f" - symbol.index / symbol_ids.json")
-    print(f" - file_summary.index / file_ids.json")
-    print(f" - symbol_summary.index / symbol_ids.json")
-    print(f" - code.index / code_ids.json (combined)")
-    print(f" - summary.index / summary_ids.json (combined)")
+    print(f" - texts: {os.path.join(out_dir, TEXTS_FILENAME)} (lazy code/summary sidecar)")
+    print(f" - bm25: {os.path.join(out_dir, BM25_DIRNAME)} (sparse index)")
+    print(f" - vectors: {os.path.join(out_dir, VECTOR_STORE_FILENAME)} (embeddings keyed by text hash)")
+    print(f" - code.index / summary.index (file + symbol units)")
+    print(f" - {vector_index.UNIT_IDS_PREFIX}_ids.json (shared id list)")
     print(f" - meta: {meta_path}")
+    print(f" - files manifest: {manifest_path}")
  
     return out_dir
  
-def build_units_for_repo(github_url: str, token: Optional[str], output_root=None, MAX_FILES=None) -> Tuple[str, Dict[str, Any], List[Unit]]:
-    
+def build_units_for_repo(github_url: str, token: Optional[str], output_root=None, MAX_FILES=None,
+                         snapshot: Optional[RepoSnapshot] = None,
+                         previous_hashes: Optional[Dict[str, str]] = None) -> Tuple[str, Dict[str, Any], List[Unit]]:
+    """
+    Extract units for every text file. meta["file_hashes"] maps each scanned file to
+    its content hash; files whose hash equals previous_hashes[path] are not
+    re-extracted and are listed in meta["unchanged_files"] instead.
+    """
     if output_root is None:
         out_dir = default_output_dir(github_url)
     else:
@@ -633,42 +853,39 @@ def build_units_for_repo(github_url: str, token: Optional[str], output_root=None
     subpath = parts["subpath"] or None
     gid = fingerprint(owner, repo, branch, subpath, github_url)
  
-    # Download/unzip
-    zip_bytes = download_repo_zip(owner, repo, branch)
-    repo_root = unzip_to_temp(zip_bytes)
- 
-    # Extract units
+    # Extract units from the shared snapshot (downloaded once per commit)
     all_units: List[Unit] = []
     file_count = 0
-    MAX_FILES = MAX_FILES  
- 
-    for abs_path, rel_path in iter_repo_files(repo_root, subpath=subpath, max_files=MAX_FILES):
-        text = read_text_file(abs_path)
-        if text is None:
-            continue
-        units = extract_units_for_file(rel_path, text)
-        all_units.extend(units)
-        file_count += 1
+    file_hashes: Dict[str, str] = {}
+    unchanged_files: List[str] = []
+ 
+    with snapshot_scope(snapshot, owner, repo, branch, token=token) as snap:
+        for abs_path, rel_path, text in snap.iter_texts(subpath, max_files=MAX_FILES):
+            if text is None:
+                continue
+            file_hashes[rel_path] = snap.content_hash(rel_path)
+            if previous_hashes and previous_hashes.get(rel_path) == file_hashes[rel_path]:
+                unchanged_files.append(rel_path)
+                file_count += 1
+                continue
+            units = extract_units_for_file(rel_path, text)
+            all_units.extend(units)
+            file_count += 1
+        commit = snap.commit
  
     meta = {
         "source_url": github_url,
-        "owner": owner, "repo": repo, "branch": branch,
+        "owner": owner, "repo": repo, "branch": branch, "commit": commit,
         "subpath": subpath or "", "created_at": now_iso(),
-        "graph_id": gid, "totals": {"files_scanned": file_count, "units": len(all_units)}
+        "graph_id": gid, "totals": {"files_scanned": file_count, "units": len(all_units)},
+        "file_hashes": file_hashes, "unchanged_files": unchanged_files,
     }
  
-    # Cleanup tmp
-    try:
-        import shutil
-        shutil.rmtree(os.path.dirname(repo_root))
-    except Exception:
-        pass
- 
     return gid, meta, all_units
  
 def main():
     p = argparse.ArgumentParser(description="Build hybrid code embeddings (file + symbol) for a GitHub repository.")
-    p.add_argument("--github-url", required=True, help="Repo URL: https://github.com/<owner>/<repo>[/tree/<branch>/<subpath>]")
+    p.add_argument("--github-url", default=None, help="Repo URL: https://github.com/<owner>/<repo>[/tree/<branch>/<subpath>]")
     p.add_argument("--token", default=None, help="GitHub token (optional) for better rate-limits")
     p.add_argument("--device", default=None, help="Embedding device (e.g., 'cpu' or 'cuda')")
     p.add_argument("--query", default=None, help="Run a hybrid query against the built indices")
@@ -676,16 +893,39 @@ def main():
     p.add_argument("--query-mode", choices=["summary", "code"], default="summary", help="Query over summary or code embeddings")
     p.add_argument("--max-files", type=int, default=2, help="Maximum number of files to process for testing")
     p.add_argument("--force-summarize", action="store_true", help="Force re-summarization even if summaries exist")
+    p.add_argument("--summary-workers", type=int, default=8, help="Concurrent summarization requests in flight")
+    p.add_argument("--summary-rps", type=float, default=None, help="Max summarization requests per second (default: unlimited)")
+    p.add_argument("--incremental", action="store_true", help="Only re-index files changed since the previous build")
+    p.add_argument("--index-kind", choices=vector_index.INDEX_KINDS, default="auto",
+                   help="FAISS index type; auto = flat for small repos, HNSW/IVF-PQ for large ones")
+    p.add_argument("--renormalize-cache", metavar="CACHE_ROOT", default=None,
+                   help="Migrate existing <CACHE_ROOT>/*/embeddings indices to L2-normalized vectors and exit")
+    p.add_argument("--progress-jsonl", metavar="PATH", default=None,
+                   help="Write build progress events as JSON lines to PATH ('-' = stdout)")
     args = p.parse_args()
+
+    if args.renormalize_cache:
+        renormalize_cache(args.renormalize_cache)
+        return
+    if not args.github_url:
+        p.error("--github-url is required")
  
+    progress_sink = JsonLinesSink(args.progress_jsonl) if args.progress_jsonl else None
     # Use the optimized function
     out_dir = build_embeddings_for_repo(
         github_url=args.github_url,
         token=args.token,
         MAX_FILES=args.max_files,
         force_summarize=args.force_summarize,
-        model_name="Pro"
+        model_name="Pro",
+        summary_workers=args.summary_workers,
+        summary_rps=args.summary_rps,
+        incremental=args.incremental,
+        index_kind=args.index_kind,
+        progress=ProgressChannel([progress_sink]) if progress_sink else None,
     )
+    if progress_sink:
+        progress_sink.close()
  
     # Load dataframe for querying
     df_path = os.path.join(out_dir, "units.parquet")
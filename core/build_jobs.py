@@ -0,0 +1,195 @@
+"""
+Background build service for the documentation pipeline.
+
+Builds run on a small worker pool owned by this module, so they outlive the
+Streamlit script run that started them: a browser refresh or a second user
+asking for the same repository attaches to the running job instead of
+starting another one.
+
+- Identical requests (same job key) while a job is queued or running return
+  that job; a request with other params for a repo that has an active job is
+  queued behind it (job.follows).
+- Jobs on the same cache directory are serialized with a file lock, which
+  also covers other processes sharing the cache.
+- Each job records its latest progress event per stage and the pages
+  finished so far; callers poll job.snapshot().
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from progress import ProgressChannel, ProgressEvent
+
+BUILD_WORKERS = 2
+LOCK_FILENAME = ".build.lock"
+MAX_FINISHED_JOBS = 50
+
+ACTIVE_STATES = ("queued", "waiting", "running")
+
+def job_key(params: Dict[str, Any]) -> str:
+    """Stable key for a build request; equal params => same job."""
+    blob = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+# ===================== Per-repo file lock =====================
+
+@contextmanager
+def repo_lock(repo_dir: str):
+    """Exclusive lock on <repo_dir>/.build.lock (blocks until available)."""
+    os.makedirs(repo_dir, exist_ok=True)
+    f = open(os.path.join(repo_dir, LOCK_FILENAME), "a+")
+    try:
+        try:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        except ImportError:
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.5)
+        yield
+    finally:
+        # Closing the file releases the lock on both platforms
+        f.close()
+
+# ===================== Jobs =====================
+
+@dataclass
+class BuildJob:
+    job_id: str
+    key: str
+    repo_dir: str
+    params: Dict[str, Any]
+    status: str = "queued"
+    error: Optional[str] = None
+    result: Any = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    follows: Optional[str] = None
+    stages: Dict[str, ProgressEvent] = field(default_factory=dict)
+    pages: List[str] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATES
+
+    def record_event(self, event: ProgressEvent):
+        with self._lock:
+            self.stages[event.stage] = event
+
+    def record_page(self, page_id: str):
+        with self._lock:
+            self.pages.append(page_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Point-in-time copy of the job state, safe to read from any thread."""
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "repo_dir": self.repo_dir,
+                "params": dict(self.params),
+                "error": self.error,
+                "stages": dict(self.stages),
+                "pages": list(self.pages),
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+                "follows": self.follows,
+            }
+
+BuildFn = Callable[[BuildJob, ProgressChannel], Any]
+
+class BuildService:
+    """Job queue running build functions on a worker pool, one job per repo directory at a time."""
+
+    def __init__(self, max_workers: int = BUILD_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="build")
+        self._jobs: Dict[str, BuildJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, repo_dir: str, params: Dict[str, Any], fn: BuildFn) -> BuildJob:
+        """
+        Queue fn(job, progress) for repo_dir, or return the queued/running job
+        with the same repo_dir and params. If a job with other params is active
+        on repo_dir, the new one is queued behind it (job.follows is its id).
+        """
+        repo_dir = os.path.abspath(repo_dir)
+        key = job_key({"repo_dir": repo_dir, **params})
+        with self._lock:
+            active = sorted((j for j in self._jobs.values() if j.repo_dir == repo_dir and j.active),
+                            key=lambda j: j.created)
+            for job in active:
+                if job.key == key:
+                    return job
+            job = BuildJob(job_id=uuid.uuid4().hex[:12], key=key, repo_dir=repo_dir, params=dict(params),
+                           follows=active[-1].job_id if active else None)
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: BuildJob, fn: BuildFn):
+        job.status = "waiting"
+        try:
+            with repo_lock(job.repo_dir):
+                job.status = "running"
+                job.started = time.time()
+                progress = ProgressChannel([job.record_event])
+                # Tokens / in-flight calls in this job's events count only its own LLM calls
+                with progress.llm_scope():
+                    job.result = fn(job, progress)
+                job.finished = time.time()
+                job.status = "done"
+        except Exception:
+            job.error = traceback.format_exc()
+            job.finished = time.time()
+            job.status = "failed"
+            print(f"[WARN] Build job {job.job_id} failed:\n{job.error}")
+
+    def _prune(self):
+        finished = sorted((j for j in self._jobs.values() if not j.active), key=lambda j: j.created)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.job_id]
+
+    def get(self, job_id: Optional[str]) -> Optional[BuildJob]:
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def active_job_for(self, repo_dir: str) -> Optional[BuildJob]:
+        """The oldest queued/running job on repo_dir, if any."""
+        repo_dir = os.path.abspath(repo_dir)
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.repo_dir == repo_dir and j.active]
+        return min(jobs, key=lambda j: j.created) if jobs else None
+
+    def jobs(self) -> List[BuildJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created)
+
+# ===================== Process-wide service =====================
+
+_SERVICE: Optional[BuildService] = None
+_SERVICE_LOCK = threading.Lock()
+
+def get_build_service() -> BuildService:
+    """The process-wide service (survives Streamlit script reruns and is shared by sessions)."""
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = BuildService()
+        return _SERVICE
@@ -1,4 +1,3 @@
-import ast
 import gzip
 import hashlib
 import io
@@ -6,18 +5,25 @@ import json
 import textwrap
 import os
 import re
-import shutil
 import sys
 import tempfile
 import traceback
 import zipfile
 from collections import Counter, defaultdict
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from urllib.request import Request, urlopen
 
 from dotenv import load_dotenv
 
+import lang_scanners
+import parser_backends
+import python_extract
+from concurrency import map_ordered
+from progress import ProgressChannel, open_stage
+from repo_snapshot import RepoSnapshot, snapshot_scope
+
 # ===================== Load environment variables =====================
 load_dotenv()
 
@@ -169,69 +175,19 @@ def save_json_gz(obj: dict, path: str):
 # ===================== Language Parsers =====================
 
 def parse_python_text(py_src: str):
-    classes, imports, functions = [], [], []
-    try:
-        tree = ast.parse(py_src)
-    except SyntaxError:
-        return classes, imports, functions
-    if hasattr(tree, "body"):
-        for n in tree.body:
-            if isinstance(n, ast.FunctionDef) or isinstance(n, ast.AsyncFunctionDef):
-                functions.append(n.name)
-    for node in ast.walk(tree):
-        if isinstance(node, ast.ClassDef):
-            classes.append(node.name)
-        elif isinstance(node, ast.Import):
-            for alias in node.names:
-                imports.append({"type": "import", "module": alias.name, "names": [], "level": 0})
-        elif isinstance(node, ast.ImportFrom):
-            mod = node.module or ""
-            names = [alias.name for alias in node.names]
-            imports.append({"type": "from", "module": mod, "names": names, "level": node.level or 0})
-    return classes, imports, functions
-
-_ident = r"[A-Za-z_][A-Za-z0-9_]*"
-_js_ident = r"[A-Za-z_$][A-Za-z0-9_$]*"
+    # Shared single-pass extractor (also feeds build_embeddings), memoized by content hash
+    return python_extract.graph_facts(py_src)
 
+# Regex path for the other languages (lang_scanners); parse_any_text_by_ext
+# goes through parser_backends, which prefers tree-sitter when installed
 def parse_js_ts_text(src: str):
-    classes, imports, functions = [], [], []
-    for m in re.finditer(rf"\bclass\s+({_js_ident})\b", src):
-        classes.append(m.group(1))
-    for m in re.finditer(r"""import\s+(?:[\s\S]*?\s+from\s+)?['"'"]""", src):
-        imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-    for m in re.finditer(r"""require\(\s*'"['"]\s*\)""", src):
-        imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-    for m in re.finditer(rf"\bfunction\s+({_js_ident})\s*\(", src):
-        functions.append(m.group(1))
-    for m in re.finditer(rf"\bexport\s+function\s+({_js_ident})\s*\(", src):
-        functions.append(m.group(1))
-    for m in re.finditer(rf"\b(?:const|let|var)\s+({_js_ident})\s*=\s*function\b", src):
-        functions.append(m.group(1))
-    for m in re.finditer(rf"\b(?:const|let|var)\s+({_js_ident})\s*=\s*\(", src):
-        functions.append(m.group(1))
-    return classes, imports, list(dict.fromkeys(functions))
+    return lang_scanners.JAVASCRIPT.graph_facts(src)
 
 def parse_java_text(src: str):
-    classes, imports, functions = [], [], []
-    for m in re.finditer(rf"\b(class|interface|enum)\s+({_ident})\b", src):
-        classes.append(m.group(2))
-    for m in re.finditer(r"\bimport\s+([a-zA-Z0-9_\.]+)(?:\s*;\s*)", src):
-        imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-    return classes, imports, functions
+    return lang_scanners.JAVA.graph_facts(src)
 
 def parse_go_text(src: str):
-    classes, imports, functions = [], [], []
-    for m in re.finditer(r'import\s+"([^"]+)"', src):
-        imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-    block = re.search(r"import\s*\((.*?)\)", src, re.S)
-    if block:
-        for m in re.finditer(r'"([^"]+)"', block.group(1)):
-            imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-    for m in re.finditer(rf"\btype\s+({_ident})\s+struct\b", src):
-        classes.append(m.group(1))
-    for m in re.finditer(rf"\bfunc\s+(?:\([^)]+\)\s*)?({_ident})\s*\(", src):
-        functions.append(m.group(1))
-    return classes, imports, functions
+    return lang_scanners.GO.graph_facts(src)
 
 def parse_c_cpp_text(src: str):
     """
@@ -240,104 +196,93 @@ def parse_c_cpp_text(src: str):
       - class/struct <Name>                -> classes
       - top-level function definitions     -> functions (declarations excluded)
     """
-    import re
-
-    classes, imports, functions = [], [], []
-
-    # Includes: #include <header> or #include "header"
-    include_pattern = r'#\s*include\s*<"[>"]'
-    for m in re.finditer(include_pattern, src):
-        imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-
-    # Identifier pattern
-    _ident = r"[A-Za-z_][A-Za-z0-9_]*"
-
-    # class/struct names
-    for m in re.finditer(rf"\b(class|struct)\s+({_ident})\b", src):
-        classes.append(m.group(2))
-
-    # Heuristic top-level function definition (requires a body '{', avoids ';' declarations)
-    # Examples matched:
-    #   int foo(int a) { ... }
-    #   static inline MyType ns::Class::method(T x) { ... }
-    #   template<typename T> T bar(T x) { ... }
-    func_pattern = (
-        r"(?m)^[ \t]*"                 # line start
-        r"[A-Za-z_][\w:\s\*\&\<\>]*\s+" # return type / qualifiers
-        r"(" + _ident + r")"           # function name (capture)
-        r"\s*\([^;]*\)"                # args (not containing ';')
-        r"\s*\{"                       # opening brace of body
-    )
-    for m in re.finditer(func_pattern, src):
-        functions.append(m.group(1))
-
-    # De-dup preserve order
-    functions = list(dict.fromkeys(functions))
-    return classes, imports, functions
-
-
+    return lang_scanners.C_CPP.graph_facts(src)
 
 def parse_rust_text(src: str):
-    classes, imports, functions = [], [], []
-    for m in re.finditer(r"\buse\s+([A-Za-z0-9_:\{\}\*,\s]+);", src):
-        mod = re.sub(r"\s+", " ", m.group(1)).strip()
-        imports.append({"type": "import", "module": mod, "names": [], "level": 0})
-    for m in re.finditer(rf"\b(struct|enum)\s+({_ident})\b", src):
-        classes.append(m.group(2))
-    for m in re.finditer(rf"\bfn\s+({_ident})\s*\(", src):
-        functions.append(m.group(1))
-    return classes, imports, functions
+    return lang_scanners.RUST.graph_facts(src)
 
 def parse_ruby_text(src: str):
-    classes, imports, functions = [], [], []
-    for m in re.finditer(rf"\bclass\s+({_ident})\b", src):
-        classes.append(m.group(1))
-    for m in re.finditer(r"""(?:require|require_relative)\s+'"['"]""", src):
-        imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-    for m in re.finditer(rf"(?m)^\s*def\s+({_ident})\b", src):
-        functions.append(m.group(1))
-    return classes, imports, functions
+    return lang_scanners.RUBY.graph_facts(src)
 
 def parse_php_text(src: str):
-    classes, imports, functions = [], [], []
-    for m in re.finditer(rf"\bclass\s+({_ident})\b", src):
-        classes.append(m.group(1))
-    for m in re.finditer(rf"\bfunction\s+({_ident})\s*\(", src):
-        functions.append(m.group(1))
-    for m in re.finditer(rf"\buse\s+([A-Za-z0-9_\\]+)\s*;", src):
-        imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-    return classes, imports, functions
+    return lang_scanners.PHP.graph_facts(src)
 
 def parse_kotlin_text(src: str):
-    classes, imports, functions = [], [], []
-    for m in re.finditer(rf"\b(class|object|interface)\s+({_ident})\b", src):
-        classes.append(m.group(2))
-    for m in re.finditer(rf"\bimport\s+([A-Za-z0-9_\.]+)\s*", src):
-        imports.append({"type": "import", "module": m.group(1), "names": [], "level": 0})
-    for m in re.finditer(rf"\bfun\s+({_ident})\s*\(", src):
-        functions.append(m.group(1))
-    return classes, imports, functions
+    return lang_scanners.KOTLIN.graph_facts(src)
 
 def parse_any_text_by_ext(ext: str, text: str):
-    e = ext.lower().lstrip(".")
-    if e in PY_EXTS: return parse_python_text(text)
-    if e in JS_TS_EXTS: return parse_js_ts_text(text)
-    if e in JAVA_EXTS: return parse_java_text(text)
-    if e in GO_EXTS: return parse_go_text(text)
-    if e in C_EXTS or e in CPP_EXTS: return parse_c_cpp_text(text)
-    if e in RUST_EXTS: return parse_rust_text(text)
-    if e in RUBY_EXTS: return parse_ruby_text(text)
-    if e in PHP_EXTS: return parse_php_text(text)
-    if e in KT_EXTS: return parse_kotlin_text(text)
-    return [], [], []
+    lang = detect_lang_by_ext(ext)
+    if lang == "python":
+        return parse_python_text(text)
+    # Other languages: first available parser backend (tree-sitter, else the regex scanners)
+    parsed = parser_backends.parse(text, lang, ext=ext, symbols=False)
+    return parsed.graph_facts() if parsed is not None else ([], [], [])
 
 
 # ===================== Compact v2 (per-file) + Sharding =====================
-def build_repo_compact_v2(root_dir: str, subpath: Optional[str] = None, progress=None, max_files: Optional[int] = None):
+PARSE_WORKERS = min(os.cpu_count() or 1, 8)
+PARSE_CHUNK_FILES = 256
+# Below this many files, starting worker processes costs more than parsing serially
+PARALLEL_PARSE_MIN_FILES = 2000
+
+def parse_file_record(rel_path: str, text: Optional[str]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Compact record for one file (imports left empty) plus its sorted, deduped
+    import module names; the caller maps modules to dicts.imports indices.
+    """
+    ext = os.path.splitext(rel_path)[1]
+    rec = {"path": rel_path, "lang": detect_lang_by_ext(ext), "classes": [], "functions": [], "imports": []}
+    if not text:
+        return rec, []
+
+    classes, imports, functions = parse_any_text_by_ext(ext, text)
+    if classes:
+        rec["classes"] = sorted(set(classes))
+    if functions:
+        rec["functions"] = sorted(set(functions))
+    mods = []
+    for imp in imports or []:
+        module = (imp.get("module") or "").strip()
+        if module:
+            mods.append(module)
+    return rec, sorted(set(mods))
+
+def _parse_file_chunk(chunk: List[Tuple[str, str]],
+                      texts: Optional[List[Optional[str]]] = None) -> List[Tuple[Dict[str, Any], List[str]]]:
+    """Worker entry point: parse (abs_path, rel_path) pairs, reading them unless texts are given."""
+    if texts is None:
+        texts = [read_text_file(abs_path) for abs_path, _ in chunk]
+    return [parse_file_record(rel_path, text) for (_, rel_path), text in zip(chunk, texts)]
+
+def _iter_parsed_parallel(file_list: List[Tuple[str, str]], workers: int,
+                          read: Optional[Callable[[str, str], Optional[str]]] = None):
+    """
+    Parsed records in file_list order, parsed in chunks on a process pool.
+    With read, texts are read in this process and shipped to the workers
+    (e.g. through a snapshot's file table); otherwise workers read the files.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    chunks = [file_list[i:i + PARSE_CHUNK_FILES] for i in range(0, len(file_list), PARSE_CHUNK_FILES)]
+    texts = (None if read is None else [read(abs_path, rel_path) for abs_path, rel_path in chunk]
+             for chunk in chunks)
+    # spawn: forking the multi-threaded app (Streamlit, build threads, client pools) can deadlock the child
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # map() yields chunk results in submission order, which keeps the merge deterministic
+        for chunk_records in pool.map(_parse_file_chunk, chunks, texts):
+            yield from chunk_records
+
+def build_repo_compact_v2(root_dir: str, subpath: Optional[str] = None, progress=None, max_files: Optional[int] = None,
+                          snapshot: Optional[RepoSnapshot] = None, workers: Optional[int] = None):
     """
     Compact v2:
       - dicts.imports (deduped module/header names)
       - files: [{path, lang, classes[], functions[], imports[idx]}]
+    When a snapshot is given, files are listed and decoded through its shared file table.
+    progress is an optional progress.StageProgress updated per scanned file.
+    workers > 1 parses files on a process pool (default: PARSE_WORKERS for repos of at
+    least PARALLEL_PARSE_MIN_FILES files); the output is identical to the serial path,
+    since records are merged in file order either way.
     """
     files = []
     import_to_idx = {}
@@ -349,49 +294,49 @@ def build_repo_compact_v2(root_dir: str, subpath: Optional[str] = None, progress
             imports_list.append(name)
         return import_to_idx[name]
 
-    file_list = list(iter_repo_files(root_dir, subpath, max_files=max_files))
+    if snapshot is not None:
+        file_list = snapshot.list_files(subpath, max_files=max_files)
+    else:
+        file_list = list(iter_repo_files(root_dir, subpath, max_files=max_files))
     n = len(file_list)
     totals = {"files": 0, "classes": 0, "functions": 0, "imports": 0}
 
-    for i, (abs_path, rel_path) in enumerate(file_list, start=1):
-        if progress:
-            progress.progress(min(i / max(n, 1), 1.0), text=f"Scanning {rel_path} ({i}/{n})")
+    if workers is None:
+        workers = PARSE_WORKERS if n >= PARALLEL_PARSE_MIN_FILES else 1
 
-        ext = os.path.splitext(rel_path)[1]
-        lang = detect_lang_by_ext(ext)
-        text = read_text_file(abs_path)
+    def read(abs_path: str, rel_path: str) -> Optional[str]:
+        return snapshot.read_text(rel_path) if snapshot is not None else read_text_file(abs_path)
 
-        rec = {"path": rel_path, "lang": lang, "classes": [], "functions": [], "imports": []}
-        totals["files"] += 1
+    def serial():
+        for abs_path, rel_path in file_list:
+            yield parse_file_record(rel_path, read(abs_path, rel_path))
 
-        if not text:
-            files.append(rec)
-            continue
+    parsed = serial()
+    if workers > 1 and n > PARSE_CHUNK_FILES:
+        parsed = _iter_parsed_parallel(file_list, workers, read=read if snapshot is not None else None)
 
-        classes, imports, functions = parse_any_text_by_ext(ext, text)
-
-        if classes:
-            rec["classes"] = sorted(set(classes))
+    try:
+        for i, (rec, mods) in enumerate(parsed, start=1):
+            if progress:
+                progress.update(i, n, message=rec["path"])
+            totals["files"] += 1
             totals["classes"] += len(rec["classes"])
-
-        if functions:
-            rec["functions"] = sorted(set(functions))
             totals["functions"] += len(rec["functions"])
-
-        if imports:
-            mods = []
-            for imp in imports:
-                module = (imp.get("module") or "").strip()
-                if module:
-                    mods.append(module)
             if mods:
-                mods = sorted(set(mods))
                 rec["imports"] = [get_import_index(m) for m in mods]
                 totals["imports"] += len(mods)
-
-        files.append(rec)
+            files.append(rec)
+    except (OSError, BrokenProcessPool) as e:
+        if files or workers <= 1:
+            raise
+        # Process pools can be unavailable (restricted sandboxes); nothing merged yet, so redo serially
+        print(f"[WARN] Parallel parsing unavailable ({e}); parsing serially")
+        return build_repo_compact_v2(root_dir, subpath=subpath, progress=progress, max_files=max_files,
+                                     snapshot=snapshot, workers=1)
 
     compact = {"meta": {}, "dicts": {"imports": imports_list}, "files": files}
+    if progress:
+        progress.finish()
     return compact, totals
 
 def save_compact_graph_v2(cache_dir: str, meta: dict, compact: dict, gzip_out: bool = True) -> str:
@@ -449,10 +394,18 @@ def shard_compact_by_top_dir(compact: dict, out_dir: str, gzip_out: bool = True)
 
 # ===================== README collection & integration =====================
 READ_ME_REGEX = re.compile(r"(?i)^readme(\.(md|rst|txt))?$")
-def collect_readmes_text(root_dir: str, subpath: Optional[str] = None) -> List[Dict[str, Any]]:
+def collect_readmes_text(root_dir: str, subpath: Optional[str] = None, snapshot: Optional[RepoSnapshot] = None) -> List[Dict[str, Any]]:
     """
     Scan repo for README-like files and return list of {path, size, content}.
     """
+    if snapshot is not None:
+        readmes = []
+        for _, rel_path in snapshot.list_files(subpath):
+            if READ_ME_REGEX.match(os.path.basename(rel_path)):
+                txt = snapshot.read_text(rel_path) or ""
+                if txt.strip():
+                    readmes.append({"path": rel_path, "size": len(txt), "content": txt})
+        return readmes
     base = os.path.join(root_dir, subpath) if subpath else root_dir
     readmes = []
     for dirpath, dirnames, filenames in os.walk(base):
@@ -1009,18 +962,8 @@ def build_final_refine_prompt(
 
 # ===================== QGenie Inference =====================
 def qgenie_generate(prompt: str, model: str = None) -> str:
-    try:
-        from qgenie import ChatMessage, QGenieClient
-    except ImportError:
-        raise RuntimeError("qgenie is not installed. Run: pip install qgenie")
-    client = QGenieClient(timeout=100)
-    chat_response = client.chat(
-        messages=[ChatMessage(role="user", content=prompt)], model=model, 
-    )
-    result = getattr(chat_response, "first_content", None)
-    if not result:
-        result = str(chat_response)
-    return (result or "").strip()
+    import llm_client
+    return (llm_client.chat(prompt, model=model) or "").strip()
 
 def validate_or_wrap_xml(text: str, root_tag: str) -> str:
     t = text.strip()
@@ -1210,10 +1153,28 @@ def wiki_default_output_path(cache_dir: str) -> str:
 def wiki_partial_output_path(cache_dir: str, shard_name: str) -> str:
     return os.path.join(wiki_xml_dir(cache_dir), f"partial__{shard_name}.xml")
 
+def wiki_partial_hash_path(cache_dir: str, shard_name: str) -> str:
+    return os.path.join(wiki_xml_dir(cache_dir), f"partial__{shard_name}.sha1")
+
 def knowledge_graph_manifest_path(cache_dir: str) -> str:
     return os.path.join(knowledge_graph_dir(cache_dir), "manifest.json.gz")
 
+def wiki_inputs_hash_path(cache_dir: str) -> str:
+    return os.path.join(knowledge_graph_dir(cache_dir), "wiki_inputs.sha1")
+
+def shard_prompt_hash(prompt: str, model: Optional[str] = None) -> str:
+    """sha1 of a shard prompt and the model answering it; unchanged hash => reusable partial XML."""
+    return hashlib.sha1(f"{model or 'default'}\n{prompt}".encode("utf-8")).hexdigest()
+
+def wiki_inputs_hash(compact: Dict[str, Any], readmes: Any, settings: Dict[str, Any]) -> str:
+    """sha1 over everything the QGenie map/reduce sees; unchanged hash => unchanged wiki."""
+    payload = json.dumps({"compact": compact, "readmes": readmes, "settings": settings},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
 # ===================== Main Pipeline Function =====================
+SHARD_WORKERS = 4
+
 def build_sharded_wiki_from_github(
     gh_url: str,
     token: Optional[str] = None,
@@ -1223,10 +1184,21 @@ def build_sharded_wiki_from_github(
     max_files_per_shard: int = 300,
     readme_max_chars: int = 8000,
     output_root: Optional[str] = None,
+    snapshot: Optional[RepoSnapshot] = None,
+    incremental: bool = False,
+    reuse_partials: bool = True,
+    max_workers: int = SHARD_WORKERS,
+    progress: Optional[ProgressChannel] = None,
 ) -> Dict[str, Any]:
     """
     End-to-end pipeline: downloads GitHub repo, builds compact graph, shards, generates wiki XML via QGenie.
     Output is always saved under .cache/github-url-unique-name/knowledge_graph and .cache/github-url-unique-name/wiki_xml.
+    Pass a shared RepoSnapshot to reuse a checkout that other pipelines also consume.
+    With incremental=True the QGenie map/reduce is skipped when the compact graph,
+    READMEs and settings hash the same as for the existing wiki.xml.
+    The per-shard map runs max_workers QGenie calls at a time; with reuse_partials a
+    shard whose prompt hashes the same as its saved partial XML is not re-prompted.
+    progress receives "scan" and "wiki_map" stage events.
     Returns: dict with paths and final XML content.
     """
     # Output directories
@@ -1258,33 +1230,55 @@ def build_sharded_wiki_from_github(
         "graph_id": g_id,
     }
 
-    # Download and unzip repo
-    zip_bytes = download_repo_zip(owner, repo, branch)
-    repo_root = unzip_to_temp(zip_bytes)
-
-    # Build compact graph
-    limit = max_files if max_files and max_files > 0 else None
-    compact, totals = build_repo_compact_v2(repo_root, subpath=subpath, progress=None, max_files=limit)
-    meta = meta_common | {"totals": totals}
-    single_path = os.path.join(kg_dir, "compact_graph.json.gz")
-    save_json_gz(compact, single_path)
-
-    # Collect README files and save doc hints
-    readmes = collect_readmes_text(repo_root, subpath=subpath)
-    hints_path = None
-    if readmes:
-        hints_path = os.path.join(kg_dir, "doc_hints.json.gz")
-        save_json_gz({"meta": meta, "readmes": readmes}, hints_path)
+    # Shared snapshot (downloaded once, released when the last consumer is done)
+    with snapshot_scope(snapshot, owner, repo, branch, token=token) as snap:
+        meta_common["commit"] = snap.commit
+
+        # Build compact graph
+        limit = max_files if max_files and max_files > 0 else None
+        compact, totals = build_repo_compact_v2(snap.repo_root, subpath=subpath, progress=open_stage(progress, "scan"),
+                                                max_files=limit, snapshot=snap)
+        meta = meta_common | {"totals": totals}
+        single_path = os.path.join(kg_dir, "compact_graph.json.gz")
+        save_json_gz(compact, single_path)
+
+        # Collect README files and save doc hints
+        readmes = collect_readmes_text(snap.repo_root, subpath=subpath, snapshot=snap)
+        hints_path = None
+        if readmes:
+            hints_path = os.path.join(kg_dir, "doc_hints.json.gz")
+            save_json_gz({"meta": meta, "readmes": readmes}, hints_path)
 
     # Create shards
     manifest = shard_compact_by_top_dir(compact | {"meta": meta}, out_dir=kg_dir, gzip_out=True)
     man_path = knowledge_graph_manifest_path(cache_dir)
 
-    # Cleanup temp
-    try:
-        shutil.rmtree(os.path.dirname(repo_root))
-    except Exception:
-        pass
+    # Skip the LLM stages when nothing that feeds them has changed
+    inputs_hash = wiki_inputs_hash(compact, readmes, {
+        "lang_text": lang_text, "qgenie_model": qgenie_model,
+        "max_files_per_shard": int(max_files_per_shard), "readme_max_chars": int(readme_max_chars),
+    })
+    final_path = wiki_default_output_path(cache_dir)
+    hash_path = wiki_inputs_hash_path(cache_dir)
+    if incremental and os.path.isfile(final_path) and os.path.isfile(hash_path):
+        with open(hash_path, "r", encoding="utf-8") as f:
+            previous_hash = f.read().strip()
+        if previous_hash == inputs_hash:
+            print("[INFO] Wiki inputs unchanged, reusing existing wiki.xml")
+            with open(final_path, "r", encoding="utf-8") as f:
+                final_xml = f.read()
+            return {
+                "compact_graph_path": single_path,
+                "readme_hints_path": hints_path,
+                "shard_manifest_path": man_path,
+                "saved_partial_paths": [],
+                "final_wiki_path": final_path,
+                "final_wiki_xml": final_xml,
+                "totals": totals,
+                "cache_dir": cache_dir,
+                "knowledge_graph_dir": kg_dir,
+                "wiki_xml_dir": wiki_dir,
+            }
 
     # Wiki generation
     manifest_path = man_path
@@ -1300,26 +1294,24 @@ def build_sharded_wiki_from_github(
     if readme_hints:
         readme_excerpt = make_readme_excerpt(readme_hints, max_chars=int(readme_max_chars))
 
-    # Build global path list (for allowed/forbidden + pruning)
-    all_paths = []
+    # Load every shard once (used for the path list and the map below)
+    shards = []
     for s in manifest.get("shards", []):
         spath = s.get("path")
         if spath and not os.path.isabs(spath):
             spath = os.path.join(kg_dir, spath)
-        shard = load_json_autoz(spath)
+        shards.append(load_json_autoz(spath))
+
+    # Build global path list (for allowed/forbidden + pruning)
+    all_paths = []
+    for shard in shards:
         all_paths.extend(_collect_all_paths_from_compact(shard))
     signals = _derive_repo_signals_from_paths(all_paths)
     allowed_norm, forbidden_norm = _allowed_forbidden_sections(signals)
 
     # MAP: per shard
-    partial_xmls = []
-    saved_partial_paths = []
-    for idx, s in enumerate(manifest.get("shards", []), start=1):
-        spath = s.get("path")
-        if spath and not os.path.isabs(spath):
-            spath = os.path.join(kg_dir, spath)
-        shard = load_json_autoz(spath)
-
+    def map_shard(item: Tuple[int, Dict[str, Any]]) -> Tuple[str, str]:
+        idx, shard = item
         shard_name = shard.get("meta", {}).get("shard") or f"shard{idx}"
         safe_shard_name = shard_name.replace("/", "_")
         dict_imports = shard.get("dicts", {}).get("imports", [])
@@ -1343,14 +1335,36 @@ def build_sharded_wiki_from_github(
             readme_excerpt=readme_excerpt
         )
 
-        xml = qgenie_generate(prompt)
-        # Save partial for reuse
         partial_path = wiki_partial_output_path(cache_dir, safe_shard_name)
+        hash_path = wiki_partial_hash_path(cache_dir, safe_shard_name)
+        prompt_hash = shard_prompt_hash(prompt, qgenie_model)
+        if reuse_partials and os.path.isfile(partial_path) and os.path.isfile(hash_path):
+            with open(hash_path, "r", encoding="utf-8") as f:
+                if f.read().strip() == prompt_hash:
+                    with open(partial_path, "r", encoding="utf-8") as f:
+                        return partial_path, f.read()
+
+        xml = qgenie_generate(prompt, model=qgenie_model)
+        # Save partial for reuse
         ensure_dir(os.path.dirname(partial_path))
         with open(partial_path, "w", encoding="utf-8") as f:
             f.write(xml)
-        saved_partial_paths.append(partial_path)
-        partial_xmls.append(xml)
+        with open(hash_path, "w", encoding="utf-8") as f:
+            f.write(prompt_hash)
+        return partial_path, xml
+
+    # Ordered results keep the merge deterministic regardless of completion order
+    map_stage = open_stage(progress, "wiki_map", total=len(shards))
+
+    def on_shard_done(_, result: Tuple[str, str]):
+        if map_stage:
+            map_stage.advance(1, message=os.path.basename(result[0]))
+
+    mapped = map_ordered(map_shard, list(enumerate(shards, start=1)), max_workers=max_workers, on_done=on_shard_done)
+    if map_stage:
+        map_stage.finish()
+    saved_partial_paths = [path for path, _ in mapped]
+    partial_xmls = [xml for _, xml in mapped]
 
     # REDUCE
     partial_trees = [extract_partial(x) for x in partial_xmls]
@@ -1362,17 +1376,18 @@ def build_sharded_wiki_from_github(
 
     # REFINE with QGenie + README
     refine_prompt = build_final_refine_prompt(owner_repo, source_url, lang_text, final_xml, readme_excerpt=readme_excerpt)
-    final_xml = qgenie_generate(refine_prompt)
+    final_xml = qgenie_generate(refine_prompt, model=qgenie_model)
     final_xml = validate_or_wrap_xml(final_xml, "wiki_structure")
 
     # === DEDUPLICATE PAGES AND SECTIONS ===
     final_xml = clean_final_wiki_duplicates(final_xml)
 
     # Save final wiki XML
-    final_path = wiki_default_output_path(cache_dir)
     ensure_dir(os.path.dirname(final_path))
     with open(final_path, "w", encoding="utf-8") as f:
         f.write(final_xml)
+    with open(hash_path, "w", encoding="utf-8") as f:
+        f.write(inputs_hash)
 
     return {
         "compact_graph_path": single_path,
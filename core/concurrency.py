@@ -0,0 +1,158 @@
+"""
+Concurrency helpers shared by the LLM-heavy pipeline stages.
+
+This module contains:
+- A thread-safe token-bucket rate limiter
+- Retry with jittered exponential backoff
+- An ordered, bounded-concurrency map over a thread pool, and a streaming
+  variant that yields results as they complete
+- A throughput meter (items/sec, tokens/sec)
+"""
+
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+# ===================== Rate Limiting =====================
+
+class TokenBucket:
+    """Token bucket: refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until `tokens` are available, then consume them."""
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+# ===================== Retry =====================
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 30.0) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0.0, min(max_delay, base_delay * (2 ** attempt)))
+
+def call_with_retry(
+    fn: Callable[[], Any],
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+) -> Any:
+    """Call fn(), retrying failures up to max_retries times with jittered backoff."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except retry_on:
+            if attempt >= max_retries:
+                raise
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+            attempt += 1
+
+# ===================== Bounded Ordered Map =====================
+
+def map_ordered(
+    fn: Callable[[Any], Any],
+    items: Sequence[Any],
+    max_workers: int = 8,
+    on_done: Optional[Callable[[int, Any], None]] = None,
+) -> List[Any]:
+    """
+    Apply fn to every item with at most max_workers calls in flight.
+    Results are returned in input order regardless of completion order;
+    on_done(index, result) is called as each item finishes.
+    """
+    results: List[Any] = [None] * len(items)
+    if not items:
+        return results
+    if max_workers <= 1:
+        for i, item in enumerate(items):
+            results[i] = fn(item)
+            if on_done:
+                on_done(i, results[i])
+        return results
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Each task runs in a copy of the caller's context (e.g. llm_client.usage_scope)
+        futures = {pool.submit(contextvars.copy_context().run, fn, item): i for i, item in enumerate(items)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            results[i] = fut.result()
+            if on_done:
+                on_done(i, results[i])
+    return results
+
+def map_as_completed(
+    fn: Callable[[Any], Any],
+    items: Sequence[Any],
+    max_workers: int = 8,
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Apply fn to every item with at most max_workers calls in flight, yielding
+    (index, result) as each finishes. A failing call re-raises here; items not
+    yet started are cancelled.
+    """
+    if not items:
+        return
+    if max_workers <= 1:
+        for i, item in enumerate(items):
+            yield i, fn(item)
+        return
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {pool.submit(contextvars.copy_context().run, fn, item): i for i, item in enumerate(items)}
+        for fut in as_completed(futures):
+            yield futures[fut], fut.result()
+    finally:
+        # Also reached when the consumer stops iterating early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+# ===================== Throughput =====================
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)."""
+    return (len(text or "") + 3) // 4
+
+class ThroughputMeter:
+    """Counts completed items and tokens since creation."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.items = 0
+        self.tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, items: int = 1, tokens: int = 0):
+        with self._lock:
+            self.items += items
+            self.tokens += tokens
+
+    def report(self) -> Dict[str, float]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "items": self.items,
+            "tokens": self.tokens,
+            "seconds": round(elapsed, 3),
+            "items_per_sec": round(self.items / elapsed, 3),
+            "tokens_per_sec": round(self.tokens / elapsed, 1),
+        }
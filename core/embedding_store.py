@@ -0,0 +1,38 @@
+"""
+Sidecar vector store for text embeddings.
+
+Vectors are keyed by a hash of (model, text), so an embedding is computed
+once per distinct text and reused by later builds. FAISS indices can then be
+rebuilt from the store without any network calls.
+"""
+
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from sqlite_kv import SQLiteKV
+
+VECTOR_STORE_FILENAME = "vectors.sqlite"
+
+def text_key(text: str, model: Optional[str]) -> str:
+    """Stable key for an embedding of `text` under `model`."""
+    h = hashlib.sha256()
+    h.update((model or "").encode("utf-8"))
+    h.update(b"\x00")
+    h.update((text or "").encode("utf-8"))
+    return h.hexdigest()
+
+class EmbeddingStore(SQLiteKV):
+    """SQLite-backed key -> float32 vector mapping."""
+
+    TABLE = "vectors"
+    COLUMNS = "dim INTEGER NOT NULL, vec BLOB NOT NULL"
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        return {k: np.frombuffer(blob, dtype=np.float32, count=dim)
+                for k, dim, blob in self._select_many("dim, vec", keys)}
+
+    def put_many(self, keys: List[str], vecs: np.ndarray):
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        self._replace_many([(k, int(v.shape[0]), v.tobytes()) for k, v in zip(keys, vecs)])
@@ -0,0 +1,94 @@
+"""
+Multi-channel retrieval: run channels under per-channel latency budgets and
+merge their rankings with reciprocal-rank fusion.
+
+Channels are plain callables returning a ranked sequence of unit rows. A
+budgeted channel is dropped for that query, instead of delaying the answer,
+when it does not start within its budget or does not finish within its budget
+of starting; a query waits at most about twice the budget for it. Budgeted
+(cheap, local) and unbounded (dense, network) channels run on separate pools,
+so concurrent pages and chat sessions waiting on embedding requests cannot
+starve BM25 of threads. A dropped channel that is already running cannot be
+interrupted; it finishes in the background on its own pool.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RRF_K = 60
+
+# Milliseconds per channel; None = wait for it. The dense channel includes the
+# query-embedding request, so it is unbounded by default.
+DEFAULT_CHANNEL_BUDGETS_MS: Dict[str, Optional[float]] = {
+    "dense": None,
+    "bm25": 250.0,
+}
+
+RETRIEVAL_WORKERS = 8          # unbounded channels (dense: embedding request + ANN search)
+LOCAL_RETRIEVAL_WORKERS = 8    # budgeted channels (BM25, ...)
+
+_POOL = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+_LOCAL_POOL = ThreadPoolExecutor(max_workers=LOCAL_RETRIEVAL_WORKERS, thread_name_prefix="retrieval-local")
+
+def _started(fn: Callable[[], Any], started: threading.Event, at: List[float]) -> Callable[[], Any]:
+    """Wrap fn to record its start time before running it."""
+    def run():
+        at.append(time.monotonic())
+        started.set()
+        return fn()
+    return run
+
+def run_channels(channels: Dict[str, Callable[[], Any]],
+                 budgets_ms: Optional[Dict[str, Optional[float]]] = None) -> Dict[str, Any]:
+    """Run channels concurrently; returns {name: result} for those that finished within budget."""
+    budgets = {**DEFAULT_CHANNEL_BUDGETS_MS, **(budgets_ms or {})}
+    submitted = time.monotonic()
+    futures = {}
+    for name, fn in channels.items():
+        started, at = threading.Event(), []
+        pool = _POOL if budgets.get(name) is None else _LOCAL_POOL
+        futures[name] = (pool.submit(_started(fn, started, at)), started, at)
+    results: Dict[str, Any] = {}
+    for name, (fut, started, at) in futures.items():
+        budget = budgets.get(name)
+        timeout = None
+        if budget is not None:
+            budget_s = budget / 1000.0
+            if not started.wait(max(0.0, budget_s - (time.monotonic() - submitted))) and fut.cancel():
+                print(f"[WARN] Retrieval channel '{name}' did not start within its {budget:.0f} ms budget, skipping")
+                continue
+            started.wait()   # cancel() lost the race: it has just started
+            timeout = max(0.0, budget_s - (time.monotonic() - at[0]))
+        try:
+            results[name] = fut.result(timeout=timeout)
+        except FuturesTimeout:
+            print(f"[WARN] Retrieval channel '{name}' exceeded its {budget:.0f} ms budget, skipping")
+        except Exception as e:
+            print(f"[WARN] Retrieval channel '{name}' failed: {e}")
+    return results
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = RRF_K,
+                           limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse ranked row lists: score(row) = sum over lists of 1 / (k + rank).
+    Returns (rows, scores) best first; negative rows are ignored.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        rank = 0
+        for row in ranking:
+            row = int(row)
+            if row < 0:
+                continue
+            rank += 1
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    ordered: List[Tuple[int, float]] = sorted(fused.items(), key=lambda x: (-x[1], x[0]))
+    if limit is not None:
+        ordered = ordered[:limit]
+    rows = np.fromiter((r for r, _ in ordered), dtype=np.int64, count=len(ordered))
+    scores = np.fromiter((s for _, s in ordered), dtype=np.float32, count=len(ordered))
+    return rows, scores
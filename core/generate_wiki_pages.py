@@ -3,18 +3,24 @@
 import os
 import re
 import json
-import gzip
 import uuid
 import zipfile
 import hashlib
 import traceback
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import pickle
 
 import utils  
+import vector_index
+from unit_store import UnitStore
+from lexical_index import TrigramIndex
+from sparse_index import BM25Index
+from fusion import reciprocal_rank_fusion, run_channels
+from query_cache import get_query_cache
+from progress import ProgressChannel, open_stage
 
 # ========================= XML Parsing =========================
 def load_wiki_xml(path: str) -> Dict[str, Any]:
@@ -87,33 +93,31 @@ def load_wiki_xml(path: str) -> Dict[str, Any]:
 
 # ========================= Embeddings IO =========================
 def load_embeddings_bundle(emb_dir: str) -> Dict[str, Any]:
-    units_path = os.path.join(emb_dir, "units.parquet")
-    units_alt = os.path.join(emb_dir, "units.parquet.jsonl.gz")
-    if os.path.isfile(units_path):
-        df = pd.read_parquet(units_path)
-    elif os.path.isfile(units_alt):
-        rows = []
-        with gzip.open(units_alt, "rt", encoding="utf-8") as f:
-            for line in f:
-                rows.append(json.loads(line))
-        df = pd.DataFrame.from_records(rows)
-    else:
-        raise FileNotFoundError("units.parquet not found in embeddings dir")
-
-    import faiss
-    code_index = faiss.read_index(os.path.join(emb_dir, "code.index"))
-    summary_index = faiss.read_index(os.path.join(emb_dir, "summary.index"))
-    code_ids = json.loads(utils.read_text(os.path.join(emb_dir, "code_ids.json")))
-    summary_ids = json.loads(utils.read_text(os.path.join(emb_dir, "summary_ids.json")))
-    return {"df": df, "code_index": code_index, "summary_index": summary_index,
-            "code_ids": code_ids, "summary_ids": summary_ids}
+    # Read-only mode: metadata columns + lazily fetched texts, memory-mapped indices
+    units = UnitStore(emb_dir)
+
+    code_index, code_ids, code_resolver = vector_index.load_prefix(emb_dir, "code", mmap=True)
+    summary_index, summary_ids, summary_resolver = vector_index.load_prefix(emb_dir, "summary", mmap=True)
+
+    # Sparse channel; rows must line up with units.parquet
+    bm25 = BM25Index.load(emb_dir)
+    if bm25 is not None and bm25.n_docs != len(units):
+        bm25 = None
+
+    # Per-file content hashes of the last build (absent for builds that predate the manifest)
+    file_hashes = {}
+    manifest_path = os.path.join(emb_dir, "files_manifest.json")
+    if os.path.isfile(manifest_path):
+        file_hashes = json.loads(utils.read_text(manifest_path)).get("files", {})
+    return {"df": units.df, "units": units, "lexical": TrigramIndex.from_units(units.df),
+            "bm25": bm25, "code_index": code_index, "summary_index": summary_index,
+            "code_ids": code_ids, "summary_ids": summary_ids,
+            "code_resolver": code_resolver, "summary_resolver": summary_resolver,
+            "file_hashes": file_hashes}
 
 def embed_query(texts: List[str]) -> np.ndarray:
-    from qgenie import QGenieClient
-    client = QGenieClient()
-    embedding_response = client.embeddings(texts)
-    embeddings = [item.embedding for item in embedding_response.data]
-    return np.asarray(embeddings, dtype=np.float32)
+    # Served from the shared query-embedding cache; only unseen texts hit QGenie
+    return get_query_cache().embed(texts)
 
 def section_normalize(title: str) -> str:
     t = (title or "").strip().lower()
@@ -135,51 +139,70 @@ SECTION_HINTS = {
     "extensibility and customization": ["plugin", "extension", "hooks", "interface", "adapter"],
 }
 
-def find_lexical_candidates(df: pd.DataFrame, keywords: List[str], max_files: int = 8, max_symbols: int = 12) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    if not keywords:
-        return df.head(0).copy(), df.head(0).copy()
-    kw = [k.lower() for k in keywords if k]
-    mask_files = (df["level"] == "file")
-    mask_syms = (df["level"] == "symbol")
-
-    def any_kw_in_path(p: str) -> bool:
-        pl = (p or "").lower()
-        return any(k in pl for k in kw)
+def _has_summary(df: pd.DataFrame) -> pd.Series:
+    if "has_summary" in df.columns:
+        return df["has_summary"]
+    return df["summary"].fillna("").str.len() > 0
 
-    def any_kw_in_sym(r) -> bool:
-        cand = [(r.get("file_path") or ""), (r.get("symbol_name") or ""), (r.get("signature") or "")]
-        cand = " ".join([c.lower() for c in cand])
-        return any(k in cand for k in kw)
-
-    f_hits = df[mask_files].copy()
-    f_hits = f_hits[f_hits["file_path"].apply(any_kw_in_path)]
-    s_hits = df[mask_syms].copy()
-    s_hits = s_hits[s_hits.apply(any_kw_in_sym, axis=1)]
+def find_lexical_candidates(df: pd.DataFrame, keywords: List[str], max_files: int = 8, max_symbols: int = 12,
+                            lexical: Optional[TrigramIndex] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Files whose path, and symbols whose path/name/signature, contain any keyword.
+    `lexical` is a TrigramIndex over the rows of df (built once per bundle); without
+    one it is built on the fly.
+    """
+    if not keywords:
+        return df.head(0), df.head(0)
+    if lexical is None:
+        lexical = TrigramIndex.from_units(df)
+    hits = df.iloc[lexical.rows_matching_any(keywords)]
+    f_hits = hits[hits["level"] == "file"]
+    s_hits = hits[hits["level"] == "symbol"]
 
     if len(f_hits):
-        f_hits = f_hits.assign(_len=f_hits["file_path"].str.len(),
-                               _has_sum=f_hits["summary"].fillna("").str.len() > 0)
+        f_hits = f_hits.assign(_len=f_hits["file_path"].str.len(), _has_sum=_has_summary(f_hits))
         f_hits = f_hits.sort_values(by=["_has_sum", "_len"], ascending=[False, True]).drop(columns=["_len","_has_sum"]).head(max_files)
     if len(s_hits):
-        s_hits = s_hits.assign(_has_sum=s_hits["summary"].fillna("").str.len() > 0)
+        s_hits = s_hits.assign(_has_sum=_has_summary(s_hits))
         s_hits = s_hits.sort_values(by=["_has_sum"], ascending=[False]).drop(columns=["_has_sum"]).head(max_symbols)
     return f_hits, s_hits
 
-def search_hybrid_plus(query: str, section_title: str, emb: Dict[str, Any], topk_file: int, topk_symbol: int, extra_file: int = 6, extra_symbol: int = 10) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    import faiss
-    # Vector search (summary embeddings for semantic, code for code context)
-    qvec = embed_query([query])[0].reshape(1, -1)
-    Ds, Is = emb["summary_index"].search(qvec, topk_symbol)
-    Df, If = emb["code_index"].search(qvec, topk_file)
-    sids = [emb["summary_ids"][i] for i in Is[0]]
-    fids = [emb["code_ids"][i] for i in If[0]]
-    df = emb["df"].set_index("uid")
-    sym_hits = df.loc[sids].reset_index().assign(score=Ds[0])
-    file_hits = df.loc[fids].reset_index().assign(score=Df[0])
-
-    # Lexical boosters by section
+def search_hybrid_plus(query: str, section_title: str, emb: Dict[str, Any], topk_file: int, topk_symbol: int, extra_file: int = 6, extra_symbol: int = 10,
+                       channel_budgets_ms: Optional[Dict[str, Optional[float]]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    units = emb["units"]
+    levels = units.columns["level"]
+
+    # Dense channel (summary embeddings for semantic, code for code context)
+    def dense():
+        qvec = embed_query([query])[0].reshape(1, -1)
+        s_labels, _ = vector_index.search_labels(emb["summary_index"], emb["summary_resolver"], qvec, topk_symbol)
+        f_labels, _ = vector_index.search_labels(emb["code_index"], emb["code_resolver"], qvec, topk_file)
+        return (units.rows_for_hits(emb["summary_resolver"], s_labels),
+                units.rows_for_hits(emb["code_resolver"], f_labels))
+
+    # Sparse channel (BM25 over identifiers, summaries and code)
+    def bm25():
+        s_rows, _ = emb["bm25"].search(query, topk_symbol, mask=levels == "symbol")
+        f_rows, _ = emb["bm25"].search(query, topk_file, mask=levels == "file")
+        return s_rows, f_rows
+
+    channels = {"dense": dense}
+    if emb.get("bm25") is not None:
+        channels["bm25"] = bm25
+    ranked = run_channels(channels, channel_budgets_ms)
+
+    # Reciprocal-rank fusion of whichever channels finished in budget
+    s_rows, s_scores = reciprocal_rank_fusion([r[0] for r in ranked.values()], limit=topk_symbol)
+    f_rows, f_scores = reciprocal_rank_fusion([r[1] for r in ranked.values()], limit=topk_file)
+    sym_hits = units.gather(s_rows, scores=s_scores)
+    file_hits = units.gather(f_rows, scores=f_scores)
+
+    # Lexical boosters by section (matched on metadata, texts fetched for the winners only)
     hints = SECTION_HINTS.get(section_normalize(section_title), [])
-    f_boost, s_boost = find_lexical_candidates(df.reset_index(), hints, max_files=extra_file, max_symbols=extra_symbol)
+    f_boost, s_boost = find_lexical_candidates(units.df, hints, max_files=extra_file, max_symbols=extra_symbol,
+                                               lexical=emb.get("lexical"))
+    f_boost = units.frame(f_boost["uid"].tolist())
+    s_boost = units.frame(s_boost["uid"].tolist())
 
     def combine(a: pd.DataFrame, b: pd.DataFrame) -> pd.DataFrame:
         if len(b) == 0: return a
@@ -343,14 +366,8 @@ Return ONLY the final Markdown (no extra text). ORIGINAL DRAFT:
     return draft, refine
 # ========================= QGenie =========================
 def qgenie_chat(prompt: str, system: Optional[str] = None) -> str:
-    from qgenie import QGenieClient, ChatMessage
-    client = QGenieClient()
-    messages = []
-    if system:
-        messages.append(ChatMessage(role="system", content=system))
-    messages.append(ChatMessage(role="user", content=prompt))
-    response = client.chat(messages=messages, model="Pro")
-    return (getattr(response, "first_content", None) or str(response) or "").strip()
+    import llm_client
+    return (llm_client.chat(prompt, model="Pro", system=system) or "").strip()
 
 # ========================= Post-processing Helpers =========================
 def extract_mermaid_blocks(markdown_text: str) -> List[str]:
@@ -405,7 +422,9 @@ def linkify_references(md: str, owner: str, repo: str, branch: str, subpath: str
     return "\n".join(out)
 
 # ========================= Main Generation Function =========================
-def generate_wiki_pages(
+PAGE_WORKERS = 4
+
+def iter_wiki_pages(
     output_root: str,
     lang_text: str = "English",
     page_ids: Optional[List[str]] = None,
@@ -413,12 +432,19 @@ def generate_wiki_pages(
     gen_knobs: Optional[Dict[str, Any]] = None,
     diagram_fallback: bool = True,
     use_cache: bool = True,
-    clear_cache: bool = False
-) -> Dict[str, Dict[str, Any]]:
+    clear_cache: bool = False,
+    max_workers: int = PAGE_WORKERS,
+    requests_per_sec: Optional[float] = None,
+    progress: Optional[ProgressChannel] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
     """
-    Generates Markdown documentation pages for each wiki page using hybrid code+summary embeddings and QGenie.
-    Returns: dict of page_id -> {markdown_path, markdown_content, hybrid_results}
+    Generates pages concurrently (max_workers pages in flight, all chat calls
+    sharing one optional requests_per_sec limiter) and yields
+    (page_id, {markdown_path, markdown_content, hybrid_results}) as each page
+    is written, in completion order. progress receives "pages" stage events.
     """
+    from concurrency import TokenBucket, map_as_completed
+
     # Load wiki XML
     wiki_xml_path = os.path.join(output_root, "wiki_xml", "wiki.xml")
     wiki = load_wiki_xml(wiki_xml_path)
@@ -434,19 +460,8 @@ def generate_wiki_pages(
     # Section id -> title
     sections_by_id = {s["id"]: s["title"] for s in wiki.get("sections", [])}
 
-    # Stable page order
-    pages_order = []
-    seen = set()
-    for s in wiki.get("sections", []):
-        for pid in s.get("page_refs", []):
-            if pid in wiki["pages"] and pid not in seen:
-                pages_order.append(pid); seen.add(pid)
-    for pid in wiki.get("pages", {}).keys():
-        if pid not in seen:
-            pages_order.append(pid)
-
     if page_ids is None:
-        page_ids = pages_order
+        page_ids = wiki_page_order(wiki)
 
     # Default knobs
     retrieval_knobs = retrieval_knobs or {
@@ -465,7 +480,14 @@ def generate_wiki_pages(
     pages_dir = utils.ensure_dir(os.path.join(output_root, "wiki_pages"))
     cache_dir = utils.ensure_dir(os.path.join(pages_dir, ".cache"))
 
-    def build_cache_key(page_spec, sec_title, retrieval_knobs, gen_knobs, ctx_unit_ids, version="v2"):
+    bucket = TokenBucket(requests_per_sec) if requests_per_sec else None
+
+    def chat(prompt, system=None):
+        if bucket:
+            bucket.acquire()
+        return qgenie_chat(prompt, system=system)
+
+    def build_cache_key(page_spec, sec_title, retrieval_knobs, gen_knobs, ctx_unit_ids, ctx_files=(), version="v2"):
         payload = {
             "v": version,
             "page": {k: page_spec.get(k) for k in ["id","title","description","importance","parent_section"]},
@@ -474,12 +496,22 @@ def generate_wiki_pages(
             "generation": gen_knobs,
             "ctx_ids": ctx_unit_ids[:64],
         }
+        # Content hashes of the files behind the page, so edits to them invalidate it
+        if emb["file_hashes"]:
+            payload["file_hashes"] = {f: emb["file_hashes"].get(f) for f in sorted(set(ctx_files))}
         blob = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
         return hashlib.sha1(blob).hexdigest()[:16]
 
     def page_cache_paths(cache_dir, page_id, key):
         return os.path.join(cache_dir, f"{page_id}__{key}draft.md"), os.path.join(cache_dir, f"{page_id}__{key}final.md")
 
+    def context_files(p, file_hits, sym_hits):
+        files = list(p.get("relevant_files") or [])
+        for hits in (file_hits, sym_hits):
+            if len(hits):
+                files.extend(hits["file_path"].dropna().tolist())
+        return files
+
     def context_ids_from_hits(file_hits, sym_hits, max_units):
         ids = []
         if len(sym_hits):
@@ -489,9 +521,7 @@ def generate_wiki_pages(
             ids.extend(file_hits["uid"].tolist()[:remain])
         return ids
 
-    results = {}
-
-    for pid in page_ids:
+    def generate_page(pid):
         p = wiki["pages"][pid]
         sec_title = sections_by_id.get(p.get("parent_section", ""), "(Unknown Section)")
         sec_norm = section_normalize(sec_title)
@@ -504,7 +534,8 @@ def generate_wiki_pages(
             emb=emb,
             topk_file=int(retrieval_knobs["topk_file"]),
             topk_symbol=int(retrieval_knobs["topk_symbol"]),
-            extra_file=6, extra_symbol=10
+            extra_file=6, extra_symbol=10,
+            channel_budgets_ms=retrieval_knobs.get("channel_budgets_ms"),
         )
 
         readme_ok = gen_knobs["include_overview_readme"] and (sec_norm in ("overview", "examples and notebooks"))
@@ -529,6 +560,7 @@ def generate_wiki_pages(
             retrieval_knobs=retrieval_knobs,
             gen_knobs=gen_knobs,
             ctx_unit_ids=ctx_ids,
+            ctx_files=context_files(p, file_hits, sym_hits),
             version="v2"
         )
         draft_cache_path, final_cache_path = page_cache_paths(cache_dir, pid, cache_key)
@@ -541,10 +573,10 @@ def generate_wiki_pages(
             system_msg = ("Follow the user's instructions EXACTLY. Output ONLY Markdown; "
                           "include required Mermaid diagrams; obey file selection constraints; "
                           "no extra commentary.")
-            draft_md = qgenie_chat(draft_prompt, system=system_msg)
+            draft_md = chat(draft_prompt, system=system_msg)
             utils.write_text(draft_cache_path, draft_md)
 
-            final_md = qgenie_chat(refine_prompt + "\n\n" + draft_md, system=system_msg)
+            final_md = chat(refine_prompt + "\n\n" + draft_md, system=system_msg)
             if diagram_fallback:
                 diags = extract_mermaid_blocks(final_md)
                 if not diags:
@@ -552,7 +584,7 @@ def generate_wiki_pages(
 Use 'sequenceDiagram' unless a class or flowchart is clearly better; return a single Mermaid fenced block and nothing else.
 
 Context units (for accurate names & calls): {build_context_pack(file_hits, sym_hits, max_units=int(retrieval_knobs["max_units"]), max_code_chars=600)} """
-                    fb_md = qgenie_chat(fallback, system="Return ONLY a mermaid fenced block.")
+                    fb_md = chat(fallback, system="Return ONLY a mermaid fenced block.")
                     m = re.search(r"mermaid\s+([\s\S]*?)", fb_md, re.IGNORECASE)
                     code = m.group(1).strip() if m else fb_md.strip().strip("`")
                     if code:
@@ -562,7 +594,7 @@ Context units (for accurate names & calls): {build_context_pack(file_hits, sym_h
 
         page_path = os.path.join(pages_dir, f"{pid}.md")
         utils.write_text(page_path, final_md)
-        results[pid] = {
+        return pid, {
             "markdown_path": page_path,
             "markdown_content": final_md,
             "hybrid_results": {
@@ -571,7 +603,56 @@ Context units (for accurate names & calls): {build_context_pack(file_hits, sym_h
             }
         }
 
-    return results
+    pages_stage = open_stage(progress, "pages", total=len(page_ids))
+    for _, (pid, result) in map_as_completed(generate_page, list(page_ids), max_workers=max_workers):
+        if pages_stage:
+            pages_stage.advance(1, message=pid)
+        yield pid, result
+    if pages_stage:
+        pages_stage.finish()
+
+    print(f"[INFO] Query embedding cache: {get_query_cache().stats()}")
+
+def wiki_page_order(wiki: Dict[str, Any]) -> List[str]:
+    """Stable page order: pages by section reference order, then any unreferenced pages."""
+    pages_order = []
+    seen = set()
+    for s in wiki.get("sections", []):
+        for pid in s.get("page_refs", []):
+            if pid in wiki["pages"] and pid not in seen:
+                pages_order.append(pid); seen.add(pid)
+    for pid in wiki.get("pages", {}).keys():
+        if pid not in seen:
+            pages_order.append(pid)
+    return pages_order
+
+def generate_wiki_pages(
+    output_root: str,
+    lang_text: str = "English",
+    page_ids: Optional[List[str]] = None,
+    retrieval_knobs: Optional[Dict[str, Any]] = None,
+    gen_knobs: Optional[Dict[str, Any]] = None,
+    diagram_fallback: bool = True,
+    use_cache: bool = True,
+    clear_cache: bool = False,
+    max_workers: int = PAGE_WORKERS,
+    requests_per_sec: Optional[float] = None,
+    progress: Optional[ProgressChannel] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Generates Markdown documentation pages for each wiki page using hybrid code+summary embeddings and QGenie.
+    Returns: dict of page_id -> {markdown_path, markdown_content, hybrid_results}
+    """
+    results = dict(iter_wiki_pages(
+        output_root, lang_text=lang_text, page_ids=page_ids, retrieval_knobs=retrieval_knobs,
+        gen_knobs=gen_knobs, diagram_fallback=diagram_fallback, use_cache=use_cache,
+        clear_cache=clear_cache, max_workers=max_workers, requests_per_sec=requests_per_sec,
+        progress=progress,
+    ))
+    # Completion order -> requested (or stable wiki) page order
+    if page_ids is None:
+        page_ids = wiki_page_order(load_wiki_xml(os.path.join(output_root, "wiki_xml", "wiki.xml")))
+    return {pid: results[pid] for pid in page_ids if pid in results}
 
 # Example usage:
 # results = generate_wiki_pages(output_root="/path/to/repo_cache")
@@ -1,43 +1,36 @@
 import os
-import json
 import numpy as np
-import pandas as pd
 from typing import Dict, Any, List
  
 from langgraph.graph import StateGraph, END
+
+import vector_index
+from unit_store import UnitStore
+from sparse_index import BM25Index
+from fusion import reciprocal_rank_fusion, run_channels
+from query_cache import get_query_cache
  
 # --- Retriever Node ---
 class HybridRetriever:
     def __init__(self, embeddings_dir: str):
-        import faiss
         units_path = os.path.join(embeddings_dir, "units.parquet")
         if not os.path.isfile(units_path):
             raise FileNotFoundError(f"units.parquet not found in {embeddings_dir}")
-        self.df = pd.read_parquet(units_path).set_index("uid")
-        
-        # Load file index and IDs
-        file_index_path = os.path.join(embeddings_dir, "file_summary.index")
-        file_ids_path = os.path.join(embeddings_dir, "file_summary_ids.json")
-        self.file_index = faiss.read_index(file_index_path)
-        with open(file_ids_path, "r", encoding="utf-8") as f:
-            self.file_ids = json.load(f)
+        # Read-only mode: unit metadata only, code/summary fetched per hit from the text sidecar
+        self.units = UnitStore(embeddings_dir)
         
-        # Load symbol index and IDs
-        symbol_index_path = os.path.join(embeddings_dir, "symbol_summary.index")
-        symbol_ids_path = os.path.join(embeddings_dir, "symbol_summary_ids.json")
-        self.symbol_index = faiss.read_index(symbol_index_path)
-        with open(symbol_ids_path, "r", encoding="utf-8") as f:
-            self.symbol_ids = json.load(f)
+        # One summary index over file + symbol units; levels are searched via ID selectors
+        self.index, self.ids, self.resolver = vector_index.load_prefix(embeddings_dir, "summary", mmap=True)
         
         # Validate index and ID list sizes match
-        file_index_size = self.file_index.ntotal
-        symbol_index_size = self.symbol_index.ntotal
-        
-        if file_index_size != len(self.file_ids):
-            print(f"WARNING: File index size ({file_index_size}) != file_ids length ({len(self.file_ids)})")
+        if self.index.ntotal != len(self.ids):
+            print(f"WARNING: Summary index size ({self.index.ntotal}) != ids length ({len(self.ids)})")
         
-        if symbol_index_size != len(self.symbol_ids):
-            print(f"WARNING: Symbol index size ({symbol_index_size}) != symbol_ids length ({len(self.symbol_ids)})")
+        # Sparse BM25 channel (identifier-aware), fused with dense hits by reciprocal rank
+        self.bm25 = BM25Index.load(embeddings_dir)
+        if self.bm25 is not None and self.bm25.n_docs != len(self.units):
+            print(f"WARNING: BM25 index size ({self.bm25.n_docs}) != units ({len(self.units)}), disabling it")
+            self.bm25 = None
  
     def embed_query(self, query: str, history: List[Dict[str, str]]) -> np.ndarray:
         # Concatenate history for richer embedding
@@ -45,55 +38,52 @@ class HybridRetriever:
         if history:
             history_text = "\n".join([f"Q: {h['question']}\nA: {h['answer']}" for h in history])
         full_query = f"{history_text}\nCurrent question: {query}" if history_text else query
-        from qgenie import QGenieClient
-        client = QGenieClient()
-        embedding_response = client.embeddings([full_query])
-        embedding = embedding_response.data[0].embedding
-        return np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        return get_query_cache().embed([full_query]).reshape(1, -1)
  
     def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
         query = state["question"]
         history = state.get("history", [])
         topk_file = state.get("topk_file", 5)
         topk_symbol = state.get("topk_symbol", 5)
-        qvec = self.embed_query(query, history)
-        Df, If = self.file_index.search(qvec, topk_file)
-        Ds, Is = self.symbol_index.search(qvec, topk_symbol)
- 
-        file_hits = []
-        # Only process file results if we have files
-        if len(self.file_ids) > 0:
-            for score, idx in zip(Df[0].tolist(), If[0].tolist()):
-                # Bounds checking to prevent IndexError and skip invalid indices
-                if idx >= 0 and idx < len(self.file_ids):
-                    uid = self.file_ids[idx]
-                    row = self.df.loc[uid]
-                    file_hits.append({
-                        "uid": uid,
-                        "file_path": row["file_path"],
-                        "summary": row.get("summary", ""),
-                        "code": row.get("code", ""),
-                        "score": float(score),
-                    })
- 
-        symbol_hits = []
-        # Only process symbol results if we have symbols
-        if len(self.symbol_ids) > 0:
-            for score, idx in zip(Ds[0].tolist(), Is[0].tolist()):
-                # Bounds checking to prevent IndexError and skip invalid indices
-                if idx >= 0 and idx < len(self.symbol_ids):
-                    uid = self.symbol_ids[idx]
-                    row = self.df.loc[uid]
-                    symbol_hits.append({
-                        "uid": uid,
-                        "file_path": row["file_path"],
-                        "symbol_type": row.get("symbol_type", ""),
-                        "symbol_name": row.get("symbol_name", ""),
-                        "signature": row.get("signature", ""),
-                        "summary": row.get("summary", ""),
-                        "code": row.get("code", ""),
-                        "score": float(score),
-                    })
+        levels = self.units.columns["level"]
+
+        def dense():
+            qvec = self.embed_query(query, history)
+            f_labels, _ = vector_index.search_labels(self.index, self.resolver, qvec, topk_file, level="file")
+            s_labels, _ = vector_index.search_labels(self.index, self.resolver, qvec, topk_symbol, level="symbol")
+            return self.units.rows_for_hits(self.resolver, f_labels), self.units.rows_for_hits(self.resolver, s_labels)
+
+        def bm25():
+            f_rows, _ = self.bm25.search(query, topk_file, mask=levels == "file")
+            s_rows, _ = self.bm25.search(query, topk_symbol, mask=levels == "symbol")
+            return f_rows, s_rows
+
+        channels = {"dense": dense}
+        if self.bm25 is not None:
+            channels["bm25"] = bm25
+        ranked = run_channels(channels, state.get("channel_budgets_ms"))
+        f_rows, f_scores = reciprocal_rank_fusion([r[0] for r in ranked.values()], limit=topk_file)
+        s_rows, s_scores = reciprocal_rank_fusion([r[1] for r in ranked.values()], limit=topk_symbol)
+ 
+        # Rows are hydrated with a columnar gather
+        file_hits = [{
+            "uid": r["uid"],
+            "file_path": r["file_path"],
+            "summary": r["summary"] or "",
+            "code": r["code"] or "",
+            "score": float(r["score"]),
+        } for r in self.units.gather(f_rows, fields=("summary", "code"), scores=f_scores).to_dict("records")]
+ 
+        symbol_hits = [{
+            "uid": r["uid"],
+            "file_path": r["file_path"],
+            "symbol_type": r["symbol_type"] or "",
+            "symbol_name": r["symbol_name"] or "",
+            "signature": r["signature"] or "",
+            "summary": r["summary"] or "",
+            "code": r["code"] or "",
+            "score": float(r["score"]),
+        } for r in self.units.gather(s_rows, fields=("summary", "code"), scores=s_scores).to_dict("records")]
  
         # Compose context markdown
         context_md = []
@@ -122,8 +112,7 @@ class LLMAnswerer:
         self.model_name = model_name
  
     def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        from qgenie import QGenieClient, ChatMessage
-        client = QGenieClient()
+        import llm_client
         question = state["question"]
         context = state["context"]
         history = state.get("history", [])
@@ -142,15 +131,15 @@ Current question:
 {question}
  
 Return a concise, factual answer. If relevant, cite file paths or symbol names from the context."""
-        response = client.chat(messages=[ChatMessage(role="user", content=prompt)], model=self.model_name)
-        answer = getattr(response, "first_content", None) or str(response)
+        answer = llm_client.chat(prompt, model=self.model_name)
         state["answer"] = answer
         return state
  
 # --- LangGraph Construction ---
-def build_hybrid_code_chatbot_graph(embeddings_dir: str, model_name="Pro"):
+def build_hybrid_code_chatbot_graph(embeddings_dir: str, model_name="Pro", retriever: HybridRetriever = None):
+    # Pass a retriever to share one loaded index set between graphs
     graph = StateGraph(dict)
-    retriever = HybridRetriever(embeddings_dir)
+    retriever = retriever or HybridRetriever(embeddings_dir)
     llm = LLMAnswerer(model_name)
     graph.add_node("retrieve", retriever)
     graph.add_node("llm", llm)
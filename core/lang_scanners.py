@@ -0,0 +1,193 @@
+"""
+Regex scanners for the non-Python languages, shared by the knowledge graph
+(build_wiki) and unit extraction (build_embeddings).
+
+Each language gets ONE compiled pattern, built at import: an alternation of
+named branches (class / function / import), scanned in a single finditer
+pass. The branch that matched is m.lastgroup, its value the branch's own
+named group.
+
+Patterns are written so the time per MB stays bounded on hostile input
+(minified bundles, generated headers, unbalanced parentheses):
+- adjacent repeated pieces use disjoint character classes, so there is only
+  one way to split a match (no nested-quantifier backtracking)
+- spans that may run to an unknown closer (import clauses, argument lists,
+  use-lists) exclude their closer and have an explicit length cap, instead
+  of [\\s\\S]*? / [^;]*; Rust use trees are matched structurally, so an
+  unterminated one costs its own length, not the cap
+bench_scanners.py measures this on a generated pathological corpus.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+IDENT = r"[A-Za-z_][A-Za-z0-9_]*"
+JS_IDENT = r"[A-Za-z_$][A-Za-z0-9_$]*"
+
+# Caps on spans whose closing token may never come
+MAX_SPEC = 1000    # import clause / argument list
+MAX_PATH = 300     # quoted module path
+
+@dataclass
+class Match:
+    kind: str      # "class" | "function" | "import"
+    name: str
+    start: int     # offset of the whole construct in the text
+
+_QUOTED = re.compile(r'"([^"\n]+)"')
+_SPACES = re.compile(r"\s+")
+
+def _go_import_block(value: str) -> List[str]:
+    return _QUOTED.findall(value)
+
+def _rust_use(value: str) -> List[str]:
+    return [_SPACES.sub(" ", value).strip()]
+
+class LanguageScanner:
+    """
+    One compiled alternation over (kind, pattern) branches. Every pattern
+    names its value group (?P<v>...); branches are renumbered on compile.
+    `expand` turns a raw value into module names (import blocks, use-lists).
+    """
+
+    def __init__(self, lang: str, branches: List[Tuple[str, str]], flags: int = 0,
+                 expand: Optional[Dict[int, Callable[[str], List[str]]]] = None):
+        self.lang = lang
+        self._kinds: Dict[str, Tuple[str, str, Optional[Callable[[str], List[str]]]]] = {}
+        parts = []
+        for i, (kind, pattern) in enumerate(branches):
+            if "(?P<v>" not in pattern:
+                raise ValueError(f"{lang} branch {i} has no (?P<v>...) group")
+            branch, value = f"b{i}", f"v{i}"
+            parts.append(f"(?P<{branch}>{pattern.replace('(?P<v>', f'(?P<{value}>')})")
+            self._kinds[branch] = (kind, value, (expand or {}).get(i))
+        self.regex = re.compile("|".join(parts), flags)
+
+    def scan(self, text: str) -> Iterator[Match]:
+        for m in self.regex.finditer(text):
+            # The branch group encloses its value group, so it is the last one closed
+            kind, value, expand = self._kinds[m.lastgroup]
+            raw = m.group(value)
+            for name in (expand(raw) if expand else [raw]):
+                yield Match(kind, name, m.start())
+
+    def graph_facts(self, text: str) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """(classes, imports, functions) in the format of build_wiki's parsers."""
+        classes, imports, functions = [], [], []
+        for m in self.scan(text):
+            if m.kind == "class":
+                classes.append(m.name)
+            elif m.kind == "import":
+                imports.append({"type": "import", "module": m.name, "names": [], "level": 0})
+            else:
+                functions.append(m.name)
+        return classes, imports, list(dict.fromkeys(functions))
+
+# ===================== Per-language scanners =====================
+
+# Argument list: paren-free runs with up to 8 one-level nested groups, e.g.
+# "(int (*cb)(int), @Named("x") String s)". The runs exclude both parens, so
+# a failed match gives up at the first paren instead of rescanning MAX_SPEC.
+_ARGS = rf"\([^;{{}}()]{{0,{MAX_SPEC}}}(?:\([^;{{}}()]{{0,200}}\)[^;{{}}()]{{0,{MAX_SPEC}}}){{0,8}}\)"
+
+# Call-like keywords that look like "name(...) {" in brace languages
+_CONTROL = r"(?:if|else|for|foreach|while|switch|try|catch|return|do|case|sizeof|synchronized|new|throw)\b"
+
+JAVASCRIPT = LanguageScanner("javascript", [
+    ("class", rf"\bclass\s+(?P<v>{JS_IDENT})\b"),
+    # import 'm' / import x from 'm' / import x, {a, b} from "m" / import * as ns from 'm'
+    ("import", rf"""\bimport\s*(?:(?:type\s+)?(?:{JS_IDENT}\s*,?\s*)?"""
+               rf"""(?:\{{[^{{}}'";]{{0,{MAX_SPEC}}}\}}\s*|\*\s*as\s+{JS_IDENT}\s+)?from\s*)?"""
+               rf"""['"](?P<v>[^'"\n]{{1,{MAX_PATH}}})['"]"""),
+    ("import", rf"""\brequire\(\s*['"](?P<v>[^'"\n]{{1,{MAX_PATH}}})['"]\s*\)"""),
+    # also covers "export function f(" and "async function f("
+    ("function", rf"\bfunction\s*\*?\s*(?P<v>{JS_IDENT})\s*\("),
+    ("function", rf"\b(?:const|let|var)\s+(?P<v>{JS_IDENT})\s*=\s*(?:async\s+)?(?:function\b|\()"),
+])
+
+JAVA = LanguageScanner("java", [
+    ("class", rf"\b(?:class|interface|enum)\s+(?P<v>{IDENT})\b"),
+    ("import", r"\bimport\s+(?P<v>[A-Za-z0-9_.]+)\s*;"),
+    # method definitions: name(args) [throws ...] {
+    # (not anonymous classes, "new Thread() {" / "new java.lang.Thread() {")
+    ("function", rf"(?<!\bnew\s)(?<!\.)\b(?!{_CONTROL})(?P<v>{IDENT})\s*{_ARGS}\s*"
+                 rf"(?:throws\s+[A-Za-z0-9_.,\s]{{1,200}}?)?\{{"),
+])
+
+GO = LanguageScanner("go", [
+    ("class", rf"\btype\s+(?P<v>{IDENT})\s+struct\b"),
+    ("import", rf'\bimport\s+(?:{IDENT}\s+)?"(?P<v>[^"\n]{{1,{MAX_PATH}}})"'),
+    ("import", r"\bimport\s*\((?P<v>[^)]{0,20000})\)"),
+    ("function", rf"\bfunc\s+(?:\([^)\n]{{0,200}}\)\s*)?(?P<v>{IDENT})\s*[(\[]"),
+], expand={2: _go_import_block})
+
+# Return type / qualifier tokens before a C/C++ function name. Token and
+# separator characters are disjoint, so each run splits in exactly one way;
+# separators may cross a newline ("int\nmain(void)\n{").
+_C_TYPE_TOKEN = r"[A-Za-z_][A-Za-z0-9_:<>,]*"
+_C_TYPE_SEP = r"[\s*&]+"
+
+# Constructor initializer list, "s_(s), n_(std::max(n, 0))": a ':' then
+# paren-free runs around up to 16 initializers, each holding up to 4 nested
+# calls. Runs before the ':' exclude it, so the list (or a trailing
+# "-> std::string") starts at exactly one place.
+_C_INIT = r"\([^;{}()]{0,200}(?:\([^;{}()]{0,200}\)[^;{}()]{0,200}){0,4}\)"
+_C_INIT_LIST = rf":[^;{{}}()]{{0,200}}(?:{_C_INIT}[^;{{}}()]{{0,200}}){{0,16}}"
+
+C_CPP = LanguageScanner("c", [
+    ("import", rf'#[ \t]*include[ \t]*[<"](?P<v>[^>"\n]{{1,{MAX_PATH}}})[>"]'),
+    # Top-level definition at line start (requires a body '{', skips ';' declarations):
+    #   int foo(int a) {            static inline T ns::Class::method(T x) const {
+    #   Sink::Sink(std::string* s) : s_(s) {
+    # Out-of-line constructors / destructors have no return type: Sink::~Sink() {
+    ("function", rf"^[ \t]*(?!{_CONTROL})(?:(?:{_C_TYPE_TOKEN}{_C_TYPE_SEP}){{1,8}}(?:{IDENT}::){{0,8}}|(?:{IDENT}::){{1,8}})"
+                 rf"(?P<v>~?{IDENT})[ \t]*{_ARGS}[^;{{}}():]{{0,80}}(?:{_C_INIT_LIST})?\{{"),
+    ("class", rf"\b(?:class|struct)\s+(?P<v>{IDENT})\b"),
+], flags=re.M)
+
+def _brace_list(depth: int) -> str:
+    """{...} holding up to `depth` levels of nested {...}; runs exclude ';{}'."""
+    inner = ""
+    for _ in range(depth):
+        nested = rf"(?:{inner}[^;{{}}]{{0,{MAX_SPEC}}}){{0,32}}" if inner else ""
+        inner = rf"\{{[^;{{}}]{{0,{MAX_SPEC}}}{nested}\}}"
+    return inner
+
+# Use tree, "a::{b, c::{d as e}, f::*}": a path then '*', an alias or a brace list.
+# A clause that never reaches its ';' fails at its own closing brace instead of
+# running on through the next "use" statements.
+_RUST_USE_TREE = rf"(?:::)?(?:{IDENT}\s*::\s*)*(?:\*|{_brace_list(4)}|{IDENT}(?:\s+as\s+{IDENT})?)"
+
+RUST = LanguageScanner("rust", [
+    ("import", rf"\buse\s+(?P<v>{_RUST_USE_TREE})\s*;"),
+    ("class", rf"\b(?:struct|enum)\s+(?P<v>{IDENT})\b"),
+    ("function", rf"\bfn\s+(?P<v>{IDENT})\s*[(<]"),
+], expand={0: _rust_use})
+
+RUBY = LanguageScanner("ruby", [
+    ("class", rf"\bclass\s+(?P<v>{IDENT})\b"),
+    ("import", rf"""\brequire(?:_relative)?\s*\(?\s*['"](?P<v>[^'"\n]{{1,{MAX_PATH}}})['"]"""),
+    ("function", rf"^[ \t]*def\s+(?:self\.)?(?P<v>{IDENT})"),
+], flags=re.M)
+
+PHP = LanguageScanner("php", [
+    ("class", rf"\bclass\s+(?P<v>{IDENT})\b"),
+    ("function", rf"\bfunction\s+&?\s*(?P<v>{IDENT})\s*\("),
+    ("import", r"\buse\s+(?P<v>[A-Za-z0-9_\\]+)\s*;"),
+])
+
+KOTLIN = LanguageScanner("kotlin", [
+    ("class", rf"\b(?:class|object|interface)\s+(?P<v>{IDENT})\b"),
+    ("import", r"\bimport\s+(?P<v>[A-Za-z0-9_.]+)"),
+    ("function", rf"\bfun\s+(?:<[^>\n]{{0,200}}>\s*)?(?:[A-Za-z0-9_<>?,]+\.){{0,8}}(?P<v>{IDENT})\s*\("),
+])
+
+SCANNERS: Dict[str, LanguageScanner] = {
+    "javascript": JAVASCRIPT, "java": JAVA, "go": GO, "c": C_CPP, "cpp": C_CPP,
+    "rust": RUST, "ruby": RUBY, "php": PHP, "kotlin": KOTLIN,
+}
+
+def scanner_for(lang: str) -> Optional[LanguageScanner]:
+    """Scanner for a detect_lang() language name, or None (python / text)."""
+    return SCANNERS.get(lang)
@@ -0,0 +1,88 @@
+"""
+Trigram inverted index for substring keyword matching over unit metadata.
+
+find_lexical_candidates boosts units whose file path (files) or path, symbol
+name and signature (symbols) contain any section hint keyword. Instead of a
+per-row Python scan for every page, the lowercased search text of each unit
+is indexed by its character trigrams once; a keyword lookup intersects the
+posting lists of its trigrams and verifies the few surviving candidates.
+Results are memoized per keyword set, since section hints repeat across pages.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+def unit_search_texts(df: pd.DataFrame) -> List[str]:
+    """Lowercased text matched by keyword boosts: the path for files, path + name + signature for symbols."""
+    def s(v) -> str:
+        return v if isinstance(v, str) else ""
+    texts = []
+    for level, path, name, sig in zip(df["level"].tolist(), df["file_path"].tolist(),
+                                      df["symbol_name"].tolist(), df["signature"].tolist()):
+        if level == "file":
+            texts.append(s(path).lower())
+        else:
+            texts.append(" ".join([s(path), s(name), s(sig)]).lower())
+    return texts
+
+def _trigrams(text: str) -> Iterable[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    """Rows of `texts` containing a keyword, via trigram posting-list intersection."""
+
+    def __init__(self, texts: Sequence[str]):
+        self.texts = list(texts)
+        postings: Dict[str, List[int]] = {}
+        for row, text in enumerate(self.texts):
+            for gram in _trigrams(text):
+                postings.setdefault(gram, []).append(row)
+        self._postings: Dict[str, np.ndarray] = {g: np.asarray(rows, dtype=np.int32) for g, rows in postings.items()}
+        self._memo: Dict[Tuple[str, ...], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_units(cls, df: pd.DataFrame) -> "TrigramIndex":
+        return cls(unit_search_texts(df))
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def rows_containing(self, keyword: str) -> np.ndarray:
+        """Sorted rows whose text contains `keyword` (case-insensitive)."""
+        kw = (keyword or "").lower()
+        if not kw:
+            return np.zeros(0, dtype=np.int32)
+        if len(kw) < 3:
+            # Too short for trigrams: plain scan (rare for section hints)
+            return np.asarray([r for r, t in enumerate(self.texts) if kw in t], dtype=np.int32)
+        lists = []
+        for gram in _trigrams(kw):
+            rows = self._postings.get(gram)
+            if rows is None:
+                return np.zeros(0, dtype=np.int32)
+            lists.append(rows)
+        lists.sort(key=len)
+        cand = lists[0]
+        for rows in lists[1:]:
+            cand = np.intersect1d(cand, rows, assume_unique=True)
+            if not len(cand):
+                return cand
+        # Trigrams co-occurring does not imply the substring does; verify the survivors
+        return np.asarray([r for r in cand.tolist() if kw in self.texts[r]], dtype=np.int32)
+
+    def rows_matching_any(self, keywords: Iterable[str]) -> np.ndarray:
+        """Sorted rows containing at least one keyword; memoized per keyword set."""
+        key = tuple(sorted({k.lower() for k in keywords if k}))
+        with self._lock:
+            hit = self._memo.get(key)
+        if hit is not None:
+            return hit
+        parts = [self.rows_containing(k) for k in key]
+        rows = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int32)
+        with self._lock:
+            self._memo[key] = rows
+        return rows
@@ -0,0 +1,209 @@
+"""
+Process-wide QGenie client manager.
+
+Every chat / embeddings call goes through one LLMClientManager, which:
+- pools QGenieClient instances (created lazily, reused LIFO so the most
+  recently used keep-alive connection is picked first)
+- bounds in-flight requests per model with a semaphore
+- applies one timeout / retry policy (jittered exponential backoff); the
+  backoff sleep happens outside the per-model slot
+- counts calls in flight and (estimated) tokens used, for progress reporting:
+  process-wide, and per usage_scope() so concurrent build jobs each see
+  only their own calls
+
+Call sites use the module-level chat() / embeddings() helpers.
+"""
+
+import contextvars
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from concurrency import call_with_retry, estimate_tokens
+
+@dataclass
+class LLMPolicy:
+    timeout: float = 100.0
+    max_retries: int = 2
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+DEFAULT_POOL_SIZE = int(os.environ.get("QGENIE_POOL_SIZE", "16"))
+DEFAULT_MODEL_CONCURRENCY = int(os.environ.get("QGENIE_MODEL_CONCURRENCY", "8"))
+
+def _qgenie():
+    try:
+        import qgenie
+    except ImportError:
+        raise RuntimeError("qgenie is not installed. Run: pip install qgenie")
+    return qgenie
+
+class LLMUsage:
+    """Calls in flight, completed calls (including failed attempts) and estimated tokens."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.tokens = 0
+
+    def add(self, in_flight: int = 0, calls: int = 0, tokens: int = 0):
+        with self._lock:
+            self.in_flight += in_flight
+            self.calls += calls
+            self.tokens += tokens
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": self.in_flight, "calls": self.calls, "tokens": self.tokens}
+
+# Usage of the current build job; concurrency.map_ordered / map_as_completed carry it into their workers
+_SCOPE: "contextvars.ContextVar[Optional[LLMUsage]]" = contextvars.ContextVar("llm_usage_scope", default=None)
+
+@contextmanager
+def usage_scope(usage: LLMUsage):
+    """Also count LLM calls made in this context (and work fanned out from it) into `usage`."""
+    token = _SCOPE.set(usage)
+    try:
+        yield usage
+    finally:
+        _SCOPE.reset(token)
+
+class LLMClientManager:
+    """Pooled QGenie clients with per-model concurrency limits and a shared retry policy."""
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, policy: Optional[LLMPolicy] = None,
+                 model_concurrency: Optional[Dict[str, int]] = None,
+                 default_concurrency: int = DEFAULT_MODEL_CONCURRENCY):
+        self.pool_size = pool_size
+        self.policy = policy or LLMPolicy()
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._model_limits = dict(model_concurrency or {})
+        self._default_concurrency = default_concurrency
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self.totals = LLMUsage()
+
+    # ---- pooling ----
+
+    @contextmanager
+    def lease(self):
+        """
+        Borrow a client; waits for an idle one once pool_size clients exist.
+        A client whose call raised is discarded (its connection may be broken);
+        its slot goes back as None, so the next lease creates a fresh client.
+        """
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.pool_size
+                if create:
+                    self._created += 1
+            client = None if create else self._idle.get()
+        if client is None:
+            try:
+                client = _qgenie().QGenieClient(timeout=self.policy.timeout)
+            except Exception:
+                self._idle.put(None)
+                raise
+        try:
+            yield client
+        except BaseException:
+            self._idle.put(None)
+            raise
+        self._idle.put(client)
+
+    def set_model_limit(self, model: str, limit: int):
+        with self._lock:
+            self._model_limits[model] = limit
+            self._semaphores.pop(model, None)
+
+    def _slot(self, model: Optional[str]) -> threading.BoundedSemaphore:
+        key = model or "default"
+        with self._lock:
+            sem = self._semaphores.get(key)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self._model_limits.get(key, self._default_concurrency))
+                self._semaphores[key] = sem
+            return sem
+
+    def _with_policy(self, model: Optional[str], fn, max_retries: Optional[int]):
+        def attempt():
+            with self._slot(model), self.lease() as client:
+                self._record(in_flight=1)
+                try:
+                    return fn(client)
+                finally:
+                    self._record(in_flight=-1, calls=1)
+        retries = self.policy.max_retries if max_retries is None else max_retries
+        return call_with_retry(attempt, max_retries=retries,
+                               base_delay=self.policy.base_delay, max_delay=self.policy.max_delay)
+
+    def _record(self, **counts: int):
+        self.totals.add(**counts)
+        scoped = _SCOPE.get()
+        if scoped is not None:
+            scoped.add(**counts)
+
+    def _count_tokens(self, n: int):
+        self._record(tokens=n)
+
+    def usage(self) -> Dict[str, int]:
+        """Process-wide calls in flight, completed calls (including failed attempts) and estimated tokens."""
+        return self.totals.snapshot()
+
+    # ---- requests ----
+
+    def chat(self, prompt: str, model: Optional[str] = None, system: Optional[str] = None,
+             max_retries: Optional[int] = None) -> str:
+        """Single-turn chat; returns the first content (or the stringified response)."""
+        ChatMessage = _qgenie().ChatMessage
+        messages = []
+        if system:
+            messages.append(ChatMessage(role="system", content=system))
+        messages.append(ChatMessage(role="user", content=prompt))
+
+        def call(client):
+            response = client.chat(messages=messages, model=model)
+            return getattr(response, "first_content", None) or str(response)
+        text = self._with_policy(model, call, max_retries)
+        self._count_tokens(estimate_tokens(system or "") + estimate_tokens(prompt) + estimate_tokens(text))
+        return text
+
+    def embeddings(self, texts: Sequence[str], model: Optional[str] = None,
+                   max_retries: Optional[int] = None) -> np.ndarray:
+        """float32 matrix with one embedding per text (model=None uses the client default)."""
+        texts = list(texts)
+
+        def call(client):
+            response = client.embeddings(texts, model=model) if model else client.embeddings(texts)
+            return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+        vecs = self._with_policy(model, call, max_retries)
+        self._count_tokens(sum(estimate_tokens(t) for t in texts))
+        return vecs
+
+# ===================== Process-wide manager =====================
+
+_MANAGER: Optional[LLMClientManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+def get_llm_client() -> LLMClientManager:
+    global _MANAGER
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = LLMClientManager()
+        return _MANAGER
+
+def chat(prompt: str, model: Optional[str] = None, system: Optional[str] = None,
+         max_retries: Optional[int] = None) -> str:
+    return get_llm_client().chat(prompt, model=model, system=system, max_retries=max_retries)
+
+def embeddings(texts: Sequence[str], model: Optional[str] = None, max_retries: Optional[int] = None) -> np.ndarray:
+    return get_llm_client().embeddings(texts, model=model, max_retries=max_retries)
@@ -0,0 +1,351 @@
+"""
+Pluggable parser backends for the non-Python languages.
+
+A backend turns one source file into a ParsedFile: graph facts for
+build_wiki (classes, imports, functions) and, on request, symbols with exact
+extents for build_embeddings. The registry tries backends in order and uses
+the first that supports the language and parses the file:
+
+- "tree-sitter": real syntax trees, used when the tree_sitter package and a
+  grammar for the language are installed (tree_sitter_language_pack,
+  tree_sitter_languages, or per-language tree_sitter_<lang> modules).
+  Grammars load lazily on the first file of each language, so startup and
+  Python-only repos never pay for them; a grammar that does not find the
+  function in a small probe snippet (e.g. node types renamed in a newer
+  grammar release) is treated as unavailable.
+- "regex": lang_scanners + block_scanner; always available and always the
+  last fallback.
+
+PARSER_BACKENDS (comma-separated, default "tree-sitter,regex") picks the order;
+"regex" alone disables tree-sitter. bench_parsers.py compares backends.
+"""
+
+import importlib
+import importlib.util
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import lang_scanners
+from block_scanner import BlockScanner
+
+DEFAULT_BACKENDS = "tree-sitter,regex"
+
+@dataclass
+class Symbol:
+    kind: str          # "class" | "function"
+    name: str
+    start_line: int    # 1-based, inclusive
+    end_line: int
+    code: str          # from the start of start_line to the end of the symbol
+
+@dataclass
+class ParsedFile:
+    backend: str
+    classes: List[str] = field(default_factory=list)
+    imports: List[str] = field(default_factory=list)     # module names
+    functions: List[str] = field(default_factory=list)
+    symbols: List[Symbol] = field(default_factory=list)  # filled when parse(..., symbols=True)
+
+    def graph_facts(self) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """(classes, imports, functions) in the format of build_wiki's parsers."""
+        imports = [{"type": "import", "module": m, "names": [], "level": 0} for m in self.imports]
+        return list(self.classes), imports, list(dict.fromkeys(self.functions))
+
+# ===================== Regex backend =====================
+
+class RegexBackend:
+    name = "regex"
+
+    def supports(self, lang: str) -> bool:
+        return lang_scanners.scanner_for(lang) is not None
+
+    def parse(self, text: str, lang: str, ext: str = "", symbols: bool = True) -> Optional[ParsedFile]:
+        out = ParsedFile(self.name)
+        blocks = BlockScanner(text, lang) if symbols else None
+        for m in lang_scanners.scanner_for(lang).scan(text):
+            if m.kind == "import":
+                out.imports.append(m.name)
+                continue
+            (out.classes if m.kind == "class" else out.functions).append(m.name)
+            if blocks is not None and blocks.in_code(m.start):
+                block = blocks.block(m.start)
+                out.symbols.append(Symbol(m.kind, m.name, block.start_line, block.end_line, blocks.code(block)))
+        return out
+
+# ===================== Tree-sitter backend =====================
+
+# Node type -> "class" | "function" | "import", per grammar
+_JS_NODES = {
+    "class_declaration": "class", "class": "class", "abstract_class_declaration": "class",
+    "interface_declaration": "class",
+    "function_declaration": "function", "generator_function_declaration": "function",
+    "method_definition": "function", "variable_declarator": "function",
+    "import_statement": "import", "call_expression": "import",
+}
+_C_NODES = {"struct_specifier": "class", "function_definition": "function", "preproc_include": "import"}
+
+_TS_NODES: Dict[str, Dict[str, str]] = {
+    "javascript": _JS_NODES, "typescript": _JS_NODES, "tsx": _JS_NODES,
+    "java": {
+        "class_declaration": "class", "interface_declaration": "class", "enum_declaration": "class",
+        "record_declaration": "class", "method_declaration": "function",
+        "constructor_declaration": "function", "import_declaration": "import",
+    },
+    "go": {"type_spec": "class", "function_declaration": "function", "method_declaration": "function",
+           "import_spec": "import"},
+    "c": _C_NODES,
+    "cpp": {**_C_NODES, "class_specifier": "class"},
+    "rust": {"struct_item": "class", "enum_item": "class", "trait_item": "class",
+             "function_item": "function", "use_declaration": "import"},
+    "ruby": {"class": "class", "module": "class", "method": "function", "singleton_method": "function",
+             "call": "import"},
+    "php": {"class_declaration": "class", "interface_declaration": "class", "trait_declaration": "class",
+            "function_definition": "function", "method_declaration": "function",
+            "namespace_use_clause": "import"},
+    "kotlin": {"class_declaration": "class", "object_declaration": "class",
+               "function_declaration": "function", "import_header": "import"},
+}
+
+# Per grammar: a snippet that must yield a function named "probe", checked when the grammar loads
+_PROBES: Dict[str, str] = {
+    "javascript": "function probe() {}", "typescript": "function probe(): void {}",
+    "tsx": "function probe(): void {}", "java": "class P { void probe() {} }",
+    "go": "package p\nfunc probe() {}\n", "c": "int probe(void) { return 0; }",
+    "cpp": "int probe() { return 0; }", "rust": "fn probe() {}", "ruby": "def probe\nend\n",
+    "php": "<?php function probe() {}", "kotlin": "fun probe() {}",
+}
+
+_NAME_TYPES = {"identifier", "type_identifier", "simple_identifier", "constant", "name",
+               "field_identifier", "property_identifier", "qualified_identifier",
+               "destructor_name", "operator_name"}
+_FUNCTION_VALUES = {"arrow_function", "function_expression", "function", "generator_function"}
+_REQUIRE_CALLS = {"require", "require_relative"}
+
+def _grammar(lang: str, ext: str) -> str:
+    if lang == "javascript":
+        return {"ts": "typescript", "tsx": "tsx"}.get(ext, "javascript")
+    return lang
+
+def _load_language(grammar: str):
+    """tree_sitter Language for a grammar name, from whichever grammar package is installed."""
+    try:
+        return importlib.import_module("tree_sitter_language_pack").get_language(grammar)
+    except Exception:
+        pass
+    try:
+        return importlib.import_module("tree_sitter_languages").get_language(grammar)
+    except Exception:
+        pass
+    from tree_sitter import Language
+    module = "typescript" if grammar == "tsx" else grammar
+    mod = importlib.import_module(f"tree_sitter_{module}")
+    factory = getattr(mod, f"language_{grammar}", None) or getattr(mod, "language")
+    try:
+        return Language(factory())
+    except TypeError:  # tree_sitter < 0.22 also wants a name
+        return Language(factory(), grammar)
+
+def _new_parser(language):
+    from tree_sitter import Parser
+    try:
+        return Parser(language)
+    except TypeError:  # tree_sitter < 0.22
+        parser = Parser()
+        parser.set_language(language)
+        return parser
+
+class TreeSitterBackend:
+    """Syntax-tree extraction; each grammar is loaded on first use and cached (None if unavailable)."""
+
+    name = "tree-sitter"
+
+    def __init__(self):
+        self._languages: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()   # parsers are not thread-safe
+        self._installed = importlib.util.find_spec("tree_sitter") is not None
+
+    def supports(self, lang: str) -> bool:
+        return self._installed and _grammar(lang, "") in _TS_NODES
+
+    def _parser(self, grammar: str):
+        with self._lock:
+            if grammar not in self._languages:
+                language = None
+                try:
+                    language = _load_language(grammar)
+                    probe = self._extract(_new_parser(language), grammar, _PROBES[grammar].encode("utf-8"), False)
+                    if "probe" not in probe.functions:
+                        print(f"[WARN] tree-sitter grammar '{grammar}' failed its self-check; "
+                              "using the next parser backend.")
+                        language = None
+                except Exception as e:
+                    print(f"[WARN] tree-sitter grammar '{grammar}' unavailable ({e}); using the next parser backend.")
+                    language = None
+                self._languages[grammar] = language
+            language = self._languages[grammar]
+        if language is None:
+            return None
+        parsers = getattr(self._local, "parsers", None)
+        if parsers is None:
+            parsers = self._local.parsers = {}
+        if grammar not in parsers:
+            parsers[grammar] = _new_parser(language)
+        return parsers[grammar]
+
+    def parse(self, text: str, lang: str, ext: str = "", symbols: bool = True) -> Optional[ParsedFile]:
+        grammar = _grammar(lang, ext)
+        parser = self._parser(grammar)
+        if parser is None:
+            return None
+        return self._extract(parser, grammar, text.encode("utf-8", errors="surrogatepass"), symbols)
+
+    def _extract(self, parser, grammar: str, src: bytes, symbols: bool) -> ParsedFile:
+        tree = parser.parse(src)
+        kinds = _TS_NODES[grammar]
+        out = ParsedFile(self.name)
+        stack = [tree.root_node]
+        while stack:
+            node = stack.pop()
+            kind = kinds.get(node.type)
+            if kind == "import":
+                module = _import_module(node, src)
+                if module:
+                    out.imports.append(module)
+            elif kind:
+                name = _symbol_name(node, src, grammar)
+                if name:
+                    (out.classes if kind == "class" else out.functions).append(name)
+                    if symbols:
+                        out.symbols.append(_symbol(node, kind, name, src))
+            stack.extend(reversed(node.children))
+        return out
+
+def _text(node, src: bytes) -> str:
+    return src[node.start_byte:node.end_byte].decode("utf-8", errors="replace")
+
+def _unquote(s: str) -> str:
+    return s.strip().strip("'\"`<>")
+
+def _name_child(node, src: bytes) -> Optional[str]:
+    named = node.child_by_field_name("name")
+    if named is not None:
+        return _text(named, src)
+    for child in node.named_children:
+        if child.type in _NAME_TYPES:
+            return _text(child, src)
+    return None
+
+def _symbol_name(node, src: bytes, grammar: str) -> Optional[str]:
+    t = node.type
+    if t == "function_definition" and grammar in ("c", "cpp"):
+        # Unwrap pointer/reference/function declarators down to the name
+        decl = node.child_by_field_name("declarator")
+        while decl is not None and decl.type not in _NAME_TYPES:
+            inner = decl.child_by_field_name("declarator")
+            if inner is None and decl.named_children:   # e.g. C++ reference_declarator
+                inner = decl.named_children[0]
+            decl = inner
+        if decl is None:
+            return None
+        name = _text(decl, src)
+        return name.rsplit("::", 1)[-1]
+    if t == "variable_declarator":
+        value = node.child_by_field_name("value")
+        return _name_child(node, src) if value is not None and value.type in _FUNCTION_VALUES else None
+    if t == "type_spec":
+        type_node = node.child_by_field_name("type")
+        return _name_child(node, src) if type_node is not None and type_node.type == "struct_type" else None
+    if t in ("struct_specifier", "class_specifier") and node.child_by_field_name("body") is None:
+        return None   # a use as a type ("struct foo *p"), not a definition
+    return _name_child(node, src)
+
+def _import_module(node, src: bytes) -> Optional[str]:
+    t = node.type
+    if t == "call_expression" or t == "call":
+        fn = node.child_by_field_name("function")
+        if fn is None:
+            fn = node.child_by_field_name("method")
+        args = node.child_by_field_name("arguments")
+        if fn is None or args is None or _text(fn, src) not in _REQUIRE_CALLS or not args.named_children:
+            return None
+        return _unquote(_text(args.named_children[0], src)) or None
+    for field_name in ("source", "path"):
+        target = node.child_by_field_name(field_name)
+        if target is not None:
+            return _unquote(_text(target, src)) or None
+    if t == "use_declaration":
+        arg = node.child_by_field_name("argument")
+        return " ".join(_text(arg, src).split()) if arg is not None else None
+    body = _text(node, src).strip().rstrip(";")
+    for keyword in ("import", "static", "use"):
+        if body.startswith(keyword + " "):
+            body = body[len(keyword):].strip()
+    return body or None
+
+def _symbol(node, kind: str, name: str, src: bytes) -> Symbol:
+    row, col = node.start_point[0], node.start_point[1]
+    line_start = node.start_byte - col
+    return Symbol(kind, name, row + 1, node.end_point[0] + 1,
+                  src[line_start:node.end_byte].decode("utf-8", errors="replace"))
+
+# ===================== Registry =====================
+
+BACKENDS: Dict[str, Callable[[], Any]] = {"tree-sitter": TreeSitterBackend, "regex": RegexBackend}
+
+class ParserRegistry:
+    """Backends in priority order; parse() falls through to the next on unsupported / failed files."""
+
+    def __init__(self, backends: Sequence[Any]):
+        self.backends = list(backends)
+
+    def register(self, backend, first: bool = False):
+        if first:
+            self.backends.insert(0, backend)
+        else:
+            self.backends.append(backend)
+
+    def backend_for(self, lang: str):
+        return next((b for b in self.backends if b.supports(lang)), None)
+
+    def parse(self, text: str, lang: str, ext: str = "", symbols: bool = True) -> Optional[ParsedFile]:
+        ext = ext.lower().lstrip(".")
+        for backend in self.backends:
+            if not backend.supports(lang):
+                continue
+            try:
+                parsed = backend.parse(text, lang, ext=ext, symbols=symbols)
+            except Exception as e:
+                print(f"[WARN] {backend.name} parser failed on a {lang} file: {e}")
+                continue
+            if parsed is not None:
+                return parsed
+        return None
+
+def make_registry(names: str = DEFAULT_BACKENDS) -> ParserRegistry:
+    """Registry from comma-separated backend names; regex is appended if missing."""
+    order = [n.strip() for n in names.split(",") if n.strip()]
+    unknown = [n for n in order if n not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown parser backends: {unknown} (available: {sorted(BACKENDS)})")
+    if "regex" not in order:
+        order.append("regex")
+    return ParserRegistry([BACKENDS[n]() for n in order])
+
+# ===================== Process-wide registry =====================
+
+_REGISTRY: Optional[ParserRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+def get_parser_registry() -> ParserRegistry:
+    """The process-wide registry (PARSER_BACKENDS overrides the order)."""
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = make_registry(os.environ.get("PARSER_BACKENDS", DEFAULT_BACKENDS))
+        return _REGISTRY
+
+def parse(text: str, lang: str, ext: str = "", symbols: bool = True) -> Optional[ParsedFile]:
+    return get_parser_registry().parse(text, lang, ext=ext, symbols=symbols)
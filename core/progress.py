@@ -0,0 +1,177 @@
+"""
+Build progress events shared by the wiki, embeddings and page-generation stages.
+
+Stages report through a ProgressChannel, which turns updates into typed
+ProgressEvents (stage, done/total, ETA, LLM calls in flight, tokens used) and
+fans them out to sinks: the Streamlit app renders them live, the CLI writes
+them as JSON lines. LLM numbers cover the channel's llm_scope() when one is
+open (one build job), otherwise the whole process.
+
+Usage:
+    channel = ProgressChannel([JsonLinesSink(sys.stderr)])
+    stage = channel.stage("summarize", total=len(units))
+    stage.advance(1, message=unit.uid)
+    stage.finish()
+"""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, IO, Iterable, List, Optional, Union
+
+@dataclass
+class ProgressEvent:
+    stage: str
+    done: int
+    total: int
+    eta_s: Optional[float]
+    elapsed_s: float
+    in_flight: int
+    tokens: int
+    message: str = ""
+    finished: bool = False
+    ts: float = 0.0
+
+    @property
+    def fraction(self) -> float:
+        return min(self.done / self.total, 1.0) if self.total else (1.0 if self.finished else 0.0)
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+ProgressSink = Callable[[ProgressEvent], None]
+
+def _llm_usage(channel: "ProgressChannel") -> Dict[str, int]:
+    if channel.usage is not None:
+        return channel.usage.snapshot()
+    try:
+        import llm_client
+    except ImportError:
+        return {"in_flight": 0, "tokens": 0}
+    return llm_client.get_llm_client().usage()
+
+class StageProgress:
+    """Progress of one stage; ETA is extrapolated from the rate so far."""
+
+    def __init__(self, channel: "ProgressChannel", name: str, total: int = 0):
+        self.channel = channel
+        self.name = name
+        self.total = int(total)
+        self.done = 0
+        self.started = time.monotonic()
+        self._tokens_at_start = _llm_usage(channel)["tokens"]
+        self._lock = threading.Lock()
+
+    def set_total(self, total: int):
+        with self._lock:
+            self.total = int(total)
+
+    def update(self, done: int, total: Optional[int] = None, message: str = ""):
+        with self._lock:
+            self.done = int(done)
+            if total is not None:
+                self.total = int(total)
+        self._emit(message)
+
+    def advance(self, n: int = 1, message: str = ""):
+        with self._lock:
+            self.done += int(n)
+        self._emit(message)
+
+    def finish(self, message: str = ""):
+        with self._lock:
+            self.done = max(self.done, self.total)
+        self._emit(message, finished=True)
+
+    def _emit(self, message: str, finished: bool = False):
+        usage = _llm_usage(self.channel)
+        with self._lock:
+            done, total = self.done, self.total
+        elapsed = time.monotonic() - self.started
+        eta = None
+        if finished:
+            eta = 0.0
+        elif done and total:
+            eta = round(elapsed / done * max(total - done, 0), 1)
+        self.channel.publish(ProgressEvent(
+            stage=self.name, done=done, total=total, eta_s=eta, elapsed_s=round(elapsed, 1),
+            in_flight=usage["in_flight"], tokens=usage["tokens"] - self._tokens_at_start,
+            message=message, finished=finished, ts=time.time(),
+        ))
+
+class ProgressChannel:
+    """Fans ProgressEvents out to sinks; a failing sink never breaks the build."""
+
+    def __init__(self, sinks: Iterable[ProgressSink] = ()):
+        self._sinks: List[ProgressSink] = list(sinks)
+        self._lock = threading.Lock()
+        self.usage = None  # llm_client.LLMUsage while llm_scope() is open
+
+    @contextmanager
+    def llm_scope(self):
+        """Report only the LLM calls made inside this block (and its map_ordered workers)."""
+        import llm_client
+        self.usage = llm_client.LLMUsage()
+        with llm_client.usage_scope(self.usage):
+            yield self
+
+    def subscribe(self, sink: ProgressSink):
+        with self._lock:
+            self._sinks.append(sink)
+
+    def stage(self, name: str, total: int = 0) -> StageProgress:
+        stage = StageProgress(self, name, total)
+        stage.update(0)
+        return stage
+
+    def publish(self, event: ProgressEvent):
+        with self._lock:
+            sinks = list(self._sinks)
+        for sink in sinks:
+            try:
+                sink(event)
+            except Exception as e:
+                print(f"[WARN] Progress sink failed: {e}", file=sys.stderr)
+
+def open_stage(progress: Optional[ProgressChannel], name: str, total: int = 0) -> Optional[StageProgress]:
+    """progress.stage(name, total), or None when no channel is attached."""
+    return progress.stage(name, total) if progress is not None else None
+
+# ===================== Sinks =====================
+
+class JsonLinesSink:
+    """Writes each event as one JSON line to a stream or file path ("-" = stdout)."""
+
+    def __init__(self, target: Union[str, IO[str]] = "-"):
+        if isinstance(target, str):
+            self._stream = sys.stdout if target == "-" else open(target, "a", encoding="utf-8")
+            self._owns = target != "-"
+        else:
+            self._stream, self._owns = target, False
+        self._lock = threading.Lock()
+
+    def __call__(self, event: ProgressEvent):
+        line = json.dumps(event.to_dict(), ensure_ascii=False)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+    def close(self):
+        if self._owns:
+            self._stream.close()
+
+def format_event(event: ProgressEvent) -> str:
+    """One-line human summary, e.g. for a progress bar caption."""
+    parts = [f"{event.stage}: {event.done}/{event.total}" if event.total else f"{event.stage}: {event.done}"]
+    if event.eta_s and not event.finished:
+        parts.append(f"ETA {event.eta_s:.0f}s")
+    if event.in_flight:
+        parts.append(f"{event.in_flight} LLM calls in flight")
+    if event.tokens:
+        parts.append(f"~{event.tokens} tokens")
+    if event.message:
+        parts.append(event.message)
+    return " · ".join(parts)
@@ -0,0 +1,140 @@
+"""
+Single-pass Python extraction shared by the knowledge graph and embeddings.
+
+One ast.parse + one tree walk produces both:
+- graph facts for build_wiki (classes, imports, top-level functions)
+- symbol records for build_embeddings (functions/classes with lines,
+  signature, docstring and source segment)
+
+Source segments are cut from a line-offset table built once per file rather
+than re-joining a splitlines() slice per node. Results are memoized by
+content hash, so the wiki and embeddings builders in one process parse each
+file once.
+"""
+
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+
+CACHE_CAPACITY = 4096
+
+@dataclass
+class PythonFacts:
+    classes: List[str] = field(default_factory=list)
+    imports: List[Dict[str, Any]] = field(default_factory=list)
+    functions: List[str] = field(default_factory=list)   # top-level only
+    docstring: Optional[str] = None                      # module docstring
+    symbols: List[Dict[str, Any]] = field(default_factory=list)  # Unit fields per function/class
+
+class LineTable:
+    """
+    Line segments of a text, equal to "\\n".join(text.splitlines()[start-1:end]),
+    via one joined string and the offsets of its line starts.
+    """
+
+    def __init__(self, text: str):
+        lines = text.splitlines()
+        self.n_lines = len(lines)
+        self._joined = "\n".join(lines)
+        # starts[i] = offset of line i+1; starts[n] = len(joined) + 1
+        self._starts = [0] + list(accumulate(len(line) + 1 for line in lines))
+
+    def segment(self, start: Optional[int], end: Optional[int]) -> Optional[str]:
+        if not (start and end and 1 <= start <= self.n_lines and 1 <= end <= self.n_lines):
+            return None
+        return self._joined[self._starts[start - 1]:self._starts[end] - 1]
+
+class _Extractor:
+    """
+    Pre-order walk in source order (the order of ast.NodeVisitor), driven by
+    an explicit stack: deeply nested expressions such as a 500-term "a+a+..."
+    would overflow a recursive visitor.
+    """
+
+    def __init__(self, lines: LineTable):
+        self.lines = lines
+        self.facts = PythonFacts()
+
+    def visit(self, tree: ast.AST):
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            handler = getattr(self, "visit_" + type(node).__name__, None)
+            if handler is not None:
+                handler(node)
+            stack.extend(reversed(list(ast.iter_child_nodes(node))))
+
+    def visit_Module(self, node: ast.Module):
+        self.facts.docstring = ast.get_docstring(node) or None
+        self.facts.functions = [n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+
+    def _symbol(self, node, symbol_type: str, signature: str):
+        sl, el = getattr(node, "lineno", None), getattr(node, "end_lineno", None)
+        code = self.lines.segment(sl, el)
+        if code is None:
+            sl = el = None
+        self.facts.symbols.append({
+            "symbol_type": symbol_type, "symbol_name": node.name,
+            "start_line": sl, "end_line": el,
+            "signature": signature, "docstring": ast.get_docstring(node), "code": code,
+        })
+
+    def visit_FunctionDef(self, node):
+        self._symbol(node, "function", f"{node.name}({', '.join(a.arg for a in node.args.args)})")
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self.facts.classes.append(node.name)
+        self._symbol(node, "class", node.name)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self.facts.imports.append({"type": "import", "module": alias.name, "names": [], "level": 0})
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        self.facts.imports.append({"type": "from", "module": node.module or "",
+                                   "names": [alias.name for alias in node.names], "level": node.level or 0})
+
+# ===================== Cached entry point =====================
+
+_CACHE: "OrderedDict[str, Optional[PythonFacts]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+def content_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+def extract_python(text: str) -> Optional[PythonFacts]:
+    """
+    Facts for a Python source text, or None when it does not parse.
+    Memoized by content hash; treat the result as read-only.
+    """
+    key = content_key(text)
+    with _CACHE_LOCK:
+        if key in _CACHE:
+            _CACHE.move_to_end(key)
+            return _CACHE[key]
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, RecursionError):
+        facts = None
+    else:
+        extractor = _Extractor(LineTable(text))
+        extractor.visit(tree)
+        facts = extractor.facts
+    with _CACHE_LOCK:
+        _CACHE[key] = facts
+        while len(_CACHE) > CACHE_CAPACITY:
+            _CACHE.popitem(last=False)
+    return facts
+
+def graph_facts(text: str) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+    """(classes, imports, top-level functions) as returned by build_wiki's parsers."""
+    facts = extract_python(text)
+    if facts is None:
+        return [], [], []
+    return list(facts.classes), [dict(i) for i in facts.imports], list(facts.functions)
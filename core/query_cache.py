@@ -0,0 +1,134 @@
+"""
+Shared cache for query embeddings.
+
+Page generation re-issues the same section queries on every regeneration and
+chat users repeat questions, so query vectors are cached by
+(model, normalized text): a bounded in-memory LRU in front of an optional
+SQLite tier (the same EmbeddingStore used for build-time vectors). Hit/miss
+counters are kept per tier.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from embedding_store import EmbeddingStore, text_key
+
+DEFAULT_CAPACITY = 2048
+QUERY_VECTORS_FILENAME = "query_vectors.sqlite"
+
+def normalize_query(text: str) -> str:
+    """Cache-key form of a query: surrounding whitespace stripped, inner runs collapsed."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+def qgenie_embed(texts: List[str], model: Optional[str] = None) -> np.ndarray:
+    """Uncached QGenie embeddings request (model=None uses the client default)."""
+    import llm_client
+    return llm_client.embeddings(texts, model=model)
+
+class QueryEmbeddingCache:
+    """LRU (+ optional SQLite) cache of query embeddings keyed by (model, normalized text)."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, store_path: Optional[str] = None):
+        self.capacity = capacity
+        self.store_path = store_path
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._store: Optional[EmbeddingStore] = EmbeddingStore(store_path) if store_path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def embed(self, texts: Sequence[str], model: Optional[str] = None,
+              embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None) -> np.ndarray:
+        """
+        Embeddings for `texts` (one row each), computing only uncached ones with
+        embed_fn(texts) (QGenie with `model` by default).
+        """
+        norm = [normalize_query(t) for t in texts]
+        keys = [text_key(t, model or "default") for t in norm]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for k in keys:
+                if k in self._lru:
+                    found[k] = self._lru[k]
+                    self._lru.move_to_end(k)
+            self.memory_hits += sum(1 for k in keys if k in found)
+
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing and self._store is not None:
+            from_disk = self._store.get_many(missing)
+            with self._lock:
+                for k, vec in from_disk.items():
+                    self._remember(k, vec)
+                self.disk_hits += sum(1 for k in keys if k in from_disk)
+            found.update(from_disk)
+            missing = [k for k in missing if k not in from_disk]
+
+        if missing:
+            texts_by_key = dict(zip(keys, norm))
+            todo = [texts_by_key[k] for k in missing]
+            vecs = embed_fn(todo) if embed_fn else qgenie_embed(todo, model=model)
+            vecs = np.asarray(vecs, dtype=np.float32).reshape(len(todo), -1)
+            if self._store is not None:
+                self._store.put_many(missing, vecs)
+            missing_set = set(missing)
+            with self._lock:
+                self.misses += sum(1 for k in keys if k in missing_set)
+                for k, vec in zip(missing, vecs):
+                    found[k] = vec
+                    self._remember(k, vec)
+        return np.stack([found[k] for k in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "size": len(self._lru),
+            }
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+# ===================== Process-wide cache =====================
+
+_CACHE: Optional[QueryEmbeddingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def configure_query_cache(capacity: int = DEFAULT_CAPACITY, store_path: Optional[str] = None) -> QueryEmbeddingCache:
+    """
+    Set up the process-wide cache, e.g. to enable the SQLite tier under the cache root.
+    Calling it again with the same settings keeps the existing cache (safe on Streamlit reruns).
+    """
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is not None:
+            if _CACHE.capacity == capacity and _CACHE.store_path == store_path:
+                return _CACHE
+            _CACHE.close()
+        _CACHE = QueryEmbeddingCache(capacity=capacity, store_path=store_path)
+        return _CACHE
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """The process-wide cache (memory-only unless configured; QUERY_EMBED_CACHE_PATH enables disk)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = QueryEmbeddingCache(store_path=os.environ.get("QUERY_EMBED_CACHE_PATH") or None)
+        return _CACHE
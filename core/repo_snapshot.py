@@ -0,0 +1,157 @@
+"""
+Shared repository snapshots for the build pipelines.
+
+A snapshot downloads and extracts a GitHub repository once per
+(owner, repo, branch, commit) and keeps a decoded file table, so that
+build_wiki and build_embeddings can consume the same checkout instead of
+each downloading, unzipping and decoding the tree on their own.
+
+Snapshots are reference counted: every consumer acquires it and releases it
+when done, and the temporary directory is removed after the last release.
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import utils
+
+# ===================== Snapshot =====================
+
+class RepoSnapshot:
+    """An extracted repository checkout with a lazily decoded file table."""
+
+    def __init__(self, key: Tuple[str, str, str, str], repo_root: str):
+        self.key = key
+        self.owner, self.repo, self.branch, self.commit = key
+        self.repo_root = repo_root
+        self.refcount = 0
+        self._lock = threading.Lock()
+        self._listings: Dict[str, List[Tuple[str, str]]] = {}
+        self._texts: Dict[str, Optional[str]] = {}
+        self._hashes: Dict[str, str] = {}
+
+    @property
+    def tmp_dir(self) -> str:
+        """Directory created by unzip_to_temp (parent of the repo root)."""
+        return os.path.dirname(self.repo_root)
+
+    def list_files(self, subpath: Optional[str] = None, max_files: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Return (abs_path, rel_path) pairs in the same order as utils.iter_repo_files."""
+        key = subpath or ""
+        with self._lock:
+            listing = self._listings.get(key)
+        if listing is None:
+            listing = list(utils.iter_repo_files(self.repo_root, subpath=subpath))
+            with self._lock:
+                listing = self._listings.setdefault(key, listing)
+        return listing[:max_files] if max_files else list(listing)
+
+    def read_text(self, rel_path: str) -> Optional[str]:
+        """Decode a file once and serve later reads from the file table."""
+        with self._lock:
+            if rel_path in self._texts:
+                return self._texts[rel_path]
+        text = utils.read_text_file(os.path.join(self.repo_root, rel_path))
+        with self._lock:
+            return self._texts.setdefault(rel_path, text)
+
+    def content_hash(self, rel_path: str) -> Optional[str]:
+        """sha1 of the decoded text (None for skipped/binary files)."""
+        with self._lock:
+            if rel_path in self._hashes:
+                return self._hashes[rel_path]
+        text = self.read_text(rel_path)
+        if text is None:
+            return None
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            return self._hashes.setdefault(rel_path, digest)
+
+    def iter_texts(self, subpath: Optional[str] = None, max_files: Optional[int] = None) -> Iterator[Tuple[str, str, Optional[str]]]:
+        """Yield (abs_path, rel_path, text) for every listed file."""
+        for abs_path, rel_path in self.list_files(subpath, max_files=max_files):
+            yield abs_path, rel_path, self.read_text(rel_path)
+
+# ===================== Registry =====================
+
+_SNAPSHOTS: Dict[Tuple[str, str, str, str], RepoSnapshot] = {}
+_KEY_LOCKS: Dict[Tuple[str, str, str, str], threading.Lock] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def _key_lock(key: Tuple[str, str, str, str]) -> threading.Lock:
+    with _REGISTRY_LOCK:
+        return _KEY_LOCKS.setdefault(key, threading.Lock())
+
+def acquire_snapshot(owner: str, repo: str, branch: str, token: Optional[str] = None) -> RepoSnapshot:
+    """
+    Return a shared snapshot for owner/repo@branch, downloading it on first use.
+    Every call must be paired with release_snapshot().
+    """
+    commit = utils.resolve_commit_sha(owner, repo, branch, token=token)
+    key = (owner, repo, branch, commit)
+    with _key_lock(key):
+        with _REGISTRY_LOCK:
+            snap = _SNAPSHOTS.get(key)
+            if snap is not None:
+                snap.refcount += 1
+                return snap
+        if commit:
+            zip_bytes = utils.download_commit_zip(owner, repo, commit)
+        else:
+            zip_bytes = utils.download_repo_zip(owner, repo, branch)
+        snap = RepoSnapshot(key, utils.unzip_to_temp(zip_bytes))
+        with _REGISTRY_LOCK:
+            snap.refcount = 1
+            _SNAPSHOTS[key] = snap
+        return snap
+
+def retain_snapshot(snap: RepoSnapshot) -> RepoSnapshot:
+    """Register an additional consumer of an already acquired snapshot."""
+    with _REGISTRY_LOCK:
+        if snap.refcount <= 0:
+            raise RuntimeError("Cannot retain a snapshot that was already released.")
+        snap.refcount += 1
+    return snap
+
+def release_snapshot(snap: RepoSnapshot) -> None:
+    """Drop one reference; the temp dir is deleted when the last consumer is done."""
+    with _REGISTRY_LOCK:
+        snap.refcount -= 1
+        if snap.refcount > 0:
+            return
+        if _SNAPSHOTS.get(snap.key) is snap:
+            del _SNAPSHOTS[snap.key]
+    shutil.rmtree(snap.tmp_dir, ignore_errors=True)
+
+@contextmanager
+def open_snapshot(owner: str, repo: str, branch: str, token: Optional[str] = None):
+    snap = acquire_snapshot(owner, repo, branch, token=token)
+    try:
+        yield snap
+    finally:
+        release_snapshot(snap)
+
+@contextmanager
+def open_snapshot_for_url(gh_url: str, token: Optional[str] = None):
+    """Parse a GitHub URL, resolve its branch and hold a snapshot for the block."""
+    parts = utils.parse_github_url(gh_url)
+    owner, repo = parts["owner"], parts["repo"]
+    branch = parts["branch"] or utils.get_default_branch(owner, repo, token=token)
+    with open_snapshot(owner, repo, branch, token=token) as snap:
+        yield snap
+
+@contextmanager
+def snapshot_scope(snapshot: Optional[RepoSnapshot], owner: str, repo: str, branch: str, token: Optional[str] = None):
+    """
+    Used by the pipelines: retain the snapshot handed in by the caller, or
+    acquire a private one when called standalone.
+    """
+    snap = retain_snapshot(snapshot) if snapshot is not None else acquire_snapshot(owner, repo, branch, token=token)
+    try:
+        yield snap
+    finally:
+        release_snapshot(snap)
@@ -0,0 +1,126 @@
+"""
+Process-wide cache for per-repository resources in the Streamlit app.
+
+Retrievers, parsed wiki structures and page
+contents are loaded once per process and shared by all sessions. Entries are
+keyed by (kind, repo cache dir, extra key) and remember a fingerprint of the
+files they were loaded from (path, mtime, size): a rebuild that rewrites
+those files makes the next lookup reload. The cache is bounded by total
+entry weight with least-recently-used eviction, so many users of different
+repositories share a fixed memory budget.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+DEFAULT_MAX_WEIGHT = 64
+
+Fingerprint = Tuple[Tuple[str, int, int], ...]
+
+def file_fingerprint(paths: Iterable[str]) -> Fingerprint:
+    """(path, mtime_ns, size) per path; missing files fingerprint as (path, 0, -1)."""
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            out.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append((path, 0, -1))
+    return tuple(out)
+
+def dir_fingerprint(directory: str, suffix: str = "") -> Fingerprint:
+    """Fingerprint of the files directly inside `directory` whose names end with suffix."""
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith(suffix))
+    except OSError:
+        return ((directory, 0, -1),)
+    return ((directory, len(names), 0),) + file_fingerprint(os.path.join(directory, n) for n in names)
+
+class ResourceCache:
+    """Weight-bounded LRU of loaded resources, invalidated by file fingerprints."""
+
+    def __init__(self, max_weight: int = DEFAULT_MAX_WEIGHT):
+        self.max_weight = max_weight
+        self._entries: "OrderedDict[Hashable, Tuple[Fingerprint, Any, int]]" = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, kind: str, repo_dir: str, fingerprint: Fingerprint, loader: Callable[[], Any],
+            extra: Hashable = None, weight: int = 1) -> Any:
+        """
+        Cached resource for (kind, repo_dir, extra), (re)loaded with loader()
+        when missing or when `fingerprint` changed. Concurrent misses on the
+        same key load once.
+        """
+        key = (kind, os.path.abspath(repo_dir), extra)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        with self._key_lock(key):
+            # Another session may have loaded it while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == fingerprint:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+            value = loader()
+            with self._lock:
+                self.misses += 1
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._weight -= old[2]
+                self._entries[key] = (fingerprint, value, weight)
+                self._weight += weight
+                self._evict()
+            return value
+
+    def _drop(self, key: Hashable, weight: int):
+        # Caller holds self._lock. A key lock still held by a loader stays until its next eviction.
+        self._weight -= weight
+        lock = self._key_locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._key_locks[key]
+
+    def _evict(self):
+        # The newest entry always stays, even if it alone exceeds the budget
+        while self._weight > self.max_weight and len(self._entries) > 1:
+            key, (_, _, weight) = self._entries.popitem(last=False)
+            self._drop(key, weight)
+
+    def invalidate(self, repo_dir: Optional[str] = None):
+        """Drop every entry (or those of one repo dir)."""
+        repo_dir = os.path.abspath(repo_dir) if repo_dir else None
+        with self._lock:
+            for key in [k for k in self._entries if repo_dir is None or k[1] == repo_dir]:
+                self._drop(key, self._entries.pop(key)[2])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "weight": self._weight, "key_locks": len(self._key_locks),
+                    "hits": self.hits, "misses": self.misses}
+
+# ===================== Process-wide cache =====================
+
+_CACHE: Optional[ResourceCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def get_resource_cache() -> ResourceCache:
+    """The process-wide cache (RESOURCE_CACHE_MAX_WEIGHT overrides the budget)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResourceCache(int(os.environ.get("RESOURCE_CACHE_MAX_WEIGHT", DEFAULT_MAX_WEIGHT)))
+        return _CACHE
@@ -0,0 +1,153 @@
+"""
+Persisted BM25 index over units, with identifier-aware tokenization.
+
+Documents are built from a unit's identifiers (path, symbol name, signature),
+its summary and its code. Identifiers are indexed both whole and split on
+snake_case / camelCase boundaries, so "url_for", "urlFor" and "url for" all
+reach the same units.
+
+The index is stored under <embeddings>/bm25/ as CSR posting lists whose
+entries already hold the BM25 term weight, so a query is a weighted bincount
+over the posting lists of its terms. Document ids are units.parquet rows,
+i.e. the same rows as UnitStore.
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+BM25_DIRNAME = "bm25"
+BM25_K1 = 1.2
+BM25_B = 0.75
+DOC_CODE_CHARS = 20000
+
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# ===================== Tokenization =====================
+
+def split_identifier(ident: str) -> List[str]:
+    """snake_case / camelCase / PascalCase parts of an identifier, lowercased."""
+    parts = []
+    for chunk in ident.split("_"):
+        parts.extend(p.lower() for p in _CAMEL_RE.findall(chunk))
+    return parts
+
+def tokenize(text: str) -> List[str]:
+    """Whole identifiers plus their parts (length >= 2), lowercased."""
+    tokens = []
+    for ident in _IDENT_RE.findall(text or ""):
+        whole = ident.lower()
+        if len(whole) >= 2:
+            tokens.append(whole)
+        parts = split_identifier(ident)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if len(p) >= 2 and p != whole)
+    return tokens
+
+def unit_documents(df: pd.DataFrame) -> List[str]:
+    """BM25 document text per units.parquet row: identifiers, summary and (truncated) code."""
+    def s(v) -> str:
+        return v if isinstance(v, str) else ""
+    cols = [df[c].tolist() if c in df.columns else [None] * len(df)
+            for c in ("file_path", "symbol_name", "signature", "summary", "code")]
+    return [" ".join([s(path), s(name), s(sig), s(summary), s(code)[:DOC_CODE_CHARS]])
+            for path, name, sig, summary, code in zip(*cols)]
+
+# ===================== Index =====================
+
+class BM25Index:
+    """CSR posting lists with precomputed BM25 weights."""
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray, docs: np.ndarray, weights: np.ndarray, n_docs: int):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, documents: Iterable[str], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lens: List[int] = []
+        for doc_id, text in enumerate(documents):
+            counts = Counter(tokenize(text))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+        n_docs = len(doc_lens)
+        lens = np.asarray(doc_lens, dtype=np.float32)
+        avgdl = float(lens.mean()) if n_docs and lens.mean() > 0 else 1.0
+
+        vocab: Dict[str, int] = {}
+        indptr = [0]
+        docs_parts, weight_parts = [], []
+        for term in sorted(postings):
+            plist = postings[term]
+            d = np.fromiter((p[0] for p in plist), dtype=np.int32, count=len(plist))
+            tf = np.fromiter((p[1] for p in plist), dtype=np.float32, count=len(plist))
+            idf = math.log(1.0 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            w = idf * tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * lens[d] / avgdl))
+            vocab[term] = len(vocab)
+            docs_parts.append(d)
+            weight_parts.append(w.astype(np.float32))
+            indptr.append(indptr[-1] + len(plist))
+        docs = np.concatenate(docs_parts) if docs_parts else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate(weight_parts) if weight_parts else np.zeros(0, dtype=np.float32)
+        return cls(vocab, np.asarray(indptr, dtype=np.int64), docs, weights, n_docs)
+
+    def save(self, emb_dir: str) -> str:
+        out = os.path.join(emb_dir, BM25_DIRNAME)
+        os.makedirs(out, exist_ok=True)
+        # Live retrievers memory-map these arrays: replace the files instead of rewriting them,
+        # and write vocab.json last so a new vocab is never paired with old arrays
+        utils.save_npy_replace(os.path.join(out, "indptr.npy"), self.indptr)
+        utils.save_npy_replace(os.path.join(out, "docs.npy"), self.docs)
+        utils.save_npy_replace(os.path.join(out, "weights.npy"), self.weights)
+        vocab_path = os.path.join(out, "vocab.json")
+        with open(vocab_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"n_docs": self.n_docs, "k1": BM25_K1, "b": BM25_B, "terms": self.vocab}, f, ensure_ascii=False)
+        os.replace(vocab_path + ".tmp", vocab_path)
+        return out
+
+    @classmethod
+    def load(cls, emb_dir: str) -> Optional["BM25Index"]:
+        """Memory-mapped index from <emb_dir>/bm25, or None for builds without one."""
+        d = os.path.join(emb_dir, BM25_DIRNAME)
+        vocab_path = os.path.join(d, "vocab.json")
+        if not os.path.isfile(vocab_path):
+            return None
+        with open(vocab_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta["terms"],
+                   np.load(os.path.join(d, "indptr.npy"), mmap_mode="r"),
+                   np.load(os.path.join(d, "docs.npy"), mmap_mode="r"),
+                   np.load(os.path.join(d, "weights.npy"), mmap_mode="r"),
+                   int(meta["n_docs"]))
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (rows, scores); `mask` is an optional boolean array of eligible rows."""
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        term_ids = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if not term_ids or k <= 0:
+            return empty
+        docs = np.concatenate([self.docs[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.weights[self.indptr[t]:self.indptr[t + 1]] for t in term_ids])
+        scores = np.bincount(docs, weights=weights, minlength=self.n_docs).astype(np.float32)
+        if mask is not None:
+            scores[~mask] = 0.0
+        cand = np.flatnonzero(scores > 0)
+        if not len(cand):
+            return empty
+        if len(cand) > k:
+            cand = cand[np.argpartition(-scores[cand], k - 1)[:k]]
+        cand = cand[np.argsort(-scores[cand], kind="stable")]
+        return cand.astype(np.int64), scores[cand]
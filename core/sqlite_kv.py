@@ -0,0 +1,78 @@
+"""
+Thread-safe single-table SQLite key-value file, shared by the sidecar stores
+(EmbeddingStore, SummaryStore).
+
+One connection per store, guarded by a lock so build worker threads can share
+it; WAL journaling lets query processes read while a build writes. Key lookups
+are chunked to stay under SQLite's bound-parameter limit.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Sequence, Tuple
+
+import utils
+
+KEY_CHUNK = 500
+
+class SQLiteKV:
+    """Base for stores over one table whose primary key column is `key`."""
+
+    TABLE = ""
+    COLUMNS = ""  # column definitions after "key TEXT PRIMARY KEY"
+
+    def __init__(self, path: str):
+        utils.ensure_dir(os.path.dirname(os.path.abspath(path)))
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} (key TEXT PRIMARY KEY, {self.COLUMNS})")
+        self._conn.commit()
+
+    def _select_many(self, columns: str, keys: Iterable[str]) -> List[Tuple]:
+        """Rows (key, *columns) for the stored subset of keys."""
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            rows: List[Tuple] = []
+            for i in range(0, len(keys), KEY_CHUNK):
+                chunk = keys[i:i + KEY_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT key, {columns} FROM {self.TABLE} WHERE key IN ({marks})", chunk))
+        return rows
+
+    def _replace_many(self, rows: Sequence[Tuple]):
+        if not rows:
+            return
+        marks = ",".join("?" * len(rows[0]))
+        with self._lock:
+            self._conn.executemany(f"INSERT OR REPLACE INTO {self.TABLE} VALUES ({marks})", rows)
+            self._conn.commit()
+
+    def retain(self, keys: Iterable[str]) -> int:
+        """
+        Delete every row whose key is not in `keys`; returns the number deleted.
+        The file is vacuumed when more than half of it was freed.
+        """
+        with self._lock:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS retain_keys (key TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM retain_keys")
+            self._conn.executemany("INSERT OR IGNORE INTO retain_keys VALUES (?)", ((k,) for k in keys))
+            deleted = self._conn.execute(
+                f"DELETE FROM {self.TABLE} WHERE key NOT IN (SELECT key FROM retain_keys)").rowcount
+            self._conn.execute("DELETE FROM retain_keys")
+            self._conn.commit()
+            if deleted and deleted > self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]:
+                self._conn.execute("VACUUM")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
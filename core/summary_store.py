@@ -0,0 +1,46 @@
+"""
+Content-addressed store for LLM unit summaries.
+
+Summaries are keyed by a hash of what actually determines them (code excerpt,
+docstring, role, model and prompt version), not by unit uid, so they survive
+line shifts, renames and moves, and are shared across repositories and
+branches. The store is a single SQLite file that is safe to use from the
+summarization worker threads.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+import utils
+from sqlite_kv import SQLiteKV
+
+SUMMARY_STORE_FILENAME = "summary_store.sqlite"
+
+def summary_key(code: str, docstring: str, role: str, model: Optional[str], prompt_version: str,
+                name: str = "") -> str:
+    """Stable content hash identifying one summarization request."""
+    payload = json.dumps([prompt_version, model or "", role or "", name or "", docstring or "", code or ""],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def default_summary_store_path(embeddings_dir: str) -> str:
+    """<cache root>/summary_store.sqlite, shared by every repo cached under the same root."""
+    cache_root = os.path.dirname(os.path.dirname(os.path.abspath(embeddings_dir)))
+    return os.path.join(cache_root, SUMMARY_STORE_FILENAME)
+
+class SummaryStore(SQLiteKV):
+    """SQLite-backed key -> summary mapping."""
+
+    TABLE = "summaries"
+    COLUMNS = "summary TEXT NOT NULL, model TEXT, created_at TEXT"
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        return dict(self._select_many("summary", keys))
+
+    def put(self, key: str, summary: str, model: Optional[str] = None):
+        self.put_many({key: summary}, model=model)
+
+    def put_many(self, items: Dict[str, str], model: Optional[str] = None):
+        self._replace_many([(k, v, model or "", utils.now_iso()) for k, v in items.items() if v])
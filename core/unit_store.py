@@ -0,0 +1,208 @@
+"""
+Read-only, low-memory columnar access to the units of a built embeddings directory.
+
+units.parquet holds every unit including its full code, summary and
+docstring. The query paths only need those texts for the handful of rows
+they return, so the build also writes sidecars:
+
+- texts.bin: the UTF-8 text fields of every unit, concatenated
+- texts_offsets.npy: int64 (rows, fields, 2) array of (offset, length)
+  per field, in units.parquet row order; length -1 marks a missing value
+- unit_labels.npy: the FAISS label (vector_index.uid_label) of every row
+
+UnitStore keeps the metadata columns as numpy arrays and a sorted label
+table, so FAISS results map to rows with one searchsorted call and hits are
+hydrated by gathering those rows, without reindexing any DataFrame. Text
+fields are served from the memory-mapped sidecar. Directories without
+sidecars are loaded in full, as before.
+"""
+
+import gzip
+import json
+import mmap
+import os
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import utils
+import vector_index
+
+TEXTS_FILENAME = "texts.bin"
+TEXT_OFFSETS_FILENAME = "texts_offsets.npy"
+UNIT_LABELS_FILENAME = "unit_labels.npy"
+TEXT_FIELDS = ("code", "summary", "docstring")
+META_COLUMNS = ["uid", "level", "file_path", "lang", "symbol_type", "symbol_name",
+                "start_line", "end_line", "signature"]
+
+# ===================== Build =====================
+
+def write_unit_sidecars(df: pd.DataFrame, out_dir: str) -> str:
+    """Write texts.bin, texts_offsets.npy and unit_labels.npy for a units dataframe (row order preserved)."""
+    texts_path = os.path.join(out_dir, TEXTS_FILENAME)
+    offsets = np.zeros((len(df), len(TEXT_FIELDS), 2), dtype=np.int64)
+    columns = [df[f].tolist() if f in df.columns else [None] * len(df) for f in TEXT_FIELDS]
+    pos = 0
+    tmp_path = texts_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for i, values in enumerate(zip(*columns)):
+            for j, value in enumerate(values):
+                if not isinstance(value, str):
+                    offsets[i, j] = (pos, -1)
+                    continue
+                data = value.encode("utf-8")
+                f.write(data)
+                offsets[i, j] = (pos, len(data))
+                pos += len(data)
+    os.replace(tmp_path, texts_path)
+    # UnitStore memory-maps texts_offsets.npy: replace the files rather than rewrite them in place
+    utils.save_npy_replace(os.path.join(out_dir, TEXT_OFFSETS_FILENAME), offsets)
+    utils.save_npy_replace(os.path.join(out_dir, UNIT_LABELS_FILENAME), vector_index.uid_labels(df["uid"].tolist()))
+    return texts_path
+
+# ===================== Load =====================
+
+def read_units_full(emb_dir: str) -> pd.DataFrame:
+    """units.parquet (or the units.parquet.jsonl.gz fallback) with every column."""
+    units_path = os.path.join(emb_dir, "units.parquet")
+    units_alt = os.path.join(emb_dir, "units.parquet.jsonl.gz")
+    if os.path.isfile(units_path):
+        return pd.read_parquet(units_path)
+    if os.path.isfile(units_alt):
+        rows = []
+        with gzip.open(units_alt, "rt", encoding="utf-8") as f:
+            for line in f:
+                rows.append(json.loads(line))
+        return pd.DataFrame.from_records(rows)
+    raise FileNotFoundError(f"units.parquet not found in {emb_dir}")
+
+class UnitStore:
+    """
+    Columnar unit metadata (`columns`, plus the same data as a metadata-only
+    DataFrame in `df`) with row lookup by uid or FAISS label and text fields
+    fetched lazily by row.
+    """
+
+    def __init__(self, emb_dir: str, lazy: bool = True):
+        self.emb_dir = emb_dir
+        self._texts: Optional[mmap.mmap] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._full_texts: Dict[str, np.ndarray] = {}
+        units_path = os.path.join(emb_dir, "units.parquet")
+        texts_path = os.path.join(emb_dir, TEXTS_FILENAME)
+        offsets_path = os.path.join(emb_dir, TEXT_OFFSETS_FILENAME)
+        self.lazy = lazy and all(os.path.isfile(p) for p in (units_path, texts_path, offsets_path))
+        if self.lazy:
+            df = pd.read_parquet(units_path, columns=META_COLUMNS)
+            self._offsets = np.load(offsets_path, mmap_mode="r")
+            if len(self._offsets) != len(df):
+                print(f"[WARN] {TEXT_OFFSETS_FILENAME} does not match units.parquet, loading units in full")
+                self.lazy = False
+        if self.lazy:
+            if os.path.getsize(texts_path):
+                with open(texts_path, "rb") as f:
+                    self._texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            has_summary = np.asarray(self._offsets[:, TEXT_FIELDS.index("summary"), 1]) > 0
+        else:
+            self._offsets = None
+            full = read_units_full(emb_dir)
+            self._full_texts = {f: full[f].to_numpy(dtype=object) if f in full.columns
+                                else np.full(len(full), None, dtype=object) for f in TEXT_FIELDS}
+            df = full[[c for c in META_COLUMNS if c in full.columns]]
+            has_summary = np.array([isinstance(s, str) and len(s) > 0 for s in self._full_texts["summary"]], dtype=bool)
+        self.df = df.assign(has_summary=has_summary).reset_index(drop=True)
+        self.columns: Dict[str, np.ndarray] = {c: self.df[c].to_numpy() for c in self.df.columns}
+
+        # uid -> row (first occurrence) and FAISS label -> row via a sorted label table
+        self._rows: Dict[str, int] = {}
+        for i, uid in enumerate(self.columns["uid"].tolist()):
+            self._rows.setdefault(uid, i)
+        labels = self._load_labels()
+        self._label_order = np.argsort(labels, kind="stable")
+        self._sorted_labels = labels[self._label_order]
+
+    def _load_labels(self) -> np.ndarray:
+        path = os.path.join(self.emb_dir, UNIT_LABELS_FILENAME)
+        if self.lazy and os.path.isfile(path):
+            labels = np.load(path)
+            if len(labels) == len(self.df):
+                return labels
+        return vector_index.uid_labels(self.columns["uid"].tolist())
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._rows
+
+    # ---- row lookup ----
+
+    def rows_for_uids(self, uids: Iterable[str]) -> np.ndarray:
+        """Row per uid (-1 when unknown)."""
+        return np.fromiter((self._rows.get(u, -1) for u in uids), dtype=np.int64)
+
+    def rows_for_labels(self, labels: np.ndarray) -> np.ndarray:
+        """Row per FAISS uid label (-1 when unknown), via a single searchsorted."""
+        labels = np.asarray(labels, dtype=np.int64)
+        if not len(self._sorted_labels) or not len(labels):
+            return np.full(len(labels), -1, dtype=np.int64)
+        pos = np.searchsorted(self._sorted_labels, labels)
+        pos = np.minimum(pos, len(self._sorted_labels) - 1)
+        found = self._sorted_labels[pos] == labels
+        return np.where(found, self._label_order[pos], -1)
+
+    def rows_for_hits(self, resolver: "vector_index.LabelResolver", labels: np.ndarray) -> np.ndarray:
+        """Rows for raw search labels: label lookup for ID-mapped indices, uid lookup for legacy ones."""
+        if resolver.id_mapped:
+            return self.rows_for_labels(labels)
+        return self.rows_for_uids(resolver(int(l)) for l in labels)
+
+    # ---- hydration ----
+
+    def text(self, row: int, field: str) -> Optional[str]:
+        """One text field of the unit at `row`."""
+        if not self.lazy:
+            value = self._full_texts[field][row]
+            return value if isinstance(value, str) else None
+        offset, length = (int(x) for x in self._offsets[row, TEXT_FIELDS.index(field)])
+        if length < 0:
+            return None
+        if length == 0 or self._texts is None:
+            return ""
+        return self._texts[offset:offset + length].decode("utf-8")
+
+    def gather(self, rows: Sequence[int], fields: Iterable[str] = TEXT_FIELDS,
+               scores: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """DataFrame of the given rows (negative rows dropped) with text fields and optional scores."""
+        rows = np.asarray(rows, dtype=np.int64)
+        keep = rows >= 0
+        rows = rows[keep]
+        data: Dict[str, Any] = {c: col[rows] for c, col in self.columns.items()}
+        for f in fields:
+            data[f] = [self.text(int(r), f) for r in rows]
+        if scores is not None:
+            data["score"] = np.asarray(scores, dtype=np.float32)[keep]
+        return pd.DataFrame(data)
+
+    def frame(self, uids: Iterable[str], fields: Iterable[str] = TEXT_FIELDS) -> pd.DataFrame:
+        """Rows for `uids` (in order, unknown uids skipped) with the given text fields attached."""
+        return self.gather(self.rows_for_uids(uids), fields)
+
+    def hits(self, resolver: "vector_index.LabelResolver", labels: np.ndarray, scores: np.ndarray,
+             fields: Iterable[str] = TEXT_FIELDS) -> pd.DataFrame:
+        """Hydrate raw search results (see vector_index.search_labels) into a hits frame."""
+        return self.gather(self.rows_for_hits(resolver, labels), fields, scores=scores)
+
+    def record(self, uid: str) -> Dict[str, Any]:
+        """Metadata + text fields of one unit."""
+        row = self._rows[uid]
+        rec = {c: col[row] for c, col in self.columns.items()}
+        for field in TEXT_FIELDS:
+            rec[field] = self.text(row, field)
+        return rec
+
+    def close(self):
+        if self._texts is not None:
+            self._texts.close()
+            self._texts = None
@@ -62,6 +62,18 @@ def write_text(path: str, text: str):
     with open(path, "w", encoding="utf-8") as f:
         f.write(text)
  
+def save_npy_replace(path: str, arr) -> None:
+    """
+    np.save to <path>.tmp, then os.replace onto path. Readers that memory-map
+    the old file keep a valid mapping; rewriting it in place would truncate
+    the file under them (SIGBUS on their next read).
+    """
+    import numpy as np
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp_path, path)
+ 
 def read_text_file(path: str) -> Optional[str]:
     """Read text file with safety checks (size, binary content)."""
     try:
@@ -151,7 +163,22 @@ def download_repo_zip(owner: str, repo: str, branch: str) -> bytes:
     req = Request(url, headers={"User-Agent": "ai-buzz-app"})
     with urlopen(req, timeout=60) as resp:
         return resp.read()
- 
+
+def resolve_commit_sha(owner: str, repo: str, branch: str, token: Optional[str] = None) -> str:
+    """Resolve the head commit of a branch; empty string if the API is unavailable."""
+    try:
+        info = http_get_json(f"https://api.github.com/repos/{owner}/{repo}/commits/{branch}", token=token)
+        return info.get("sha") or ""
+    except Exception:
+        return ""
+
+def download_commit_zip(owner: str, repo: str, sha: str) -> bytes:
+    """Download repository ZIP bytes pinned to a commit."""
+    url = f"https://codeload.github.com/{owner}/{repo}/zip/{sha}"
+    req = Request(url, headers={"User-Agent": "ai-buzz-app"})
+    with urlopen(req, timeout=60) as resp:
+        return resp.read()
+
 def unzip_to_temp(zip_bytes: bytes) -> str:
     """Extract ZIP bytes to temporary directory and return root path."""
     tmpdir = tempfile.mkdtemp(prefix="ghrepo_")
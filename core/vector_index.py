@@ -0,0 +1,425 @@
+"""
+FAISS index helpers shared by the build and query paths.
+
+Indices are ID-mapped: every vector is stored under a stable int64 label
+derived from its unit uid, so single units can be removed or upserted
+without rebuilding the index. Legacy indices, whose labels are positions in
+the matching *_ids.json list, are still readable.
+
+The base index is chosen by an index spec: exact flat search for small
+corpora, HNSW / IVF / IVF-PQ approximate search for large ones. Specs are
+plain dicts so they can be recorded in meta.json together with the recall
+measured against the exact baseline.
+
+All vectors are L2-normalized before they are indexed and queries are
+normalized in search(), so inner-product scores are cosine similarities and
+comparable across indices and levels.
+
+There is one index per embedding kind (code, summary) holding both file and
+symbol units; level-restricted searches use a FAISS ID selector over the
+labels of that level, or an oversampled search filtered afterwards on faiss
+builds without search parameters.
+"""
+
+import hashlib
+import json
+import math
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# ===================== Labels =====================
+
+def uid_label(uid: str) -> int:
+    """Stable non-negative int64 FAISS label for a unit uid."""
+    return int.from_bytes(hashlib.sha1(uid.encode("utf-8")).digest()[:8], "little") & 0x7FFFFFFFFFFFFFFF
+
+def uid_labels(uids: Iterable[str]) -> np.ndarray:
+    return np.fromiter((uid_label(u) for u in uids), dtype=np.int64)
+
+def uid_level(uid: str) -> str:
+    """"file" or "symbol", from the uid prefix ("file::..." / "symbol::...")."""
+    return uid.split("::", 1)[0]
+
+def is_id_mapped(index) -> bool:
+    return hasattr(index, "id_map")
+
+def index_labels(index) -> np.ndarray:
+    """Labels currently stored in an ID-mapped index."""
+    import faiss
+    return faiss.vector_to_array(index.id_map).astype(np.int64)
+
+class LabelResolver:
+    """Maps FAISS result labels back to uids for ID-mapped and legacy indices."""
+
+    def __init__(self, index, ids: List[str]):
+        self.ids = ids
+        self._by_label: Optional[Dict[int, str]] = None
+        self._level_labels: Dict[str, np.ndarray] = {}
+        self._selectors: Dict[str, Any] = {}
+        self.id_mapped = is_id_mapped(index)
+        if self.id_mapped:
+            self._by_label = {uid_label(u): u for u in ids}
+
+    def __call__(self, label: int) -> Optional[str]:
+        if label < 0:
+            return None
+        if self._by_label is not None:
+            return self._by_label.get(int(label))
+        return self.ids[label] if label < len(self.ids) else None
+
+    def level_labels(self, level: str) -> np.ndarray:
+        """FAISS labels of every unit of a level (uid labels, or positions for legacy indices)."""
+        if level not in self._level_labels:
+            if self._by_label is not None:
+                labels = uid_labels(u for u in self.ids if uid_level(u) == level)
+            else:
+                labels = np.fromiter((i for i, u in enumerate(self.ids) if uid_level(u) == level), dtype=np.int64)
+            self._level_labels[level] = labels
+        return self._level_labels[level]
+
+    def level_selector(self, level: str):
+        """Cached faiss.IDSelectorBatch over level_labels(level)."""
+        if level not in self._selectors:
+            import faiss
+            labels = np.ascontiguousarray(self.level_labels(level))
+            self._selectors[level] = faiss.IDSelectorBatch(labels.size, faiss.swig_ptr(labels))
+        return self._selectors[level]
+
+def normalize(vecs: np.ndarray) -> np.ndarray:
+    """L2-normalized float32 copy of a vector or matrix (zero rows stay zero)."""
+    out = np.array(vecs, dtype=np.float32, copy=True)
+    if out.ndim == 1:
+        out = out.reshape(1, -1)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    out /= norms
+    return out
+
+# ===================== Index Specs =====================
+
+INDEX_KINDS = ("auto", "flat", "hnsw", "ivf", "ivfpq")
+AUTO_FLAT_MAX = 50_000       # exact search below this many vectors
+AUTO_HNSW_MAX = 250_000      # HNSW up to here, IVF-PQ above
+TRAIN_SAMPLE_MAX = 200_000
+
+def _ivf_nlist(n: int) -> int:
+    nlist = int(4 * math.sqrt(max(n, 1)))
+    # faiss wants ~39 training points per centroid
+    return max(1, min(nlist, 65536, n // 39))
+
+def _pq_m(dim: int) -> int:
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if m <= dim and dim % m == 0:
+            return m
+    return 1
+
+def choose_index_spec(n: int, dim: int, kind: str = "auto") -> Dict[str, Any]:
+    """Index parameters for n vectors of size dim; kind="auto" picks by corpus size."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind {kind!r}; expected one of {INDEX_KINDS}")
+    if kind == "auto":
+        kind = "flat" if n <= AUTO_FLAT_MAX else ("hnsw" if n <= AUTO_HNSW_MAX else "ivfpq")
+    if kind in ("ivf", "ivfpq") and n < 39 * 16:
+        kind = "flat"  # too few vectors to train useful centroids
+    spec: Dict[str, Any] = {"kind": kind, "dim": int(dim), "ntotal": int(n)}
+    if kind == "hnsw":
+        spec.update({"M": 32, "efConstruction": 200, "efSearch": 128})
+    elif kind == "ivf":
+        spec.update({"nlist": _ivf_nlist(n), "nprobe": 32})
+    elif kind == "ivfpq":
+        spec.update({"nlist": _ivf_nlist(n), "nprobe": 32, "m": _pq_m(dim), "nbits": 8})
+    return spec
+
+def make_base_index(spec: Dict[str, Any]):
+    """Untrained inner-product base index for a spec from choose_index_spec."""
+    import faiss
+    dim, kind = spec["dim"], spec["kind"]
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec["M"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = spec["efConstruction"]
+        index.hnsw.efSearch = spec["efSearch"]
+        return index
+    if kind in ("ivf", "ivfpq"):
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, spec["nlist"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, spec["nlist"], spec["m"], spec["nbits"],
+                                     faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = spec["nprobe"]
+        return index
+    return faiss.IndexFlatIP(dim)
+
+def base_index(index):
+    """The underlying index of an ID-mapped wrapper (the index itself otherwise)."""
+    import faiss
+    return faiss.downcast_index(index.index) if is_id_mapped(index) else index
+
+def index_kind(index) -> str:
+    name = type(base_index(index)).__name__
+    return {"IndexHNSWFlat": "hnsw", "IndexIVFFlat": "ivf", "IndexIVFPQ": "ivfpq"}.get(name, "flat")
+
+def supports_remove(index) -> bool:
+    """
+    Whether an ID-mapped index can be updated in place. HNSW graphs cannot
+    drop vectors. IVF / IVF-PQ can, but IndexIVF.remove_ids keeps its
+    sequential internal ids while IndexIDMap2 compacts id_map, so labels
+    would end up on the wrong vectors; both need a rebuild.
+    """
+    return index_kind(index) == "flat"
+
+def train_index(index, vecs: np.ndarray, sample_size: int = TRAIN_SAMPLE_MAX, seed: int = 1234) -> None:
+    """Train on a random sample of at most sample_size vectors (no-op for flat/HNSW)."""
+    if index.is_trained:
+        return
+    if len(vecs) > sample_size:
+        rows = np.random.default_rng(seed).choice(len(vecs), size=sample_size, replace=False)
+        vecs = vecs[np.sort(rows)]
+    index.train(np.ascontiguousarray(vecs, dtype=np.float32))
+
+# ===================== Build / Update =====================
+
+def build_id_index(vecs: np.ndarray, uids: List[str], base_factory: Optional[Callable[[int], object]] = None,
+                   spec: Optional[Dict[str, Any]] = None):
+    """
+    Create an IndexIDMap2 over `base_factory(dim)`, or over the index described
+    by `spec` (flat inner product by default). Trainable indices are trained first.
+    """
+    return build_labeled_index(vecs, uid_labels(uids), base_factory=base_factory, spec=spec)
+
+def build_labeled_index(vecs: np.ndarray, labels: np.ndarray, base_factory: Optional[Callable[[int], object]] = None,
+                        spec: Optional[Dict[str, Any]] = None):
+    """build_id_index with precomputed int64 labels."""
+    import faiss
+    dim = vecs.shape[1]
+    if base_factory:
+        base = base_factory(dim)
+    elif spec:
+        base = make_base_index(spec)
+    else:
+        base = faiss.IndexFlatIP(dim)
+    train_index(base, vecs)
+    index = faiss.IndexIDMap2(base)
+    if len(labels):
+        index.add_with_ids(np.ascontiguousarray(vecs, dtype=np.float32), np.asarray(labels, dtype=np.int64))
+    return index
+
+def remove_uids(index, uids: Iterable[str]) -> int:
+    labels = uid_labels(uids)
+    if not len(labels):
+        return 0
+    return int(index.remove_ids(labels))
+
+def add_uids(index, vecs: np.ndarray, uids: List[str]) -> None:
+    if len(uids):
+        index.add_with_ids(np.ascontiguousarray(vecs, dtype=np.float32), uid_labels(uids))
+
+def self_recall(index, vecs: np.ndarray, uids: List[str], rows: Optional[Iterable[int]] = None,
+                k: int = 5, n_queries: int = 200, seed: int = 1234, tol: float = 1e-4) -> Optional[float]:
+    """
+    Share of sampled indexed vectors found by their own uid label in their
+    top-k; `rows` are always checked (e.g. the rows just upserted). A vector
+    whose top-k is filled with results scoring at least its own score (e.g.
+    more than k copies of the embedding of an empty text) also counts as
+    found, since any of those ties may take its place. None when the index
+    is empty.
+    """
+    n = len(uids)
+    if n == 0 or index.ntotal == 0:
+        return None
+    forced = np.unique(np.asarray(list(rows) if rows is not None else [], dtype=np.int64))
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(n, size=min(n_queries, n), replace=False)
+    check = np.union1d(forced, sample)
+    queries = np.ascontiguousarray(vecs[check], dtype=np.float32)
+    scores, found = index.search(queries, min(k, n))
+    own = np.einsum("ij,ij->i", queries, queries)
+    labels = uid_labels(uids[i] for i in check.tolist())
+    hits = (found == labels[:, None]).any(axis=1) | (scores[:, -1] >= own - tol)
+    return round(float(np.mean(hits)), 4)
+
+def _ivf_ids_are_positions(ivf) -> bool:
+    """True when the IVF's internal ids are exactly 0..ntotal-1 (no vector was ever removed)."""
+    import faiss
+    invlists = ivf.invlists
+    seen = np.zeros(ivf.ntotal, dtype=bool)
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ptr = invlists.get_ids(list_no)
+        ids = faiss.rev_swig_ptr(ptr, size).copy()
+        invlists.release_ids(list_no, ptr)
+        if ids.min() < 0 or ids.max() >= ivf.ntotal:
+            return False
+        seen[ids] = True
+    return bool(seen.all())
+
+def reconstruct_all(index) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    (vectors, labels) stored in an index; labels is None for legacy positional
+    indices. Raises ValueError for an IVF index that had vectors removed: its
+    vectors no longer line up with id_map positions, so it must be rebuilt
+    from the embeddings.
+    """
+    import faiss
+    base = base_index(index)
+    if index_kind(index) in ("ivf", "ivfpq"):
+        ivf = faiss.extract_index_ivf(base)
+        if not _ivf_ids_are_positions(ivf):
+            raise ValueError("IVF index had vectors removed in place; rebuild it from the embeddings")
+        ivf.make_direct_map()
+    vecs = base.reconstruct_n(0, base.ntotal) if base.ntotal else np.zeros((0, base.d), dtype=np.float32)
+    labels = index_labels(index) if is_id_mapped(index) else None
+    return vecs, labels
+
+def renormalize_index(index):
+    """
+    Rebuild an index of the same kind over its L2-normalized vectors, keeping
+    labels (or positions for legacy indices). IVF-PQ vectors are reconstructed
+    from their codes, so they stay approximate.
+    """
+    vecs, labels = reconstruct_all(index)
+    vecs = normalize(vecs) if len(vecs) else vecs
+    spec = choose_index_spec(len(vecs), index.d, index_kind(index))
+    if labels is not None:
+        return build_labeled_index(vecs, labels, spec=spec)
+    base = make_base_index(spec)
+    train_index(base, vecs)
+    base.add(vecs)
+    return base
+
+# ===================== Load / Search =====================
+
+def read_index(index_path: str, mmap: bool = False):
+    """
+    faiss.read_index; mmap=True maps the vector codes read-only instead of
+    copying them into memory. IO_FLAG_MMAP only maps IVF inverted lists, so
+    flat and HNSW codes need IO_FLAG_MMAP_IFC. Falls back to a regular read
+    when the flags are unavailable (older faiss) or unsupported.
+    """
+    import faiss
+    if mmap:
+        try:
+            return faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        except (AttributeError, RuntimeError):
+            pass
+    return faiss.read_index(index_path)
+
+def load_index(index_path: str, ids_path: str, mmap: bool = False):
+    """Return (index, ids, resolver); mmap=True maps the index read-only (see read_index)."""
+    index = read_index(index_path, mmap=mmap)
+    with open(ids_path, "r", encoding="utf-8") as f:
+        ids = json.load(f)
+    return index, ids, LabelResolver(index, ids)
+
+UNIT_IDS_PREFIX = "unit"
+
+def load_prefix(emb_dir: str, prefix: str, ids_prefix: Optional[str] = None, mmap: bool = False):
+    """
+    Load <prefix>.index from an embeddings dir with its id list: <ids_prefix>_ids.json
+    when given, else the shared unit_ids.json, else the legacy <prefix>_ids.json.
+    """
+    candidates = [ids_prefix] if ids_prefix else [UNIT_IDS_PREFIX, prefix]
+    ids_paths = [os.path.join(emb_dir, f"{c}_ids.json") for c in candidates]
+    ids_path = next((p for p in ids_paths if os.path.exists(p)), ids_paths[-1])
+    return load_index(os.path.join(emb_dir, f"{prefix}.index"), ids_path, mmap=mmap)
+
+def recall_at_k(index, vecs: np.ndarray, uids: List[str], k: int = 10, n_queries: int = 200,
+                seed: int = 1234, noise: float = 0.5, tol: float = 1e-4) -> Optional[float]:
+    """
+    recall@k of `index` against exact inner-product search. Queries are
+    sampled indexed vectors perturbed by Gaussian noise (`noise` times their
+    norm), so no query trivially finds itself. An ANN result counts as a hit
+    when its exact score reaches the exact k-th score, so ties among
+    duplicate vectors are not misses. None when the corpus is empty.
+    """
+    n = len(uids)
+    if n == 0 or index.ntotal == 0:
+        return None
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(n, size=min(n_queries, n), replace=False)
+    base = vecs[rows].astype(np.float32)
+    scale = noise * np.linalg.norm(base, axis=1, keepdims=True) / np.sqrt(base.shape[1])
+    queries = np.ascontiguousarray(base + rng.standard_normal(base.shape).astype(np.float32) * scale)
+    labels = uid_labels(uids)
+    order = np.argsort(labels)
+    _, ann = index.search(queries, k)
+    hits = 0
+    for start in range(0, len(queries), 16):
+        scores = queries[start:start + 16] @ vecs.T
+        kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+        for row, found in enumerate(ann[start:start + 16]):
+            found = found[found != -1]
+            pos = order[np.clip(np.searchsorted(labels, found, sorter=order), 0, n - 1)]
+            known = labels[pos] == found
+            hits += int(np.sum(scores[row, pos[known]] >= kth[row] - tol))
+    return round(hits / (len(queries) * k), 4)
+
+def _selector_params(index, selector):
+    """SearchParameters restricting `index` to `selector`, keeping its efSearch/nprobe."""
+    import faiss
+    kind, base = index_kind(index), base_index(index)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    if kind in ("ivf", "ivfpq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    return faiss.SearchParameters(sel=selector)
+
+def _valid(resolver: LabelResolver, D, I, level: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Drop -1 padding and (on the oversampling path) labels outside `level`."""
+    labels, scores = I[0].astype(np.int64), D[0].astype(np.float32)
+    keep = labels >= 0
+    if level is not None:
+        keep &= np.fromiter((uid_level(resolver(l) or "") == level for l in labels.tolist()),
+                            dtype=bool, count=len(labels))
+    return labels[keep], scores[keep]
+
+def search_labels(index, resolver: LabelResolver, qvec: np.ndarray, k: int,
+                  level: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k raw (labels, scores) arrays for a single query vector; -1 padding is dropped.
+    `level` ("file" / "symbol") restricts the search to units of that level.
+    Labels can be mapped to rows with UnitStore.rows_for_hits or to uids with the resolver.
+    """
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+    if index.ntotal == 0 or k <= 0:
+        return empty
+    q = normalize(np.asarray(qvec, dtype=np.float32).reshape(1, -1))
+    if level is None:
+        D, I = index.search(q, min(k, index.ntotal))
+        return _valid(resolver, D, I, None)
+
+    n_level = len(resolver.level_labels(level))
+    if n_level == 0:
+        return empty
+    k = min(k, n_level)
+    try:
+        params = _selector_params(index, resolver.level_selector(level))
+        D, I = index.search(q, k, params=params)
+        return _valid(resolver, D, I, None)
+    except (AttributeError, TypeError, RuntimeError):
+        pass
+
+    # No ID-selector support: oversample and filter, widening until k hits or exhausted
+    fetch = min(index.ntotal, max(4 * k, k + 32))
+    while True:
+        D, I = index.search(q, fetch)
+        labels, scores = _valid(resolver, D, I, level)
+        if len(labels) >= k or fetch >= index.ntotal:
+            return labels[:k], scores[:k]
+        fetch = min(index.ntotal, fetch * 4)
+
+def search(index, resolver: LabelResolver, qvec: np.ndarray, k: int,
+           level: Optional[str] = None) -> List[Tuple[str, float]]:
+    """Top-k (uid, score) pairs for a single query vector; unknown labels are skipped."""
+    labels, scores = search_labels(index, resolver, qvec, k, level=level)
+    hits = []
+    for label, score in zip(labels.tolist(), scores.tolist()):
+        uid = resolver(label)
+        if uid is not None:
+            hits.append((uid, float(score)))
+    return hits